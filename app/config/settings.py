@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import BaseModel, Field
 from pydantic.types import SecretStr
+from typing import List, Literal, Optional
 
 
 class JWTSettings(BaseModel):
@@ -9,6 +10,101 @@ class JWTSettings(BaseModel):
     access_token_ttl: int
 
 
+class PoolSettings(BaseModel):
+    pool_size: int = 10
+    max_overflow: int = 10
+    pool_timeout: float = 30.0  # секунд ожидания свободного соединения, дальше ошибка
+    pool_recycle: int = 1800  # секунд; соединения старше пересоздаются (обрывы со стороны сервера и балансировщиков)
+    pool_pre_ping: bool = True  # проверять соединение перед выдачей из пула
+    statement_timeout_ms: Optional[int] = None  # statement_timeout PostgreSQL для соединений пула
+    prepared_statement_cache_size: int = 100  # кэш подготовленных выражений asyncpg на соединение; 0 - для pgbouncer
+
+
+class DatabaseSettings(BaseModel):
+    create_schema: bool = True  # создавать недостающие таблицы и колонки при старте; False - схема ведётся миграциями
+    # короткие запросы приложения: пользователи, метаданные наборов
+    oltp: PoolSettings = Field(default_factory=lambda: PoolSettings(pool_size=10, max_overflow=10, statement_timeout_ms=15_000))
+    # таблицы наборов данных: запись COPY и аналитические запросы графиков
+    analytics: PoolSettings = Field(default_factory=lambda: PoolSettings(
+        pool_size=5, max_overflow=5, pool_timeout=60.0, statement_timeout_ms=120_000
+    ))
+    analytics_replica_url: Optional[str] = None  # если задан, чтение наборов данных идёт с реплики
+
+
+class UploadSettings(BaseModel):
+    chunk_rows: int = 50_000  # сколько строк CSV парсится и пишется в БД за один шаг
+    dedupe_content: bool = True  # повторная загрузка того же файла с теми же параметрами ссылается на готовый набор
+    max_decompression_ratio: float = 100.0  # сжатый файл или тело запроса, распакованные сильнее, - 413 (zip-бомба)
+    decompression_check_bytes: int = 16 * 1024 * 1024  # столько распакованных байт допускается без проверки степени сжатия
+
+
+class JobSettings(BaseModel):
+    workers: int = 2  # фоновых загрузок одновременно в процессе; не больше пула database.analytics
+    spool_dir: str = "spool"  # куда сохраняются файлы фоновых загрузок до обработки
+    max_queued: int = 100  # сколько задач может ждать в очереди, дальше 503
+    poll_interval: float = 2.0  # секунд между проверками очереди, если новых задач не поступало
+    heartbeat_interval: float = 30.0  # секунд между отметками «жива» выполняемой задачи и проверками брошенных
+    stale_after: float = 300.0  # секунд без отметки «жива», после которых задача в работе считается брошенной
+    max_attempts: int = 3  # сколько раз задача запускается после падений процесса
+
+
+class ExecutorSettings(BaseModel):
+    process_workers: int = 2  # 0 - тяжёлые задачи выполняются в пуле потоков
+    thread_workers: int = 8
+    max_pending: int = 64  # сколько задач может ждать/выполняться одновременно, дальше 503
+    task_timeout: float = 60.0  # секунд на одну задачу, дальше 504
+    start_method: str = "spawn"
+    warm_up: bool = False  # при старте запустить процессы пула и построить в них пробный график
+
+
+class ChartCacheSettings(BaseModel):
+    max_bytes: int = 256 * 1024 * 1024  # объём LRU-кэша графиков в памяти процесса
+    max_entry_bytes: int = 16 * 1024 * 1024  # графики больше не кэшируются
+    ttl: float = 600.0  # секунд
+    disk_dir: Optional[str] = None  # если задан, графики дополнительно кэшируются на диске
+    disk_max_bytes: int = 1024 * 1024 * 1024  # объём дискового кэша, дальше вытесняются давно не читанные
+
+
+class StorageSettings(BaseModel):
+    backend: Literal["postgres", "parquet"] = "postgres"  # куда сохраняются новые загрузки
+    parquet_dir: str = "data/datasets"
+
+
+class RollupSettings(BaseModel):
+    granularities: List[str] = ["day", "week", "month"]  # интервалы rollup, которые считаются при загрузке
+
+
+class AuthCacheSettings(BaseModel):
+    ttl: float = 60.0  # секунд; роль, изменённая в другом процессе, подхватится не позже
+    max_size: int = 10_000  # пользователей в кэше процесса
+
+
+class RateLimitSettings(BaseModel):
+    # где slowapi хранит счётчики: memory:// - в процессе (каждый воркер uvicorn считает сам),
+    # shm:///dev/shm/foodnet-ratelimit - в общем для всех воркеров хоста файле
+    storage_uri: str = "memory://"
+
+
+class PasswordHashSettings(BaseModel):
+    workers: int = 2  # сколько паролей хэшируется одновременно (Argon2 занимает ядро и ~64 МБ на хэш)
+    max_waiting: int = 64  # сколько запросов может ждать свободного потока, дальше сразу 503
+    queue_timeout: float = 5.0  # секунд ожидания свободного потока, дальше 503
+
+
+class MetricsSettings(BaseModel):
+    profile_slow_ms: Optional[float] = None  # если задан, медленные запросы профилируются cProfile
+    profile_sample_rate: float = 0.1  # доля запросов, которые профилируются
+    profile_dir: str = "profiles"
+
+
+class LoggingSettings(BaseModel):
+    file: str = "dashboard.log"
+    level: str = "INFO"
+    json_format: bool = True  # JSON-строка на запись; False - прежний текстовый формат
+    max_bytes: int = 50 * 1024 * 1024  # размер файла лога, дальше ротация
+    backup_count: int = 5  # сколько старых файлов хранится
+
+
 class GlobalSettings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file='.env',
@@ -17,6 +113,18 @@ class GlobalSettings(BaseSettings):
     )
     DATABASE_URL: str
     jwt: JWTSettings = Field(default_factory=JWTSettings)
+    database: DatabaseSettings = Field(default_factory=DatabaseSettings)
+    upload: UploadSettings = Field(default_factory=UploadSettings)
+    jobs: JobSettings = Field(default_factory=JobSettings)
+    executor: ExecutorSettings = Field(default_factory=ExecutorSettings)
+    chart_cache: ChartCacheSettings = Field(default_factory=ChartCacheSettings)
+    storage: StorageSettings = Field(default_factory=StorageSettings)
+    rollups: RollupSettings = Field(default_factory=RollupSettings)
+    auth_cache: AuthCacheSettings = Field(default_factory=AuthCacheSettings)
+    rate_limit: RateLimitSettings = Field(default_factory=RateLimitSettings)
+    password_hash: PasswordHashSettings = Field(default_factory=PasswordHashSettings)
+    metrics: MetricsSettings = Field(default_factory=MetricsSettings)
+    logging: LoggingSettings = Field(default_factory=LoggingSettings)
 
 
 config = GlobalSettings()
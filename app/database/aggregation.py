@@ -0,0 +1,103 @@
+"""Агрегация загруженных наборов данных на стороне БД (GROUP BY / date_trunc)."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional
+from sqlalchemy import DateTime, Integer, MetaData, Table, cast, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.sql.elements import ColumnElement
+from app.lazy import lazy_import
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+
+AGGREGATES = {
+    "sum": func.sum,
+    "mean": func.avg,
+    "count": func.count,
+}
+
+TIME_UNITS = ("hour", "day", "week", "month", "quarter", "year")
+
+SQLITE_TIME_FORMATS = {
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d",
+    "month": "%Y-%m-01",
+    "year": "%Y-01-01",
+}
+
+
+async def reflect_dataset(conn: AsyncConnection, data_id: str) -> Table:
+    """Читает описание таблицы набора данных из каталога БД."""
+    return await conn.run_sync(lambda sync_conn: Table(data_id, MetaData(), autoload_with=sync_conn))
+
+
+def time_bucket(column: ColumnElement, time_unit: str, dialect: str) -> ColumnElement:
+    """Выражение начала временного интервала (date_trunc) для значения колонки."""
+    if time_unit not in TIME_UNITS:
+        raise ValueError(f"Неизвестный интервал времени: {time_unit}")
+    if dialect == "postgresql":
+        # интервал подставляется литералом: с bind-параметром выражения в SELECT и GROUP BY
+        # получат разные плейсхолдеры, и PostgreSQL не сочтёт их одинаковыми
+        return func.date_trunc(literal_column(f"'{time_unit}'"), cast(column, DateTime))
+    # SQLite (тесты, локальная разработка)
+    if time_unit in SQLITE_TIME_FORMATS:
+        return func.strftime(SQLITE_TIME_FORMATS[time_unit], column)
+    if time_unit == "week":
+        return func.date(column, "weekday 0", "-6 days")
+    if time_unit == "quarter":
+        month = (cast(func.strftime("%m", column), Integer) - 1) // 3 * 3 + 1
+        return func.printf("%s-%02d-01", func.strftime("%Y", column), month)
+
+
+async def aggregate_dataset(
+    conn: AsyncConnection,
+    data_id: str,
+    x_field: str,
+    y_field: str,
+    aggregate: str,
+    color_field: Optional[str] = None,
+    time_unit: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Группирует набор данных по x (и color) и агрегирует y в БД.
+
+    Из БД возвращается только агрегированный ряд, колонки результата называются так же,
+    как поля запроса.
+
+    Args:
+        conn (AsyncConnection): Соединение с БД.
+        data_id (str): Имя таблицы набора данных.
+        x_field (str): Колонка для оси X (группировка).
+        y_field (str): Колонка для агрегации.
+        aggregate (str): Функция агрегации: sum, mean или count.
+        color_field (Optional[str]): Дополнительная колонка группировки.
+        time_unit (Optional[str]): Если задан, x округляется до начала интервала (date_trunc).
+    Returns:
+        pd.DataFrame: Агрегированные данные, отсортированные по x.
+    Raises:
+        ValueError: Если в таблице нет нужных колонок или неизвестна агрегация.
+    """
+    table = await reflect_dataset(conn, data_id)
+    fields = [x_field, y_field] + ([color_field] if color_field else [])
+    missing = [field for field in fields if field not in table.c]
+    if missing:
+        raise ValueError(f"Отсутствуют обязательные поля в данных: {missing}")
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"Неизвестная агрегация: {aggregate}")
+
+    x = table.c[x_field]
+    if time_unit:
+        x = time_bucket(x, time_unit, conn.dialect.name)
+    groups = [x.label(x_field)]
+    if color_field:
+        groups.append(table.c[color_field].label(color_field))
+    query = (
+        select(*groups, AGGREGATES[aggregate](table.c[y_field]).label(y_field))
+        .group_by(*(group.element for group in groups))
+        .order_by(*(group.element for group in groups))
+    )
+    result = await conn.execute(query)
+    return pd.DataFrame(result.fetchall(), columns=list(result.keys()))
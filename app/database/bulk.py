@@ -0,0 +1,157 @@
+"""Массовая загрузка DataFrame в таблицы БД."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+import asyncpg
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Float, Integer, Interval, MetaData, Table, Text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.types import TypeEngine
+from app.lazy import lazy_import
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+
+def column_type(dtype: Any) -> TypeEngine:
+    """
+    Подбирает тип колонки SQL по dtype колонки DataFrame.
+
+    Числа хранятся с запасом - bigint и double precision - независимо от ширины dtype:
+    узкие типы (int8, float32) действуют только в памяти и в parquet, а колонка таблицы,
+    созданная по первой порции, должна принять значения следующих порций без ALTER.
+    """
+    if pd.api.types.is_bool_dtype(dtype):
+        return Boolean()
+    if pd.api.types.is_integer_dtype(dtype):
+        return BigInteger()
+    if pd.api.types.is_float_dtype(dtype):
+        return Float(precision=53)
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return DateTime(timezone=isinstance(dtype, pd.DatetimeTZDtype))
+    if pd.api.types.is_timedelta64_dtype(dtype):
+        return Interval()
+    return Text()
+
+
+def build_table(name: str, df: pd.DataFrame) -> Table:
+    """
+    Описывает таблицу для DataFrame с явными типами колонок.
+
+    Таблица создаётся в отдельном MetaData, чтобы таблицы с данными пользователей
+    не попадали в `Base.metadata` и `create_all`.
+    """
+    return Table(name, MetaData(), *(Column(str(col), column_type(dtype)) for col, dtype in df.dtypes.items()))
+
+
+def _column_values(series: pd.Series, target: TypeEngine) -> List[Any]:
+    """Переводит колонку в список python-значений под тип колонки таблицы, пропуски -> None."""
+    mask = series.isna().to_numpy()
+    if isinstance(target, DateTime):
+        values = pd.to_datetime(series).astype(object).to_numpy(dtype=object)
+    elif isinstance(target, Integer) and not pd.api.types.is_integer_dtype(series.dtype):
+        values = series.astype("Int64").to_numpy(dtype=object)
+    elif isinstance(target, Float):
+        values = series.astype("float64").to_numpy(dtype=object)
+    elif isinstance(target, Text):
+        values = series.astype(str).to_numpy(dtype=object)
+    else:
+        values = series.to_numpy(dtype=object)
+    values[mask] = None
+    return values.tolist()
+
+
+def dataframe_records(df: pd.DataFrame, table: Table) -> List[Tuple[Any, ...]]:
+    """Строит список кортежей для вставки, приводя значения к типам колонок таблицы."""
+    columns = [_column_values(df[col.name], col.type) for col in table.columns]
+    return list(zip(*columns))
+
+
+async def widen_table(conn: AsyncConnection, table: Table, df: pd.DataFrame) -> None:
+    """
+    Расширяет типы колонок таблицы, если значения порции в них не помещаются.
+
+    Нужна при потоковой загрузке, когда типы таблицы выбраны по первой порции. Целые колонки
+    создаются сразу bigint, дробные - double precision (см. `column_type`), поэтому расширений
+    два: целая колонка становится double precision, если в порции появились дроби, а числовая
+    колонка или колонка дат - text, если `apply_schema` сделала её строковой (в порции
+    встретились значения другого вида). Оба случая редкие: ALTER на PostgreSQL перезаписывает
+    таблицу, прежние значения переводятся в текст приведением ::text.
+    Целые значения с пропусками (float в pandas) пишутся в целую колонку как есть.
+    На SQLite типы колонок не ограничивают значения, поэтому меняется только описание таблицы.
+    """
+    for column in table.columns:
+        if column.name not in df.columns:
+            continue
+        series = df[column.name]
+        if isinstance(column.type, (Integer, Float, DateTime)) and isinstance(column_type(series.dtype), Text):
+            new_type = Text()
+        elif isinstance(column.type, Integer) and pd.api.types.is_float_dtype(series):
+            values = series.dropna().to_numpy(dtype=np.float64)
+            if np.array_equal(values, np.floor(values)):
+                continue
+            new_type = Float(precision=53)
+        else:
+            continue
+        if conn.dialect.name == "postgresql":
+            type_sql = new_type.compile(dialect=conn.dialect)
+            name = conn.dialect.identifier_preparer.quote(column.name)
+            await conn.exec_driver_sql(
+                f'ALTER TABLE {conn.dialect.identifier_preparer.format_table(table)} '
+                f'ALTER COLUMN {name} TYPE {type_sql} USING {name}::{type_sql}'
+            )
+        column.type = new_type
+
+
+async def create_table(conn: AsyncConnection, name: str, df: pd.DataFrame) -> Table:
+    """Создаёт таблицу под DataFrame и возвращает её описание."""
+    table = build_table(name, df)
+    await conn.run_sync(lambda sync_conn: table.create(sync_conn, checkfirst=False))
+    return table
+
+
+async def copy_df(conn: AsyncConnection, table: Table, df: pd.DataFrame) -> int:
+    """Дописывает DataFrame в существующую таблицу, см. `copy_records`."""
+    return await copy_records(conn, table, dataframe_records(df, table))
+
+
+async def copy_records(conn: AsyncConnection, table: Table, records: List[Tuple[Any, ...]]) -> int:
+    """
+    Дописывает записи в существующую таблицу и возвращает число записанных строк.
+
+    На PostgreSQL с драйвером asyncpg используется COPY (`copy_records_to_table`) в рамках
+    текущей транзакции соединения. Для остальных движков (например, SQLite в тестах) —
+    обычный executemany через SQLAlchemy.
+
+    Args:
+        conn (AsyncConnection): Соединение с открытой транзакцией.
+        table (Table): Описание целевой таблицы (см. `create_table`).
+        records (List[Tuple[Any, ...]]): Записи в порядке колонок таблицы (см. `dataframe_records`).
+    Returns:
+        int: Число записанных строк.
+    Raises:
+        ValueError: Если значения нельзя закодировать в типы колонок таблицы или сервер отклонил COPY.
+    """
+    if not records:
+        return 0
+    columns = [col.name for col in table.columns]
+    if conn.dialect.name == "postgresql" and conn.dialect.driver == "asyncpg":
+        raw = await conn.get_raw_connection()
+        try:
+            await raw.driver_connection.copy_records_to_table(
+                table.name,
+                records=records,
+                columns=columns,
+                schema_name=table.schema,
+            )
+        except asyncpg.PostgresError as e:
+            # прямой вызов драйвера идёт в обход обёртки исключений SQLAlchemy (DBAPIError)
+            raise ValueError(f"Ошибка COPY в таблицу {table.name}: {e}") from e
+    else:
+        rows: List[Dict[str, Any]] = [dict(zip(columns, record)) for record in records]
+        # типы колонок меняет `widen_table`, а скомпилированный INSERT кэшируется по таблице
+        await conn.execute(table.insert(), rows, execution_options={"compiled_cache": None})
+    return len(records)
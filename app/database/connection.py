@@ -1,19 +1,61 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from typing import Any, Dict
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
-from app.config.settings import config
+from app.config.settings import PoolSettings, config
 
 
 class Base(DeclarativeBase):
     pass
 
 
-engine = create_async_engine(
-    config.DATABASE_URL,  # берём строку подключения из настроек (.env)
-    echo=False,             # Можно сделать True для детального логирования запросов
-    pool_size=10,
-    max_overflow=20,
-    future=True,
+def make_engine(url: str, pool: PoolSettings, name: str) -> AsyncEngine:
+    """
+    Движок БД с пулом по настройкам pool.
+
+    Для PostgreSQL (asyncpg) соединениям пула задаются statement_timeout, размер кэша
+    подготовленных выражений и application_name=foodnet-{name}, по которому пул виден в pg_stat_activity.
+    """
+    connect_args: Dict[str, Any] = {}
+    if make_url(url).get_backend_name() == "postgresql":
+        server_settings = {"application_name": f"foodnet-{name}"}
+        if pool.statement_timeout_ms is not None:
+            server_settings["statement_timeout"] = str(pool.statement_timeout_ms)
+        connect_args = {
+            "server_settings": server_settings,
+            "prepared_statement_cache_size": pool.prepared_statement_cache_size,
+        }
+    return create_async_engine(
+        url,
+        echo=False,             # Можно сделать True для детального логирования запросов
+        pool_size=pool.pool_size,
+        max_overflow=pool.max_overflow,
+        pool_timeout=pool.pool_timeout,
+        pool_recycle=pool.pool_recycle,
+        pool_pre_ping=pool.pool_pre_ping,
+        connect_args=connect_args,
+    )
+
+
+# короткие запросы приложения (пользователи, метаданные наборов) не ждут соединений,
+# занятых долгими загрузками и агрегациями наборов данных, и наоборот
+engine = make_engine(config.DATABASE_URL, config.database.oltp, "oltp")  # берём строку подключения из настроек (.env)
+analytics_engine = make_engine(config.DATABASE_URL, config.database.analytics, "analytics")
+# чтение наборов данных; реплика может отставать, поэтому запись и чтение сразу после записи - через analytics_engine
+analytics_read_engine = (
+    make_engine(config.database.analytics_replica_url, config.database.analytics, "analytics-replica")
+    if config.database.analytics_replica_url else analytics_engine
 )
+# пулы по именам для метрик
+ENGINES = {"oltp": engine, "analytics": analytics_engine}
+if analytics_read_engine is not analytics_engine:
+    ENGINES["analytics_replica"] = analytics_read_engine
+
+
+async def dispose_engines() -> None:
+    """Закрывает соединения всех пулов."""
+    for pool_engine in ENGINES.values():
+        await pool_engine.dispose()
 
 
 async_session = async_sessionmaker(
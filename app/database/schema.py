@@ -0,0 +1,64 @@
+"""Создание и дополнение служебных таблиц приложения (users, data_items, ...)."""
+
+from typing import Any, Dict, List
+from sqlalchemy import BigInteger, Column, Integer, Table, inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateColumn
+from app.middleware.logging import logger
+from .connection import Base, engine
+
+
+def narrow_integer_columns(table: Table, existing: Dict[str, Dict[str, Any]]) -> List[Column]:
+    """Колонки, которые в модели bigint, а в БД ещё integer (созданы старой версией приложения)."""
+    return [
+        column for column in table.columns
+        if column.name in existing and isinstance(column.type, BigInteger)
+        and isinstance(existing[column.name]["type"], Integer) and not isinstance(existing[column.name]["type"], BigInteger)
+    ]
+
+
+def add_missing_columns(conn: Connection) -> None:
+    """
+    Добавляет в существующие таблицы колонки, которые появились в моделях позже, и расширяет
+    до bigint целые колонки, которые стали bigint в моделях (например, `DataItem.file_size`).
+
+    `create_all` создаёт только отсутствующие таблицы и не меняет уже созданные, поэтому
+    БД, созданная старой версией приложения, не примет вставку с новыми полями. Новые
+    NOT NULL колонки должны иметь server_default, чтобы заполнить существующие строки.
+    На SQLite integer и так 64-битный, поэтому тип меняется только на PostgreSQL.
+    """
+    inspector = inspect(conn)
+    preparer = conn.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"]: column for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}")
+            logger.info("В таблицу %s добавлена колонка %s", table.name, column.name)
+        if conn.dialect.name != "postgresql":
+            continue
+        for column in narrow_integer_columns(table, existing):
+            conn.exec_driver_sql(
+                f"ALTER TABLE {preparer.format_table(table)} ALTER COLUMN {preparer.quote(column.name)} TYPE BIGINT"
+            )
+            logger.info("Колонка %s.%s расширена до bigint", table.name, column.name)
+
+
+def create_schema(conn: Connection) -> None:
+    """Создаёт отсутствующие таблицы и колонки моделей (для `AsyncConnection.run_sync`)."""
+    Base.metadata.create_all(conn)
+    add_missing_columns(conn)
+
+
+async def init_schema() -> None:
+    """
+    Создаёт схему при старте приложения (lifespan), один раз на процесс, а не в каждой загрузке.
+
+    Если схема ведётся миграциями, шаг отключается настройкой `database.create_schema`.
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(create_schema)
@@ -1,24 +1,76 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
-from .connection import get_db
+from typing import AsyncIterator, List, Optional
+from .connection import async_session, get_db
 from app.models.models import User
 from app.models.schemas import UserResponce
 from app.middleware.logging import logger
 
 router = APIRouter()
 
+# колонки списка пользователей: без hashed_password, ORM-объекты не создаются
+USER_LIST_COLUMNS = (User.id, User.username, User.email, User.is_admin)
+USERS_PAGE_MAX = 1000
+USERS_STREAM_BATCH = 1000  # строк, которые курсор БД отдаёт за раз при потоковой выдаче
+
+
+def users_page_query(after_id: Optional[int], limit: int):
+    query = select(*USER_LIST_COLUMNS).order_by(User.id).limit(limit)
+    return query if after_id is None else query.where(User.id > after_id)
+
 
 @router.get("/users", response_model=List[UserResponce])
-async def get_users(db: AsyncSession = Depends(get_db)) -> List[User]:
+async def get_users(
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=USERS_PAGE_MAX),
+    after_id: Optional[int] = Query(None, description="курсор: id последнего пользователя предыдущей страницы"),
+    db: AsyncSession = Depends(get_db)
+) -> List[dict]:
+    """
+    Страница пользователей по возрастанию id (keyset-пагинация: `WHERE id > after_id LIMIT limit`).
+
+    Если страница полная, курсор следующей отдаётся в заголовках `X-Next-Cursor` и `Link`.
+    Весь список без пагинации - `/users/stream`.
+    """
     try:
-        result = await db.execute(select(User))
-        users = result.scalars().all()
-        return users
+        result = await db.execute(users_page_query(after_id, limit))
+        users = [dict(row) for row in result.mappings()]
     except Exception as e:
-        logger.error(f"Ошибка при получении пользователей: {e}")
+        logger.error("Ошибка при получении пользователей: %s", e)
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
+    if len(users) == limit:
+        cursor = str(users[-1]["id"])
+        response.headers["X-Next-Cursor"] = cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(after_id=cursor)}>; rel="next"'
+    return users
+
+
+async def _stream_users() -> AsyncIterator[bytes]:
+    # своя сессия: она должна жить, пока отдаётся ответ
+    async with async_session() as session:
+        try:
+            result = await session.stream(
+                select(*USER_LIST_COLUMNS).order_by(User.id).execution_options(yield_per=USERS_STREAM_BATCH)
+            )
+            async for row in result.mappings():
+                yield UserResponce.model_validate(row).model_dump_json().encode() + b"\n"
+        except Exception as e:
+            logger.error("Ошибка при потоковой выдаче пользователей: %s", e)
+            raise
+
+
+@router.get("/users/stream")
+async def stream_users() -> StreamingResponse:
+    """
+    Все пользователи в формате NDJSON (объект `UserResponce` на строку).
+
+    Строки читаются курсором на стороне сервера порциями по `USERS_STREAM_BATCH` и сразу
+    отдаются клиенту, память не зависит от числа пользователей.
+    """
+    return StreamingResponse(_stream_users(), media_type="application/x-ndjson")
 
 
 @router.get("/user/{username}", response_model=UserResponce)
@@ -32,5 +84,5 @@ async def get_user(username: str, db: AsyncSession = Depends(get_db)) -> User:
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Ошибка при получении пользователя {username}: {e}")
+        logger.error("Ошибка при получении пользователя %s: %s", username, e)
         raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера")
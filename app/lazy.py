@@ -0,0 +1,48 @@
+"""
+Отложенный импорт тяжёлых библиотек (pandas, numpy, pyarrow, Altair).
+
+Импорт `app.main` не должен тянуть за собой библиотеки, которые нужны только при загрузке
+данных и построении графиков: новый процесс (перезапуск воркера, масштабирование) должен быстро
+начать отвечать на /health и авторизацию. Модули приложения объявляют такие библиотеки так:
+
+    if TYPE_CHECKING:
+        import pandas as pd
+    else:
+        pd = lazy_import("pandas")
+
+и используют `from __future__ import annotations`, чтобы аннотации `pd.DataFrame` не вычислялись
+при импорте. Библиотека импортируется при первом обращении к её атрибуту.
+"""
+
+import importlib
+from types import ModuleType
+from typing import Any, List
+
+
+class LazyModule(ModuleType):
+    """Заместитель модуля name: импортирует его при первом обращении к атрибуту и запоминает атрибуты."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr: str) -> Any:
+        value = getattr(self._load(), attr)
+        # следующие обращения находят атрибут без __getattr__
+        self.__dict__[attr] = value
+        return value
+
+    def __dir__(self) -> List[str]:
+        return dir(self._load())
+
+
+def lazy_import(name: str) -> Any:
+    """Модуль name, который будет импортирован при первом обращении к атрибуту."""
+    return LazyModule(name)
@@ -1,18 +1,44 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.services import csv
 from app.services.auth import auth
 from app.services import chart_service
 from app.database import utils
 from app.services.auth.utils import limiter
+from app.services.executor import executor
+from app.services.auth.hashing import password_hasher
+from app.middleware import compression, metrics
+from app.config.settings import config
+from app.database.connection import dispose_engines
+from app.database.schema import init_schema
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.database.create_schema:
+        await init_schema()
+    executor.start()
+    if config.executor.warm_up:
+        await chart_service.warm_up()
+    await csv.upload_jobs.start()
+    yield
+    await csv.upload_jobs.stop()
+    executor.shutdown()
+    password_hasher.shutdown()
+    await dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
 app.state.limiter = limiter
+app.add_middleware(compression.GzipRequestMiddleware)
+app.add_middleware(metrics.TimingMiddleware)
 
 
 app.include_router(csv.router, prefix="/upload", tags=["upload"])
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(utils.router, prefix="/db", tags=["db"])
 app.include_router(chart_service.router, prefix="/chart", tags=["chart"])
+app.include_router(metrics.router, tags=["metrics"])
 
 
 @app.get("/health")
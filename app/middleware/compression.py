@@ -0,0 +1,55 @@
+"""Приём тел запросов, сжатых gzip (Content-Encoding: gzip)."""
+
+from fastapi import HTTPException
+from starlette.responses import PlainTextResponse
+from app.middleware.logging import logger
+from app.services.compression import DecompressionLimitExceeded, GzipBodyInflater
+
+
+class GzipRequestMiddleware:
+    """
+    ASGI-middleware: распаковывает тело запроса с `Content-Encoding: gzip` потоково, порциями
+    по мере получения, и передаёт приложению уже распакованное тело без заголовков
+    Content-Encoding и Content-Length.
+
+    Распаковка ограничена `upload.max_decompression_ratio` (413); повреждённое тело - 400,
+    другие кодировки - 415.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = scope["headers"]
+        encoding = next((value for name, value in headers if name == b"content-encoding"), None)
+        if encoding is None or encoding.strip().lower() == b"identity":
+            await self.app(scope, receive, send)
+            return
+        if encoding.strip().lower() != b"gzip":
+            response = PlainTextResponse("Поддерживается только Content-Encoding: gzip", status_code=415)
+            await response(scope, receive, send)
+            return
+
+        scope = dict(scope, headers=[(name, value) for name, value in headers
+                                     if name not in (b"content-encoding", b"content-length")])
+        inflater = GzipBodyInflater()
+
+        async def receive_inflated():
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            more_body = message.get("more_body", False)
+            try:
+                body = inflater.feed(message.get("body", b""), final=not more_body)
+            except DecompressionLimitExceeded as e:
+                logger.error("Тело запроса %s отклонено: %s", scope["path"], e)
+                raise HTTPException(status_code=413, detail=str(e))
+            except ValueError as e:
+                logger.error("Ошибка распаковки тела запроса %s: %s", scope["path"], e)
+                raise HTTPException(status_code=400, detail=str(e))
+            return {"type": "http.request", "body": body, "more_body": more_body}
+
+        await self.app(scope, receive_inflated, send)
@@ -1,15 +1,147 @@
+"""
+Логирование без записи в файл из цикла событий.
+
+Записи кладутся в очередь (`QueueHandler`), в файл их пишет фоновый поток `QueueListener`
+с ротацией по размеру. Процессы пула `executor` отправляют записи в общую очередь
+multiprocessing, в файл пишет только основной процесс.
+
+В JSON-записях есть request_id запроса и время его этапов (`span`) на момент записи.
+Сообщения передаются с аргументами (`logger.info("набор %s", data_id)`), чтобы строка
+не собиралась для отключённого уровня.
+"""
+
+import atexit
+import json
 import logging
+import queue
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, List, Optional, Tuple
+from app.config.settings import LoggingSettings, config
+
+
+TEXT_FORMAT = "%(asctime)s -- %(name)s -- %(levelname)s -- %(message)s"
+
+# идентификатор текущего запроса и его этапы (имя, секунды); выставляет TimingMiddleware
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_spans", default=None)
+
+# атрибуты LogRecord, которые не считаются дополнительными полями (extra=...)
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись: время, уровень, логгер, сообщение, request_id, этапы и поля extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Добавляет к записи request_id и этапы запроса, пока запись ещё в потоке запроса."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = request_id.get()
+        if current is not None and not hasattr(record, "request_id"):
+            record.request_id = current
+        spans = request_spans.get()
+        if spans and not hasattr(record, "spans_ms"):
+            totals: Dict[str, float] = {}
+            for name, seconds in list(spans):
+                totals[name] = totals.get(name, 0.0) + seconds * 1000
+            record.spans_ms = {name: round(ms, 2) for name, ms in totals.items()}
+        return True
+
 
+class _QueueHandler(QueueHandler):
+    """
+    Кладёт в очередь копию записи с готовым текстом сообщения.
 
-def setup_test_logger():
-    logging.basicConfig(
-        filename="dashboard.log",
-        level=logging.INFO,
-        format="%(asctime)s -- %(name)s -- %(levelname)s -- %(message)s",
-        encoding="utf-8",
-        filemode="a"
+    В отличие от `QueueHandler.prepare` запись не форматируется целиком (JSON и трейсбек
+    собирает поток записи), а трейсбек сохраняется отдельным полем.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _file_handler(settings: LoggingSettings) -> logging.Handler:
+    handler = RotatingFileHandler(
+        settings.file, maxBytes=settings.max_bytes, backupCount=settings.backup_count,
+        encoding="utf-8", delay=True
     )
+    handler.setFormatter(JsonFormatter() if settings.json_format else logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+class LogPipeline:
+    """Очередь записей процесса и фоновый поток, который пишет их в файл."""
+
+    def __init__(self, settings: LoggingSettings):
+        self.settings = settings
+        self.handler = _file_handler(settings)
+        self.queue_handler = _QueueHandler(queue.SimpleQueue())
+        self.queue_handler.addFilter(RequestContextFilter())
+        self._listeners: List[QueueListener] = []
+        self._worker_queues: Dict[str, Any] = {}
+
+    def _listen(self, source: Any) -> None:
+        listener = QueueListener(source, self.handler)
+        listener.start()
+        self._listeners.append(listener)
+
+    def start(self, root: logging.Logger) -> None:
+        root.setLevel(self.settings.level)
+        root.addHandler(self.queue_handler)
+        self._listen(self.queue_handler.queue)
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Дописывает записи из очередей и закрывает файл."""
+        while self._listeners:
+            self._listeners.pop().stop()
+        self.handler.close()
+
+    def worker_queue(self, context) -> Any:
+        """
+        Очередь multiprocessing для процессов пула (`context` - контекст multiprocessing пула).
+
+        Записи из неё пишет в тот же файл отдельный поток основного процесса.
+        """
+        method = context.get_start_method()
+        if method not in self._worker_queues:
+            self._worker_queues[method] = context.Queue()
+            self._listen(self._worker_queues[method])
+        return self._worker_queues[method]
+
+
+def init_worker_logging(worker_queue: Any) -> None:
+    """Инициализатор процесса пула: записи уходят в очередь основного процесса, а не в файл."""
+    root = logging.getLogger()
+    if pipeline.queue_handler in root.handlers:
+        root.removeHandler(pipeline.queue_handler)
+        pipeline.stop()
+    root.addHandler(_QueueHandler(worker_queue))
 
 
-setup_test_logger()
-logger = logging.getLogger()  # Get the root logger to use the basicConfig settings
+pipeline = LogPipeline(config.logging)
+pipeline.start(logging.getLogger())
+logger = logging.getLogger()
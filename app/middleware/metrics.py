@@ -0,0 +1,292 @@
+"""Метрики приложения: время запросов и этапов, запросы в работе, пул БД; экспорт в формате Prometheus."""
+
+import cProfile
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+from fastapi import APIRouter, Response
+from app.config.settings import MetricsSettings, config
+from app.middleware.logging import logger, request_id, request_spans
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+# request_id от клиента принимается, только если не сломает лог и заголовок ответа
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,128}")
+
+
+class Histogram:
+    """Гистограмма Prometheus с фиксированными корзинами и произвольными метками."""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series: Dict[Labels, List[float]] = {}  # метки -> [счётчики корзин..., сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(key + (('le', repr(bound)),))} {cumulative:g}")
+            lines.append(f"{self.name}_bucket{_labels(key + (('le', '+Inf'),))} {series[-1]:g}")
+            lines.append(f"{self.name}_sum{_labels(key)} {series[-2]!r}")
+            lines.append(f"{self.name}_count{_labels(key)} {series[-1]:g}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}" if labels else ""
+
+
+def _gauge(name: str, help_text: str, value: float, labels: Labels = ()) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name}{_labels(labels)} {value:g}"]
+
+
+REQUEST_DURATION = Histogram("foodnet_request_duration_seconds", "Время обработки HTTP-запроса по маршруту.")
+STAGE_DURATION = Histogram("foodnet_stage_duration_seconds", "Время этапов обработки (см. span).")
+_requests_total: Dict[Labels, int] = {}
+_in_flight = 0
+_state_lock = threading.Lock()
+
+# сборщик этапов задачи, выполняемой в другом процессе
+_span_collector: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("span_collector", default=None)
+
+
+def record_span(name: str, seconds: float) -> None:
+    """Записывает длительность этапа: в гистограмму этапов и в этапы текущего запроса."""
+    collector = _span_collector.get()
+    if collector is not None:
+        collector.append((name, seconds))
+        return
+    STAGE_DURATION.observe(seconds, stage=name)
+    spans = request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Отмечает этап обработки запроса:
+
+        with span("chart.build"):
+            chart = ChartGenerator.generate(...)
+
+    Этапы попадают в гистограмму `foodnet_stage_duration_seconds{stage=...}` на /metrics.
+    Этапы задач в пуле процессов собираются там и переносятся в основной процесс
+    (см. `call_with_spans`).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started)
+
+
+def call_with_spans(fn: Callable[..., Any], *args: Any) -> Tuple[Any, List[Tuple[str, float]]]:
+    """Выполняет fn (в процессе пула) и возвращает результат вместе с этапами, отмеченными внутри."""
+    collected: List[Tuple[str, float]] = []
+    token = _span_collector.set(collected)
+    try:
+        return fn(*args), collected
+    finally:
+        _span_collector.reset(token)
+
+
+def record_spans(spans: List[Tuple[str, float]]) -> None:
+    for name, seconds in spans:
+        record_span(name, seconds)
+
+
+class RequestProfiler:
+    """
+    Выборочный cProfile для медленных запросов.
+
+    Профилируется доля `profile_sample_rate` запросов (не больше одного одновременно: профайлер
+    в потоке цикла событий один), дамп сохраняется, только если запрос шёл дольше
+    `profile_slow_ms`. В профиль попадают и другие запросы, выполнявшиеся в цикле событий
+    в то же время.
+    """
+
+    def __init__(self, settings: MetricsSettings):
+        self.settings = settings
+        self._active = False
+        self._lock = threading.Lock()
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if self.settings.profile_slow_ms is None or random.random() >= self.settings.profile_sample_rate:
+            return None
+        with self._lock:
+            if self._active:
+                return None
+            self._active = True
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # профайлер уже запущен кем-то ещё
+            self._release()
+            return None
+        return profiler
+
+    def stop(self, profiler: cProfile.Profile, route: str, seconds: float) -> None:
+        profiler.disable()
+        self._release()
+        if seconds * 1000 < self.settings.profile_slow_ms:
+            return
+        directory = Path(self.settings.profile_dir)
+        path = directory / f"{time.strftime('%Y%m%d-%H%M%S')}_{re.sub(r'[^A-Za-z0-9_-]+', '_', route).strip('_')}_{seconds * 1000:.0f}ms.prof"
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(path)
+        except OSError as e:
+            logger.warning("Не удалось сохранить профиль запроса %s: %s", route, e)
+
+    def _release(self) -> None:
+        with self._lock:
+            self._active = False
+
+
+profiler = RequestProfiler(config.metrics)
+
+
+class TimingMiddleware:
+    """
+    ASGI-middleware: время запроса по шаблону маршрута, число запросов в работе, этапы запроса.
+
+    Метка route - шаблон пути FastAPI (/chart/{id}), а не сам путь, чтобы число рядов
+    метрик не росло с каждым новым идентификатором; не найденные маршруты идут как "unmatched".
+    Запросу присваивается request_id (из заголовка X-Request-ID или новый), он возвращается
+    в ответе и попадает во все записи лога запроса; по завершении пишется запись со временем
+    запроса и его этапов.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        global _in_flight
+        with _state_lock:
+            _in_flight += 1
+        status = 500
+        current_id = _request_id(scope)
+        id_token = request_id.set(current_id)
+        spans_token = request_spans.set([])
+        request_profiler = profiler.start()
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", current_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", "unmatched")
+            if request_profiler is not None:
+                profiler.stop(request_profiler, route, elapsed)
+            logger.info(
+                "%s %s -> %s за %.1f мс", scope["method"], scope["path"], status, elapsed * 1000,
+                extra={"route": route, "status": status, "duration_ms": round(elapsed * 1000, 2)}
+            )
+            request_spans.reset(spans_token)
+            request_id.reset(id_token)
+            REQUEST_DURATION.observe(elapsed, method=scope["method"], route=route)
+            key = (("method", scope["method"]), ("route", route), ("status", str(status)))
+            with _state_lock:
+                _in_flight -= 1
+                _requests_total[key] = _requests_total.get(key, 0) + 1
+
+
+def _request_id(scope) -> str:
+    for name, value in scope.get("headers", []):
+        if name == b"x-request-id":
+            value = value.decode("latin-1")
+            if REQUEST_ID_PATTERN.fullmatch(value):
+                return value
+            break
+    return uuid4().hex
+
+
+def _pool_metrics() -> List[str]:
+    from app.database.connection import ENGINES
+
+    gauges = (
+        ("foodnet_db_pool_size", "size", "Размер пула соединений БД."),
+        ("foodnet_db_pool_checked_out", "checkedout", "Соединения БД, выданные запросам."),
+        ("foodnet_db_pool_checked_in", "checkedin", "Свободные соединения в пуле БД."),
+        ("foodnet_db_pool_overflow", "overflow", "Соединения сверх размера пула."),
+    )
+    lines = []
+    for name, method, help_text in gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for pool_name, pool_engine in ENGINES.items():
+            value = getattr(pool_engine.pool, method, None)
+            if callable(value):
+                lines.append(f"{name}{_labels((('pool', pool_name),))} {value():g}")
+    # доля занятых соединений от предела пула (размер + overflow): около 1 - запросы ждут соединений
+    lines += ["# HELP foodnet_db_pool_saturation Доля соединений пула БД, выданных запросам.",
+              "# TYPE foodnet_db_pool_saturation gauge"]
+    for pool_name, pool_engine in ENGINES.items():
+        pool = pool_engine.pool
+        if callable(getattr(pool, "size", None)) and callable(getattr(pool, "checkedout", None)):
+            limit = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+            saturation = pool.checkedout() / limit if limit else 0.0
+            lines.append(f"foodnet_db_pool_saturation{_labels((('pool', pool_name),))} {saturation:g}")
+    return lines
+
+
+def expose() -> str:
+    """Все метрики в текстовом формате Prometheus."""
+    lines = _gauge("foodnet_requests_in_flight", "HTTP-запросы в работе.", _in_flight)
+    lines += ["# HELP foodnet_requests_total Обработанные HTTP-запросы.", "# TYPE foodnet_requests_total counter"]
+    with _state_lock:
+        totals = dict(_requests_total)
+    lines += [f"foodnet_requests_total{_labels(key)} {count}" for key, count in sorted(totals.items())]
+    lines += REQUEST_DURATION.expose() + STAGE_DURATION.expose() + _pool_metrics()
+    return "\n".join(lines) + "\n"
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Метрики для Prometheus."""
+    return Response(content=expose(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,6 +1,6 @@
 """Модели SQLAlchemy для таблиц базы данных."""
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, func
+from sqlalchemy import JSON, BigInteger, Column, Integer, String, Boolean, DateTime, ForeignKey, Text, func
 from app.database.connection import Base
 from sqlalchemy.orm import relationship
 
@@ -57,13 +57,22 @@ class Chart(Base):
         return f"<Chart(id={self.id}, title='{self.title}')>"
 
 
-class DataItem(Base):  # возможно потом будет реализовано, метаданные о файлах, загруженных юзерами
+class DataItem(Base):  # метаданные о наборах данных, загруженных юзерами
     __tablename__ = "data_items"
 
     id = Column(String, primary_key=True)
     filename = Column(String, nullable=False)
-    file_size = Column(Integer, nullable=True)
+    file_size = Column(BigInteger, nullable=True)  # размер сохранённого артефакта (parquet-файлов / таблицы), байт
     content_type = Column(String, nullable=True)
+    storage = Column(String, nullable=False, default="postgres", server_default="postgres")  # хранилище набора, см. app.storage
+    row_count = Column(Integer, nullable=True)
+    inferred_schema = Column(JSON, nullable=True)  # типы колонок, определённые при загрузке, см. schema_inference
+    rollups = Column(JSON, nullable=True)  # предагрегаты, посчитанные при загрузке, см. app.services.rollups
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # растёт при каждой дозаписи строк
+    dedupe_key = Column(JSON, nullable=True)  # колонки ключа, по которым дозапись пропускает дубликаты
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 загруженного файла; сбрасывается при дозаписи
+    content_size = Column(BigInteger, nullable=True, index=True)  # размер загруженного файла, байт; для поиска повторов
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")  # число ссылок UserDataItem на набор
     created_at = Column(DateTime, nullable=False, server_default=func.now())
 
     uploads = relationship(
@@ -88,3 +97,29 @@ class UserDataItem(Base):
 
     def __repr__(self):
         return f"<UserDataItem(user_id={self.user_id}, data_id={self.data_id}, uploaded_at={self.uploaded_at})>"
+
+
+class UploadJob(Base):  # фоновые загрузки CSV и их прогресс; таблица служит и очередью, см. app.services.jobs
+    __tablename__ = "upload_jobs"
+
+    id = Column(String, primary_key=True)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, done, failed, cancelled
+    filename = Column(String, nullable=False)
+    spool_path = Column(String, nullable=False)  # файл в config.jobs.spool_dir, удаляется после успешной загрузки
+    params = Column(JSON, nullable=False)  # параметры /upload/csv
+    rows_loaded = Column(BigInteger, nullable=False, default=0, server_default="0")
+    bytes_processed = Column(BigInteger, nullable=False, default=0, server_default="0")
+    bytes_total = Column(BigInteger, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    cancel_requested = Column(Boolean, nullable=False, default=False, server_default="0")
+    result = Column(JSON, nullable=True)  # ответ /upload/csv
+    error = Column(Text, nullable=True)
+    # время в UTC ставит приложение, чтобы сравнивать его без учёта часового пояса сервера БД
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)  # последняя отметка процесса, выполняющего задачу
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<UploadJob(id={self.id}, status='{self.status}')>"
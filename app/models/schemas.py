@@ -1,14 +1,16 @@
 """Модели Pydantic для API."""
-from pydantic import BaseModel, EmailStr, field_validator, Field, ConfigDict
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, EmailStr, computed_field, field_validator, model_validator, Field, ConfigDict
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Literal
 
 
-class ChartData(BaseModel):
-    data: List[Dict[str, Any]]
+class ChartFields(BaseModel):
     chart_type: str
     x_field: str
     y_field: str
     color_field: Optional[str] = None
+    max_points: Optional[int] = Field(default=None, ge=3)  # прореживание line/scatter до max_points точек
+    scatter_sampling: Literal["minmax", "random"] = "minmax"
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
     @field_validator("chart_type")
@@ -19,6 +21,10 @@ class ChartData(BaseModel):
             raise ValueError(f"Тип графика должен быть одним из {allowed_types}, получено '{v}'")
         return v
 
+
+class ChartData(ChartFields):
+    data: List[Dict[str, Any]]
+
     @field_validator("data")
     @classmethod
     def validate_data_not_empty(cls, v: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -27,6 +33,31 @@ class ChartData(BaseModel):
         return v
 
 
+class DatasetChartRequest(ChartFields):
+    """Запрос графика по загруженному набору данных, агрегация выполняется в БД."""
+    data_id: str
+    aggregate: Literal["sum", "mean", "count"] = "sum"
+    time_unit: Optional[Literal["hour", "day", "week", "month", "quarter", "year"]] = None
+
+
+class DashboardRequest(BaseModel):
+    """
+    Несколько графиков по одним данным: строки data из запроса или загруженный набор data_id
+    (задаётся что-то одно). Данные готовятся один раз и передаются в ответе один раз.
+    """
+    data: Optional[List[Dict[str, Any]]] = None
+    data_id: Optional[str] = None
+    charts: List[ChartFields] = Field(min_length=1, max_length=50)
+
+    @model_validator(mode="after")
+    def validate_source(self) -> "DashboardRequest":
+        if (self.data is None) == (self.data_id is None):
+            raise ValueError("Нужно передать либо data, либо data_id")
+        if self.data is not None and not self.data:
+            raise ValueError("Данные не могут быть пустыми")
+        return self
+
+
 class OrganizationBase(BaseModel):
     name: str
     iiko_api_key: Optional[str] = None
@@ -65,6 +96,41 @@ class UserInDB(UserBase):
     hashed_password: str = Field(exclude=True)
 
 
+class CurrentUser(UserBase):
+    """Пользователь запроса: снимок строки users без хеша пароля, живёт в кэше `user_cache`."""
+    id: int
+    is_admin: bool = False
+    model_config = ConfigDict(from_attributes=True)
+
+    @property
+    def role(self) -> str:
+        return "admin" if self.is_admin else "user"
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str = 'bearer'
+
+
+class UploadJobStatus(BaseModel):
+    """Состояние фоновой загрузки (/upload/jobs/{job_id})."""
+    id: str
+    status: Literal["queued", "running", "done", "failed", "cancelled"]
+    filename: str
+    rows_loaded: int
+    bytes_processed: int
+    bytes_total: Optional[int] = None
+    attempts: int
+    cancel_requested: bool
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    model_config = ConfigDict(from_attributes=True)
+
+    @computed_field
+    @property
+    def progress(self) -> Optional[float]:
+        """Доля обработанных байт файла."""
+        return self.bytes_processed / self.bytes_total if self.bytes_total else None
@@ -0,0 +1,90 @@
+"""Хэширование и проверка паролей в отдельном ограниченном пуле потоков."""
+
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple, TypeVar
+from fastapi import HTTPException, status
+from pwdlib import PasswordHash
+from app.config.settings import PasswordHashSettings, config
+from app.middleware.logging import logger
+from app.middleware.metrics import span
+
+
+T = TypeVar("T")
+
+
+class PasswordHasher:
+    """
+    Argon2 (`PasswordHash.recommended()`) вне цикла событий.
+
+    Argon2 намеренно медленный и занимает ядро, поэтому пароли хэшируются в собственном пуле
+    из `workers` потоков (argon2-cffi отпускает GIL), отдельно от `executor`: всплеск входов
+    не занимает слоты построения графиков, и наоборот. Если ждут уже `max_waiting` запросов или
+    задача не начала выполняться за `queue_timeout` секунд, клиент получает 503.
+    """
+
+    def __init__(self, settings: PasswordHashSettings, context: PasswordHash | None = None):
+        self.settings = settings
+        self.context = context or PasswordHash.recommended()
+        self._slots = threading.BoundedSemaphore(settings.workers + settings.max_waiting)
+        self._lock = threading.Lock()
+        self._pool: ThreadPoolExecutor | None = None
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.settings.workers, thread_name_prefix="foodnet-hash")
+            return self._pool
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self.context.verify, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """
+        Проверяет пароль; вторым элементом - новый хэш, если `hashed` получен устаревшим
+        алгоритмом или параметрами (его нужно сохранить), иначе None.
+        """
+        return await self._run(self.context.verify_and_update, password, hashed)
+
+    async def _run(self, func: Callable[..., T], *args: Any) -> T:
+        if not self._slots.acquire(blocking=False):
+            logger.warning("Очередь хэширования паролей заполнена (%s)", self.settings.max_waiting)
+            raise _busy()
+        try:
+            future: Future = self.pool.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        waiting = asyncio.wrap_future(future)
+        with span("auth.password_hash"):
+            try:
+                return await asyncio.wait_for(asyncio.shield(waiting), timeout=self.settings.queue_timeout)
+            except asyncio.TimeoutError:
+                # не начатая задача снимается с очереди, уже выполняющуюся дожидаемся
+                if future.cancel():
+                    logger.warning("Хэширование пароля не началось за %s с", self.settings.queue_timeout)
+                    raise _busy()
+                return await waiting
+
+
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Сервер перегружен, повторите позже",
+        headers={"Retry-After": "1"},
+    )
+
+
+password_hasher = PasswordHasher(config.password_hash)
@@ -0,0 +1,235 @@
+"""
+Хранилище счётчиков лимитов запросов, общее для процессов uvicorn на одном хосте.
+
+slowapi по умолчанию держит счётчики в памяти процесса, и при N воркерах каждый считает
+свои запросы: лимит '4/minute' фактически становится 4*N. `SharedMemoryStorage` хранит
+счётчики в файле, отображённом в память всех воркеров (mmap, MAP_SHARED), лучше всего
+в tmpfs: `shm:///dev/shm/foodnet-ratelimit`.
+
+Файл - хэш-таблица фиксированного размера, разбитая на полосы (stripes). Ключ попадает
+в одну полосу и ищется в ней линейным пробированием. Чтение (get, get_expiry) не берёт
+блокировок и не делает системных вызовов: согласованность проверяется версией полосы
+(seqlock). Запись (incr, clear) идёт под блокировкой своей полосы - threading.Lock внутри
+процесса и fcntl.lockf на байты полосы между процессами, так что воркеры, обновляющие
+разные ключи, обычно друг друга не ждут. Ячейки с истёкшим окном занимают новые ключи,
+поэтому неактивные ключи вытесняются без отдельной чистки.
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from limits.storage import Storage
+
+
+MAGIC = b"FNRLIM01"
+HEADER = struct.Struct("<8sII")  # MAGIC, число ячеек, число полос
+HEADER_SIZE = 64
+SEQ = struct.Struct("<Q")  # версия полосы: нечётная - полоса сейчас меняется
+SLOT = struct.Struct("<16sdq")  # хэш ключа, конец окна (time.time()), счётчик
+EMPTY = bytes(16)  # в ячейку ни разу не писали: дальше в полосе ключа нет
+READ_RETRIES = 100  # попыток чтения без блокировки, дальше чтение под блокировкой
+
+
+class SharedMemoryStorage(Storage):
+    """
+    Счётчики limits в общем для процессов файле: `shm:///путь?slots=16384&stripes=64`.
+
+    Рассчитано на стратегию fixed-window (стратегия slowapi по умолчанию). Если файл уже
+    размечен другим процессом, размеры таблицы берутся из него, а не из URI. Если в полосе
+    не осталось ни свободных, ни истёкших ячеек, вытесняется ключ, окно которого
+    закончится раньше всех.
+    """
+
+    STORAGE_SCHEME = ["shm"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        parsed = urlparse(uri)
+        path = parsed.netloc + parsed.path
+        if not path:
+            raise ValueError(f"В URI хранилища лимитов не указан файл: {uri}")
+        query = {name: values[-1] for name, values in parse_qs(parsed.query).items()}
+        slots, stripes = int(query.get("slots", 16384)), int(query.get("stripes", 64))
+        if stripes < 1 or slots < stripes or slots % stripes:
+            raise ValueError("Число ячеек (slots) должно быть кратно числу полос (stripes)")
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self.slots, self.stripes = self._layout(slots, stripes)
+            self.stripe_slots = self.slots // self.stripes
+            self._slots_offset = HEADER_SIZE + self.stripes * SEQ.size
+            self._map = mmap.mmap(self._fd, self._slots_offset + self.slots * SLOT.size)
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self._thread_locks = [threading.Lock() for _ in range(self.stripes)]
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    def _layout(self, slots: int, stripes: int) -> Tuple[int, int]:
+        # воркеры стартуют одновременно: таблицу размечает первый, остальные берут её размеры
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+        try:
+            header = os.pread(self._fd, HEADER.size, 0)
+            if len(header) == HEADER.size:
+                magic, file_slots, file_stripes = HEADER.unpack(header)
+                size = HEADER_SIZE + file_stripes * SEQ.size + file_slots * SLOT.size
+                if magic == MAGIC and os.fstat(self._fd).st_size == size:
+                    return file_slots, file_stripes
+            os.ftruncate(self._fd, 0)
+            os.ftruncate(self._fd, HEADER_SIZE + stripes * SEQ.size + slots * SLOT.size)
+            os.pwrite(self._fd, HEADER.pack(MAGIC, slots, stripes), 0)
+            return slots, stripes
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+
+    @property
+    def base_exceptions(self):
+        return OSError
+
+    def _place(self, key: str) -> Tuple[bytes, int, int]:
+        """Хэш ключа, его полоса и ячейка, с которой начинается поиск в полосе."""
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        if digest == EMPTY:
+            digest = b"\x01" + digest[1:]
+        position = int.from_bytes(digest[:8], "little")
+        return digest, position % self.stripes, (position // self.stripes) % self.stripe_slots
+
+    def _offsets(self, stripe: int, start: int) -> Iterator[int]:
+        base = self._slots_offset + stripe * self.stripe_slots * SLOT.size
+        for step in range(self.stripe_slots):
+            yield base + (start + step) % self.stripe_slots * SLOT.size
+
+    def _find(self, digest: bytes, stripe: int, start: int) -> Optional[int]:
+        for offset in self._offsets(stripe, start):
+            stored = self._map[offset:offset + 16]
+            if stored == digest:
+                return offset
+            if stored == EMPTY:
+                return None
+        return None
+
+    def _claim(self, digest: bytes, stripe: int, start: int, now: float) -> int:
+        """Ячейка ключа; если её нет - первая свободная или истёкшая, иначе самая ранняя."""
+        free = earliest = None
+        earliest_expiry = float("inf")
+        for offset in self._offsets(stripe, start):
+            stored, expires, _ = SLOT.unpack_from(self._map, offset)
+            if stored == digest:
+                return offset
+            if stored == EMPTY:
+                return free if free is not None else offset
+            if free is None and expires <= now:
+                free = offset
+            if expires < earliest_expiry:
+                earliest, earliest_expiry = offset, expires
+        return free if free is not None else earliest
+
+    def _seq_offset(self, stripe: int) -> int:
+        return HEADER_SIZE + stripe * SEQ.size
+
+    @contextmanager
+    def _locked(self, stripe: int) -> Iterator[None]:
+        seq_offset = self._seq_offset(stripe)
+        with self._thread_locks[stripe]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, SEQ.size, seq_offset)
+            try:
+                seq, = SEQ.unpack_from(self._map, seq_offset)
+                if seq & 1:
+                    # процесс упал посреди записи; блокировка fcntl снята ядром вместе с ним
+                    SEQ.pack_into(self._map, seq_offset, seq + 1)
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, SEQ.size, seq_offset)
+
+    def _write(self, stripe: int, offset: int, digest: bytes, expires: float, count: int) -> None:
+        seq_offset = self._seq_offset(stripe)
+        seq, = SEQ.unpack_from(self._map, seq_offset)
+        SEQ.pack_into(self._map, seq_offset, seq + 1)
+        SLOT.pack_into(self._map, offset, digest, expires, count)
+        SEQ.pack_into(self._map, seq_offset, seq + 2)
+
+    def _read(self, key: str) -> Optional[Tuple[float, int]]:
+        """Конец окна и счётчик ключа или None; без блокировок, пока полоса не меняется."""
+        digest, stripe, start = self._place(key)
+        seq_offset = self._seq_offset(stripe)
+        for _ in range(READ_RETRIES):
+            before, = SEQ.unpack_from(self._map, seq_offset)
+            if before & 1:
+                continue
+            offset = self._find(digest, stripe, start)
+            value = SLOT.unpack_from(self._map, offset)[1:] if offset is not None else None
+            if SEQ.unpack_from(self._map, seq_offset)[0] == before:
+                return value
+        with self._locked(stripe):
+            offset = self._find(digest, stripe, start)
+            return SLOT.unpack_from(self._map, offset)[1:] if offset is not None else None
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        """
+        Увеличивает счётчик ключа; окно длиной expiry секунд начинается с первого запроса.
+
+        Returns:
+            int: Значение счётчика после увеличения.
+        """
+        digest, stripe, start = self._place(key)
+        now = time.time()
+        with self._locked(stripe):
+            offset = self._claim(digest, stripe, start, now)
+            stored, expires, count = SLOT.unpack_from(self._map, offset)
+            if stored != digest or expires <= now:
+                expires, count = now + expiry, 0
+            count += amount
+            self._write(stripe, offset, digest, expires, count)
+        return count
+
+    def get(self, key: str) -> int:
+        value = self._read(key)
+        if value is None or value[0] <= time.time():
+            return 0
+        return value[1]
+
+    def get_expiry(self, key: str) -> float:
+        value = self._read(key)
+        now = time.time()
+        if value is None or value[0] <= now:
+            return now
+        return value[0]
+
+    def check(self) -> bool:
+        return not self._map.closed
+
+    def reset(self) -> int:
+        """
+        Обнуляет все счётчики.
+
+        Returns:
+            int: Сколько ключей с неистёкшим окном было сброшено.
+        """
+        cleared, now = 0, time.time()
+        for stripe in range(self.stripes):
+            with self._locked(stripe):
+                for offset in self._offsets(stripe, 0):
+                    stored, expires, _ = SLOT.unpack_from(self._map, offset)
+                    if stored != EMPTY and expires > now:
+                        cleared += 1
+                    self._write(stripe, offset, EMPTY, 0.0, 0)
+        return cleared
+
+    def clear(self, key: str) -> None:
+        digest, stripe, start = self._place(key)
+        with self._locked(stripe):
+            offset = self._find(digest, stripe, start)
+            if offset is not None:
+                # хэш остаётся в ячейке, чтобы не разорвать цепочку поиска других ключей
+                self._write(stripe, offset, digest, 0.0, 0)
+
+    def close(self) -> None:
+        if not self._map.closed:
+            self._map.close()
+            os.close(self._fd)
@@ -4,19 +4,19 @@ from app.database.connection import get_db
 from datetime import datetime, timedelta, timezone
 from fastapi import Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from pwdlib import PasswordHash
 # from pwdlib.hashers.bcrypt import BcryptHasher
-from app.models.schemas import UserInDB
+from app.models.schemas import CurrentUser
 from app.models.models import User
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.middleware.logging import logger
+from .hashing import password_hasher
+from .user_cache import user_cache
 
 
 oauth2pb = OAuth2PasswordBearer(tokenUrl="login", auto_error=True)
 auth_headers = {"WWW-Authenticate": "Bearer"}
 # ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
-ctx = PasswordHash.recommended()
 
 
 async def get_user_by_username(
@@ -31,13 +31,24 @@ async def auth_user(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db)
 ) -> User:
+    """
+    Проверяет логин и пароль. Пароль проверяется в пуле `password_hasher`; если хэш получен
+    устаревшими параметрами, он пересчитывается и сохраняется.
+    """
     user = await get_user_by_username(form_data.username, db)
     if not user:
-        logger.warning(f"User not found: {form_data.username}")
+        logger.warning("User not found: %s", form_data.username)
         raise HTTPException(status_code=404, detail="User not found", headers=auth_headers)
-    if not ctx.verify(form_data.password, user.hashed_password):
-        logger.warning(f"Invalid password for {form_data.username}")
+    # соединение возвращается в пул на время проверки пароля (объекты после commit не сбрасываются)
+    await db.commit()
+    valid, updated_hash = await password_hasher.verify_and_update(form_data.password, user.hashed_password)
+    if not valid:
+        logger.warning("Invalid password for %s", form_data.username)
         raise HTTPException(status_code=401, detail="Authorization failed", headers=auth_headers)
+    if updated_hash is not None:
+        user.hashed_password = updated_hash
+        await db.commit()
+        logger.info("Хэш пароля пользователя %s обновлён", form_data.username)
     return user
 
 
@@ -57,23 +68,48 @@ def get_access_token(token: str | None = Depends(oauth2pb)) -> str | None:
     return token
 
 
-def create_hashed_password(password: str) -> str:
-    return ctx.hash(password)
+async def create_hashed_password(password: str) -> str:
+    return await password_hasher.hash(password)
 
 
-async def get_user_from_jwt(token: str | None = Depends(get_access_token)) -> UserInDB:
-    payload = decode_jwt(token)
-    user = await get_user_by_username(payload['sub'])
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
-
+def request_jwt_payload(request: Request) -> dict | None:
+    """
+    Payload токена из заголовка Authorization или None, если токена нет или он невалиден.
 
-def get_username_from_request(request: Request) -> str:
+    Токен разбирается один раз на запрос, результат запоминается в `request.state`
+    и переиспользуется функцией ключа лимитов и `get_user_from_jwt`.
+    """
+    if hasattr(request.state, "jwt_payload"):
+        return request.state.jwt_payload
     auth_header = request.headers.get("Authorization")
     token = auth_header.split()[-1] if auth_header else None
     try:
-        payload = decode_jwt(token)
-        return payload.get("sub", "_guest")
+        payload = decode_jwt(token) if token else None
     except HTTPException:
-        return "_guest"
+        payload = None
+    request.state.jwt_payload = payload
+    return payload
+
+
+async def get_user_from_jwt(
+    request: Request,
+    token: str | None = Depends(get_access_token),
+    db: AsyncSession = Depends(get_db)
+) -> CurrentUser:
+    """Пользователь запроса по JWT; при попадании в `user_cache` запрос к БД не выполняется."""
+    payload = request_jwt_payload(request)
+    if payload is None or "sub" not in payload:
+        raise HTTPException(status_code=401, detail="Invalid or expired token", headers=auth_headers)
+    user = user_cache.get(payload["sub"])
+    if user is None:
+        db_user = await get_user_by_username(payload["sub"], db)
+        if not db_user:
+            raise HTTPException(status_code=404, detail="User not found")
+        user = CurrentUser.model_validate(db_user)
+        user_cache.put(user)
+    return user
+
+
+def get_username_from_request(request: Request) -> str:
+    payload = request_jwt_payload(request)
+    return payload.get("sub", "_guest") if payload else "_guest"
@@ -0,0 +1,72 @@
+"""Кэш пользователей процесса для горячего пути авторизации и лимитов запросов."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from sqlalchemy import event, inspect
+from app.config.settings import AuthCacheSettings, config
+from app.models.models import User
+from app.models.schemas import CurrentUser
+
+
+class UserCache:
+    """
+    LRU пользователей по username, записи живут `ttl` секунд.
+
+    Кэш заполняется при разборе токена в `get_user_from_jwt`, а функция лимитов slowapi
+    читает из него роль без обращения к БД. Запись сбрасывается при изменении строки
+    users в этом процессе (см. обработчики событий ниже); изменения из других процессов
+    подхватываются по истечении ttl.
+    """
+
+    def __init__(self, settings: AuthCacheSettings):
+        self.settings = settings
+        self._entries: OrderedDict[str, Tuple[float, CurrentUser]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username: str) -> Optional[CurrentUser]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires < time.monotonic():
+                del self._entries[username]
+                return None
+            self._entries.move_to_end(username)
+            return user
+
+    def put(self, user: CurrentUser) -> None:
+        if self.settings.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user.username] = (time.monotonic() + self.settings.ttl, user)
+            self._entries.move_to_end(user.username)
+            while len(self._entries) > self.settings.max_size:
+                self._entries.popitem(last=False)
+
+    def role(self, username: str) -> Optional[str]:
+        user = self.get(username)
+        return user.role if user else None
+
+    def invalidate(self, username: str) -> None:
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(config.auth_cache)
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target: User) -> None:
+    # регистрация, смена роли (is_admin) или удаление пользователя
+    user_cache.invalidate(target.username)
+    for old_username in inspect(target).attrs.username.history.deleted or ():
+        user_cache.invalidate(old_username)
@@ -1,13 +1,23 @@
-from app.database.utils import get_user
+from .rate_limit_storage import SharedMemoryStorage  # noqa: F401 - регистрирует схему shm:// в limits
 from .security import get_username_from_request
+from .user_cache import user_cache
 from slowapi import Limiter
+from app.config.settings import config
+
+
+ROLE_RATE_LIMITS = {'admin': '6/minute', 'user': '4/minute'}
+GUEST_RATE_LIMIT = '2/minute'
 
 
 def get_rate_limit_by_role(key: str) -> str:
-    if user := get_user(key):
-        rbl = {'admin': '6/minute', 'user': '4/minute'}
-        return rbl.get(user.role)
-    return '2/minute'
+    """
+    Лимит запросов по роли пользователя-ключа без обращения к БД.
+
+    Роль берётся из `user_cache`, который заполняет `get_user_from_jwt` до вызова эндпоинта;
+    если пользователя в кэше нет (гость или маршрут без авторизации), действует гостевой лимит.
+    """
+    return ROLE_RATE_LIMITS.get(user_cache.role(key), GUEST_RATE_LIMIT)
 
 
-limiter = Limiter(key_func=get_username_from_request)
+# с rate_limit.storage_uri = shm://... счётчики общие для всех воркеров хоста
+limiter = Limiter(key_func=get_username_from_request, storage_uri=config.rate_limit.storage_uri)
@@ -0,0 +1,199 @@
+"""Кэш готовых графиков по хэшу запроса: LRU в памяти и необязательный уровень на диске."""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from fastapi import Request
+from app.config.settings import ChartCacheSettings, config
+from app.middleware.logging import logger
+from app.services.executor import executor
+
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    """
+    Стабильный sha256 запроса графика.
+
+    Ключи сортируются, поэтому порядок полей в запросе не влияет на результат. Для больших
+    данных считать ключ стоит в пуле потоков.
+    """
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def etag_for(key: str) -> str:
+    return f'"{key}"'
+
+
+def etag_matches(request: Request, key: str) -> bool:
+    """Проверяет If-None-Match: график по тому же ключу у клиента уже есть."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag_for(key) in tags
+
+
+class ChartCache:
+    """
+    Кэш сериализованных графиков.
+
+    В памяти - LRU, ограниченный суммарным размером `max_bytes`, записи живут `ttl` секунд.
+    Если задан `disk_dir`, записи дублируются на диск и переживают перезапуск процесса;
+    с диска они поднимаются обратно в память при первом обращении. Дисковый уровень тоже
+    LRU: объём ограничен `disk_max_bytes`, просроченные файлы удаляются при каждой записи.
+    Индекс файлов строится сканированием каталога при первом обращении к диску и дальше
+    ведётся в памяти процесса, поэтому при нескольких процессах на один каталог граница
+    соблюдается приблизительно.
+    """
+
+    def __init__(self, settings: ChartCacheSettings):
+        self.settings = settings
+        self._entries: OrderedDict[str, Tuple[float, bytes]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "disk_evictions": 0}
+        # key -> (mtime, размер) файлов дискового уровня в порядке последнего обращения
+        self._disk_index: Optional[OrderedDict[str, Tuple[float, int]]] = None
+        self._disk_size = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        body = self._get_memory(key)
+        if body is None and self.settings.disk_dir:
+            body = await executor.run_thread(self._get_disk, key)
+            if body is not None:
+                self._put_memory(key, body)
+        with self._lock:
+            self._counters["misses" if body is None else "hits"] += 1
+        return body
+
+    async def put(self, key: str, body: bytes) -> None:
+        if len(body) > self.settings.max_entry_bytes:
+            return
+        self._put_memory(key, body)
+        if self.settings.disk_dir:
+            await executor.run_thread(self._put_disk, key, body)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            if (entry := self._entries.pop(key, None)) is not None:
+                self._size -= len(entry[1])
+        if self.settings.disk_dir:
+            self._forget_disk(key)
+            self._disk_path(key).unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), bytes=self._size, max_bytes=self.settings.max_bytes,
+                        disk_bytes=self._disk_size)
+
+    def _get_memory(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, body = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._size -= len(body)
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def _put_memory(self, key: str, body: bytes) -> None:
+        with self._lock:
+            if (old := self._entries.pop(key, None)) is not None:
+                self._size -= len(old[1])
+            self._entries[key] = (time.monotonic() + self.settings.ttl, body)
+            self._size += len(body)
+            while self._size > self.settings.max_bytes and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self._counters["evictions"] += 1
+
+    def _disk_path(self, key: str) -> Path:
+        return Path(self.settings.disk_dir) / key[:2] / f"{key}.json"
+
+    def _load_disk_index(self) -> None:
+        """Строит индекс дискового уровня по файлам каталога (один раз на процесс)."""
+        if self._disk_index is not None:
+            return
+        files = []
+        for path in Path(self.settings.disk_dir).glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        with self._lock:
+            if self._disk_index is None:
+                self._disk_index = OrderedDict((key, (mtime, size)) for mtime, key, size in sorted(files))
+                self._disk_size = sum(size for _, size in self._disk_index.values())
+
+    def _forget_disk(self, key: str) -> None:
+        with self._lock:
+            if self._disk_index is not None and (entry := self._disk_index.pop(key, None)) is not None:
+                self._disk_size -= entry[1]
+
+    def _prune_disk(self) -> None:
+        """Удаляет просроченные файлы и давно не читанные сверх `disk_max_bytes`."""
+        expired_before = time.time() - self.settings.ttl
+        with self._lock:
+            doomed = [key for key, (mtime, _) in self._disk_index.items() if mtime < expired_before]
+            for key in doomed:
+                self._disk_size -= self._disk_index.pop(key)[1]
+            while self._disk_size > self.settings.disk_max_bytes and self._disk_index:
+                key, (_, size) = self._disk_index.popitem(last=False)
+                self._disk_size -= size
+                self._counters["disk_evictions"] += 1
+                doomed.append(key)
+        for key in doomed:
+            self._disk_path(key).unlink(missing_ok=True)
+
+    def _get_disk(self, key: str) -> Optional[bytes]:
+        self._load_disk_index()
+        path = self._disk_path(key)
+        try:
+            if path.stat().st_mtime + self.settings.ttl < time.time():
+                self._forget_disk(key)
+                path.unlink(missing_ok=True)
+                return None
+            body = path.read_bytes()
+        except FileNotFoundError:
+            self._forget_disk(key)
+            return None
+        with self._lock:
+            self._counters["disk_hits"] += 1
+            if key in self._disk_index:
+                self._disk_index.move_to_end(key)
+        return body
+
+    def _put_disk(self, key: str, body: bytes) -> None:
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # запись через временный файл, чтобы параллельный читатель не увидел половину графика
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(body)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Не удалось сохранить график %s в дисковый кэш: %s", key, e)
+            return
+        self._load_disk_index()
+        self._forget_disk(key)
+        with self._lock:
+            self._disk_index[key] = (time.time(), len(body))
+            self._disk_size += len(body)
+        self._prune_disk()
+
+
+chart_cache = ChartCache(config.chart_cache)
@@ -0,0 +1,99 @@
+"""Форматы ответа с графиком и выбор формата по заголовку Accept."""
+
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+from fastapi.encoders import jsonable_encoder
+from app.lazy import lazy_import
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+else:
+    pd = lazy_import("pandas")
+    pa = lazy_import("pyarrow")
+
+
+JSON = "application/json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+COLUMNAR_JSON = "application/vnd.foodnet.columnar+json"
+
+# имя набора данных, на который ссылается спецификация в форматах, где данные идут отдельно
+DATASET_NAME = "values"
+# ключ метаданных схемы Arrow со спецификацией Vega-Lite
+ARROW_SPEC_KEY = b"vega_lite_spec"
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """
+    Выбирает формат ответа по заголовку Accept с учётом q-весов.
+
+    Returns:
+        Optional[str]: Поддерживаемый media type или None, если клиент не принимает ни один из них.
+    """
+    if not accept:
+        return JSON
+    candidates = []
+    for position, item in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            candidates.append((-q, position, media_type.lower()))
+    for _, _, media_type in sorted(candidates):
+        if media_type in ENCODERS:
+            return media_type
+        if media_type in ("*/*", "application/*"):
+            return JSON
+    return None
+
+
+def encode_json(chart_dict: Dict[str, Any]) -> bytes:
+    """Спецификация с data.values в JSON - так же, как её отдавал бы JSONResponse FastAPI."""
+    return json.dumps(
+        jsonable_encoder(chart_dict),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def encode_arrow(spec: Dict[str, Any], df: pd.DataFrame) -> bytes:
+    """
+    Arrow IPC stream с данными графика, спецификация лежит в метаданных схемы (`vega_lite_spec`).
+
+    Числовые колонки переносятся из буферов DataFrame без создания python-объектов на строку.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[ARROW_SPEC_KEY] = json.dumps(spec, ensure_ascii=False).encode("utf-8")
+    table = table.replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_columnar(spec: Dict[str, Any], df: pd.DataFrame) -> bytes:
+    """
+    Колоночный JSON: {"spec": ..., "data": {"колонка": [значения], ...}}.
+
+    Каждая колонка сериализуется целиком сишным энкодером pandas, без словаря на строку.
+    """
+    columns = ",".join(
+        f"{json.dumps(str(name), ensure_ascii=False)}:{df[name].to_json(orient='values', date_format='iso', force_ascii=False)}"
+        for name in df.columns
+    )
+    return f'{{"spec":{json.dumps(spec, ensure_ascii=False)},"data":{{{columns}}}}}'.encode("utf-8")
+
+
+ENCODERS: Dict[str, Optional[Callable[[Dict[str, Any], pd.DataFrame], bytes]]] = {
+    JSON: None,  # для JSON данные встраиваются в спецификацию, см. chart_service.prepare_chart_response
+    ARROW_STREAM: encode_arrow,
+    COLUMNAR_JSON: encode_columnar,
+}
@@ -1,13 +1,40 @@
-from fastapi import APIRouter, Body, HTTPException, status
-from typing import List, Dict, Optional, Any
-import altair as alt
-import pandas as pd
+from __future__ import annotations
+import asyncio
+import re
+from contextlib import contextmanager
+from functools import lru_cache
+from fastapi import APIRouter, Body, HTTPException, Request, Response, status
+from time import perf_counter
+from typing import TYPE_CHECKING, Callable, Iterator, List, Dict, Optional, Any, Tuple
+from app.config.settings import config
 from app.middleware.logging import logger
-from app.models.schemas import ChartData
+from app.middleware.metrics import span
+from app.models.schemas import ChartData, ChartFields, DashboardRequest, DatasetChartRequest
+from app.services.executor import executor
+from app.services.downsampling import downsample
+from app.services.cache import cache_key, chart_cache, etag_for, etag_matches
+from app.services.chart_formats import DATASET_NAME, ENCODERS, JSON, encode_json, negotiate
+from app.storage.registry import Dataset, open_dataset
+from app.lazy import lazy_import
+if TYPE_CHECKING:
+    import altair as alt
+    import pandas as pd
+else:
+    alt = lazy_import("altair")
+    pd = lazy_import("pandas")
 
 
 router = APIRouter()
 
+# имя общего набора данных в ответе /dashboard
+SHARED_DATASET = "source"
+# имена полей, под которые строятся шаблоны спецификаций (см. `chart_template`); заголовок оси -
+# имя поля через str.capitalize(), поэтому у заголовка своё значение-заполнитель
+TEMPLATE_FIELDS = {"x": "foodnet_x_field", "y": "foodnet_y_field", "color": "foodnet_color_field"}
+# в сокращённой записи Altair ("sum(x)", "x:Q") такие символы меняют смысл поля - эти графики
+# строятся через Altair
+SHORTHAND_CHARS = re.compile(r"[:()]")
+
 
 class ChartGenerator:
     """Класс для генерации графиков на основе типа"""
@@ -26,6 +53,10 @@ class ChartGenerator:
             color=alt.Color(f"{x_field}:N")
         )
 
+    @classmethod
+    def chart_types(cls) -> List[str]:
+        return [*cls.SUPPORTED_CHARTS, "pie"]
+
     @classmethod
     def generate(cls, chart_type: str, df: pd.DataFrame, encoding: Dict[str, alt.X | alt.Y | alt.Color],
                  x_field: str, y_field: str) -> alt.Chart:
@@ -39,6 +70,67 @@ class ChartGenerator:
         return chart.properties(title="FoodNet Analytics Chart")
 
 
+class SpecTemplate:
+    """
+    Спецификация Vega-Lite графика одного типа, построенная Altair один раз для полей-заполнителей
+    `TEMPLATE_FIELDS`. Для запроса в ней заменяются только имена полей и заголовки осей.
+    """
+
+    def __init__(self, skeleton: Dict[str, Any]):
+        self.skeleton = skeleton
+
+    def render(self, x_field: str, y_field: str, color_field: Optional[str] = None) -> Dict[str, Any]:
+        """Спецификация для полей запроса (новый словарь, шаблон не меняется)."""
+        values = {}
+        for role, field in (("x", x_field), ("y", y_field), ("color", color_field)):
+            if field is not None:
+                values[TEMPLATE_FIELDS[role]] = field
+                values[TEMPLATE_FIELDS[role].capitalize()] = field.capitalize()
+        return _fill(self.skeleton, values)
+
+
+def _fill(node: Any, values: Dict[str, str]) -> Any:
+    if isinstance(node, dict):
+        return {key: _fill(value, values) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_fill(value, values) for value in node]
+    if isinstance(node, str):
+        return values.get(node, node)
+    return node
+
+
+@lru_cache
+def chart_template(chart_type: str, with_color: bool) -> SpecTemplate:
+    """
+    Шаблон графика chart_type: строится и проверяется по схеме Vega-Lite (`to_dict`) один раз
+    на процесс, тем же кодом, что и график через Altair, поэтому спецификации совпадают.
+    """
+    fields = TEMPLATE_FIELDS
+    df = pd.DataFrame(columns=list(fields.values()))
+    encoding = build_encoding(fields["x"], fields["y"], fields["color"] if with_color else None)
+    skeleton = ChartGenerator.generate(chart_type, df, encoding, fields["x"], fields["y"]).to_dict()
+    skeleton.pop("datasets", None)
+    return SpecTemplate(skeleton)
+
+
+def build_spec(chart_type: str, x_field: str, y_field: str, color_field: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Спецификация графика без данных: по шаблону `chart_template`, без построения объектов Altair
+    и проверки по схеме Vega-Lite на каждый запрос. Поля, которые Altair разобрал бы как сокращённую
+    запись (`SHORTHAND_CHARS`), идут через Altair, как раньше.
+    """
+    fields = (x_field, y_field, color_field or "")
+    if any(SHORTHAND_CHARS.search(field) for field in fields):
+        encoding = build_encoding(x_field, y_field, color_field)
+        df = pd.DataFrame(columns=list(dict.fromkeys(field for field in fields if field)))
+        chart_dict = ChartGenerator.generate(chart_type, df, encoding, x_field, y_field).to_dict()
+        chart_dict.pop("datasets", None)
+        return chart_dict
+    # пустая строка - без color, как в `build_encoding`
+    with_color = bool(color_field) and chart_type != "pie"
+    return chart_template(chart_type, with_color).render(x_field, y_field, color_field if with_color else None)
+
+
 def validate_dataframe_fields(df: pd.DataFrame, x_field: str, y_field: str, color_field: Optional[str] = None) -> None:
     """Проверяет наличие необходимых полей в DataFrame"""
     required_fields = [x_field, y_field]
@@ -49,16 +141,25 @@ def validate_dataframe_fields(df: pd.DataFrame, x_field: str, y_field: str, colo
         raise ValueError(f"Отсутствуют обязательные поля в данных: {missing_fields}")
 
 
-def prepare_dataframe(data: List[Dict[str, Any]], x_field: str) -> pd.DataFrame:
-    """Преобразует данные в DataFrame и обрабатывает типы"""
-    df = pd.DataFrame(data)
+def prepare_dataframe(data: List[Dict[str, Any]] | pd.DataFrame, x_field: str, x_dtype: Optional[str] = None) -> pd.DataFrame:
+    """
+    Преобразует данные в DataFrame и обрабатывает типы
 
-    try:
-        df[x_field] = pd.to_datetime(df[x_field])
-    except Exception as e:
-        logger.warning(f"Не удалось преобразовать поле {x_field} в datetime: {e}. Используется исходный тип.")
+    x_dtype - тип оси X из схемы набора (`Dataset.dtype`): если он известен и это не дата,
+    разбор X как времени пропускается.
+    """
+    with span("chart.prepare"):
+        df = pd.DataFrame(data)
+        if pd.api.types.is_datetime64_any_dtype(df[x_field]) or (x_dtype and not x_dtype.startswith("datetime64")):
+            # тип уже определён при загрузке набора, повторный разбор не нужен
+            return df
 
-    return df
+        try:
+            df[x_field] = pd.to_datetime(df[x_field])
+        except Exception as e:
+            logger.warning("Не удалось преобразовать поле %s в datetime: %s. Используется исходный тип.", x_field, e)
+
+        return df
 
 
 def build_encoding(x_field: str, y_field: str, color_field: Optional[str] = None) -> Dict[str, alt.X | alt.Y | alt.Color]:
@@ -74,76 +175,441 @@ def build_encoding(x_field: str, y_field: str, color_field: Optional[str] = None
     return encoding
 
 
-def prepare_chart_response(chart: alt.Chart, df: pd.DataFrame) -> Dict[str, Any]:
-    """Подготавливает финальный ответ с графиком"""
-    chart_dict = chart.to_dict()
-    chart_dict["data"] = {"values": df.to_dict(orient="records")}
+def prepare_chart_response(chart_dict: Dict[str, Any], df: pd.DataFrame) -> Dict[str, Any]:
+    """Подготавливает финальный ответ с графиком: данные встраиваются в спецификацию"""
+    with span("chart.to_dict"):
+        chart_dict["data"] = {"values": df.to_dict(orient="records")}
+    return chart_dict
 
-    # Удаляем datasets если существует
-    chart_dict.pop("datasets", None)
 
+def chart_spec(chart_dict: Dict[str, Any], usermeta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Спецификация без встроенных данных: data ссылается на именованный набор DATASET_NAME."""
+    chart_dict["data"] = {"name": DATASET_NAME}
+    if usermeta:
+        chart_dict["usermeta"] = usermeta
     return chart_dict
 
 
-@router.post("/generate_chart", status_code=status.HTTP_200_OK)
-async def generate_chart(chart_data: ChartData = Body(...)) -> Dict[str, Any]:
+def build_chart_spec(data: List[Dict[str, Any]], chart_type: str, x_field: str, y_field: str,
+                     color_field: Optional[str] = None, max_points: Optional[int] = None,
+                     scatter_sampling: str = "minmax") -> Dict[str, Any]:
     """
-    Генерирует график на основе переданных данных
+    Полный цикл построения графика: DataFrame, валидация, encoding, Altair, сериализация.
 
+    Чистая функция верхнего уровня, чтобы её можно было выполнять в пуле процессов.
+    """
+    # Подготовка данных
+    df = prepare_dataframe(data, x_field)
+    return build_chart_spec_from_df(df, chart_type, x_field, y_field, color_field, max_points, scatter_sampling)
 
-    Args:
-        chart_data: Данные для построения графика
 
+def build_chart_from_df(df: pd.DataFrame, chart_type: str, x_field: str, y_field: str,
+                        color_field: Optional[str] = None, max_points: Optional[int] = None,
+                        scatter_sampling: str = "minmax") -> Tuple[Dict[str, Any], pd.DataFrame, Dict[str, Any]]:
+    """
+    Строит спецификацию графика (`build_spec`) по подготовленному DataFrame.
+
+    Если задан max_points, line/scatter прореживаются, а число точек до и после
+    возвращается в usermeta (`points`). Данные в спецификацию не встраиваются, это делает
+    вызывающий (`prepare_chart_response` или `chart_spec`).
 
     Returns:
-        Dict с конфигурацией Altair графика
+        Tuple[Dict[str, Any], pd.DataFrame, Dict[str, Any]]: Спецификация, (прореженные) данные и usermeta.
+    """
+    # Валидация наличия полей
+    validate_dataframe_fields(df, x_field, y_field, color_field)
+
+    # Прореживание
+    original_points = len(df)
+    with span("chart.downsample"):
+        df = downsample(df, chart_type, x_field, y_field, max_points, color_field, scatter_sampling)
+    usermeta = {"points": {"original": original_points, "returned": len(df)}} if max_points else {}
+
+    # Генерация графика
+    with span("chart.build"):
+        chart_dict = build_spec(chart_type, x_field, y_field, color_field)
+    return chart_dict, df, usermeta
+
+
+def build_chart_spec_from_df(df: pd.DataFrame, chart_type: str, x_field: str, y_field: str,
+                             color_field: Optional[str] = None, max_points: Optional[int] = None,
+                             scatter_sampling: str = "minmax") -> Dict[str, Any]:
+    """То же, что `build_chart_spec`, для уже подготовленного DataFrame."""
+    chart_dict, df, usermeta = build_chart_from_df(df, chart_type, x_field, y_field, color_field, max_points, scatter_sampling)
+
+    # Подготовка ответа
+    chart_dict = prepare_chart_response(chart_dict, df)
+    if usermeta:
+        chart_dict["usermeta"] = usermeta
+    return chart_dict
 
 
-    Raises:
-        HTTPException: При ошибках валидации или генерации графика
+def render_chart_from_df(media_type: str, df: pd.DataFrame, chart_type: str, x_field: str, y_field: str,
+                         color_field: Optional[str] = None, max_points: Optional[int] = None,
+                         scatter_sampling: str = "minmax") -> bytes:
     """
-    try:
-        logger.info(f"Генерация графика типа {chart_data.chart_type} для полей: x={chart_data.x_field}, y={chart_data.y_field}")
+    Строит график и сразу сериализует его в нужный формат (см. `app.services.chart_formats`).
+
+    Выполняется в пуле процессов: из процесса возвращаются готовые байты, а не словарь,
+    который пришлось бы ещё раз обходить в основном процессе.
+    """
+    args = (chart_type, x_field, y_field, color_field, max_points, scatter_sampling)
+    if media_type == JSON:
+        chart_dict = build_chart_spec_from_df(df, *args)
+        with span("chart.encode"):
+            return encode_json(chart_dict)
+    chart_dict, df, usermeta = build_chart_from_df(df, *args)
+    spec = chart_spec(chart_dict, usermeta)
+    with span("chart.encode"):
+        return ENCODERS[media_type](spec, df)
+
+
+def render_chart(media_type: str, data: List[Dict[str, Any]], chart_type: str, x_field: str, y_field: str,
+                 color_field: Optional[str] = None, max_points: Optional[int] = None,
+                 scatter_sampling: str = "minmax") -> bytes:
+    """`render_chart_from_df` для данных из запроса."""
+    df = prepare_dataframe(data, x_field)
+    return render_chart_from_df(media_type, df, chart_type, x_field, y_field, color_field, max_points, scatter_sampling)
+
+
+def warm_up_chart() -> int:
+    """
+    Пробный график: импортирует pandas и Altair и строит шаблоны всех типов графиков
+    (с проверкой по схеме Vega-Lite) в процессе, где выполняется.
+    """
+    for chart_type in ChartGenerator.chart_types():
+        for with_color in (False, True):
+            chart_template(chart_type, with_color)
+    return len(render_chart(JSON, [{"x": 0, "y": 0}, {"x": 1, "y": 1}], "line", "x", "y"))
+
 
-        # Подготовка данных
-        df = prepare_dataframe(chart_data.data, chart_data.x_field)
+async def warm_up() -> None:
+    """
+    Прогрев при старте (`config.executor.warm_up`): пробный график в основном процессе и по
+    одному на каждый процесс пула, чтобы первые запросы не платили за запуск процессов и импорты.
+    """
+    started = perf_counter()
+    await asyncio.gather(
+        executor.run_thread(warm_up_chart),
+        *(executor.run_process(warm_up_chart) for _ in range(config.executor.process_workers)),
+    )
+    logger.info("Прогрев графиков занял %.2f с", perf_counter() - started)
 
-        # Валидация наличия полей
-        validate_dataframe_fields(df, chart_data.x_field, chart_data.y_field, chart_data.color_field)
 
-        # Построение encoding
-        encoding = build_encoding(chart_data.x_field, chart_data.y_field, chart_data.color_field)
+def response_format(request: Request) -> str:
+    """
+    Формат ответа по заголовку Accept: JSON (по умолчанию), Arrow IPC stream или колоночный JSON.
 
-        # Генерация графика
-        chart = ChartGenerator.generate(
-            chart_data.chart_type,
-            df,
-            encoding,
-            chart_data.x_field,
-            chart_data.y_field
+    Raises:
+        HTTPException: 406, если клиент не принимает ни один из поддерживаемых форматов.
+    """
+    media_type = negotiate(request.headers.get("accept"))
+    if media_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=f"Поддерживаемые форматы: {', '.join(ENCODERS)}"
         )
+    return media_type
 
-        # Подготовка ответа
-        chart_dict = prepare_chart_response(chart, df)
 
-        logger.info(f"График типа {chart_data.chart_type} успешно сгенерирован")
-        return chart_dict
+async def cached_chart_response(request: Request, key: str, media_type: str, build: Callable[[], Any]) -> Response:
+    """
+    Отдаёт график из кэша или строит его через build() и кладёт в кэш.
 
+    Ключ кэша одновременно служит ETag: если он совпал с If-None-Match, отдаётся 304 без тела.
+    Эндпоинты графиков - POST только из-за размера тела запроса, по смыслу это безопасные
+    запросы на чтение, поэтому условный запрос обрабатывается как GET (304, а не 412).
+    Существование ресурса (набора данных) вызывающий проверяет до этой функции, иначе
+    `If-None-Match: *` получил бы 304 для чего угодно.
+    """
+    headers = {"ETag": etag_for(key), "Vary": "Accept"}
+    if etag_matches(request, key):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    with span("chart.cache"):
+        body = await chart_cache.get(key)
+    headers["X-Cache"] = "HIT" if body is not None else "MISS"
+    if body is None:
+        body = await build()
+        await chart_cache.put(key, body)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+@contextmanager
+def chart_errors() -> Iterator[None]:
+    """Переводит ошибки построения графика в HTTPException с нужным статусом."""
+    try:
+        yield
+    except HTTPException:
+        raise
     except ValueError as e:
-        logger.error(f"Ошибка валидации: {str(e)}", exc_info=True)
+        logger.error("Ошибка валидации: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Ошибка валидации: {str(e)}"
         )
     except KeyError as e:
-        logger.error(f"Отсутствует обязательное поле в данных: {str(e)}", exc_info=True)
+        logger.error("Отсутствует обязательное поле в данных: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Отсутствует обязательное поле: {str(e)}"
         )
     except Exception as e:
-        logger.error(f"Непредвиденная ошибка при генерации графика: {str(e)}", exc_info=True)
+        logger.error("Непредвиденная ошибка при генерации графика: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Внутренняя ошибка сервера при генерации графика"
         )
+
+
+@router.post("/generate_chart", status_code=status.HTTP_200_OK)
+async def generate_chart(request: Request, chart_data: ChartData = Body(...)) -> Response:
+    """
+    Генерирует график на основе переданных данных
+
+
+    Args:
+        chart_data: Данные для построения графика
+
+
+    Returns:
+        JSON с конфигурацией Altair графика, ETag - хэш запроса (повторный запрос
+        с If-None-Match получает 304). По Accept можно получить спецификацию и данные
+        отдельно: Arrow IPC stream (application/vnd.apache.arrow.stream) или колоночный
+        JSON (application/vnd.foodnet.columnar+json)
+
+
+    Raises:
+        HTTPException: При ошибках валидации или генерации графика
+    """
+    with chart_errors():
+        logger.info("Генерация графика типа %s для полей: x=%s, y=%s", chart_data.chart_type, chart_data.x_field, chart_data.y_field)
+
+        media_type = response_format(request)
+
+        # хэширование данных запроса - в пуле потоков, они могут весить мегабайты
+        key = await executor.run_thread(cache_key, chart_data.model_dump() | {"format": media_type})
+
+        # Построение графика в пуле процессов, чтобы не блокировать цикл событий
+        response = await cached_chart_response(request, key, media_type, lambda: executor.run_process(
+            render_chart,
+            media_type,
+            chart_data.data,
+            chart_data.chart_type,
+            chart_data.x_field,
+            chart_data.y_field,
+            chart_data.color_field,
+            chart_data.max_points,
+            chart_data.scatter_sampling
+        ))
+
+        logger.info("График типа %s успешно сгенерирован (%s)", chart_data.chart_type, response.headers.get("X-Cache", "304"))
+        return response
+
+
+@router.post("/generate_chart_by_id", status_code=status.HTTP_200_OK)
+async def generate_chart_by_id(request: Request, chart_request: DatasetChartRequest = Body(...)) -> Response:
+    """
+    Генерирует график по загруженному набору данных (data_id из /upload/csv)
+
+
+    Группировка по x/color, агрегация y и округление времени выполняются в хранилище набора,
+    клиенту и в построение графика попадает только агрегированный ряд.
+
+
+    Args:
+        chart_request: data_id, поля графика, агрегация и интервал времени
+
+
+    Returns:
+        График в формате по Accept (как у /generate_chart), ETag - хэш запроса и версии набора
+
+
+    Raises:
+        HTTPException: 404, если набор данных не найден, 400 при ошибках валидации
+    """
+    with chart_errors():
+        logger.info(
+            "Генерация графика типа %s по набору %s: x=%s, y=%s(%s), интервал=%s",
+            chart_request.chart_type, chart_request.data_id, chart_request.x_field,
+            chart_request.aggregate, chart_request.y_field, chart_request.time_unit
+        )
+        media_type = response_format(request)
+        dataset = await get_dataset(chart_request.data_id)
+        # версия набора растёт при дозаписи (/upload/csv?append_to=...), прежние графики не совпадут по ключу
+        key = cache_key(chart_request.model_dump() | {"format": media_type, "version": dataset.version})
+        response = await cached_chart_response(request, key, media_type, lambda: build_dataset_chart(chart_request, dataset, media_type))
+        logger.info(
+            "График типа %s по набору %s успешно сгенерирован (%s)",
+            chart_request.chart_type, chart_request.data_id, response.headers.get("X-Cache", "304")
+        )
+        return response
+
+
+async def get_dataset(data_id: str) -> Dataset:
+    """
+    Набор data_id с хранилищем и схемой загрузки.
+
+    Raises:
+        HTTPException: 404, если набора нет.
+    """
+    dataset = await open_dataset(data_id)
+    if dataset is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Набор данных не найден")
+    return dataset
+
+
+async def build_dataset_chart(chart_request: DatasetChartRequest, dataset: Dataset, media_type: str = JSON) -> bytes:
+    """
+    Агрегирует набор данных в его хранилище (или по rollup, см. `Dataset.aggregate`) и строит
+    по результату график, сериализованный в media_type.
+
+    Ось X разбирается как время, только если так определено при загрузке (или задан time_unit).
+    """
+    with span("chart.aggregate"):
+        df = await dataset.aggregate(
+            chart_request.x_field,
+            chart_request.y_field,
+            chart_request.aggregate,
+            chart_request.color_field,
+            chart_request.time_unit
+        )
+
+    x_dtype = "datetime64[ns]" if chart_request.time_unit else dataset.dtype(chart_request.x_field)
+    df = prepare_dataframe(df, chart_request.x_field, x_dtype)
+    return await executor.run_process(
+        render_chart_from_df,
+        media_type,
+        df,
+        chart_request.chart_type,
+        chart_request.x_field,
+        chart_request.y_field,
+        chart_request.color_field,
+        chart_request.max_points,
+        chart_request.scatter_sampling
+    )
+
+
+def chart_columns(chart: ChartFields) -> List[str]:
+    return [field for field in (chart.x_field, chart.y_field, chart.color_field) if field]
+
+
+def prepare_shared_dataframe(data: List[Dict[str, Any]] | pd.DataFrame, x_fields: List[str],
+                             dtypes: Optional[Dict[str, Optional[str]]] = None) -> pd.DataFrame:
+    """
+    `prepare_dataframe` для нескольких графиков: DataFrame строится один раз,
+    каждое поле оси X разбирается как время один раз.
+    """
+    df = pd.DataFrame(data)
+    for x_field in dict.fromkeys(x_fields):
+        if x_field in df.columns:
+            df = prepare_dataframe(df, x_field, (dtypes or {}).get(x_field))
+    return df
+
+
+def build_dashboard_chart(df: pd.DataFrame, chart_type: str, x_field: str, y_field: str,
+                          color_field: Optional[str] = None, max_points: Optional[int] = None,
+                          scatter_sampling: str = "minmax") -> Tuple[Dict[str, Any], Optional[pd.DataFrame]]:
+    """
+    Спецификация одного графика панели без данных (выполняется в пуле процессов).
+
+    Returns:
+        Tuple[Dict[str, Any], Optional[pd.DataFrame]]: Спецификация и собственные данные графика,
+        если их пришлось проредить, иначе None - график строится по общему набору.
+    """
+    chart_dict, sampled, usermeta = build_chart_from_df(
+        df, chart_type, x_field, y_field, color_field, max_points, scatter_sampling
+    )
+    return chart_spec(chart_dict, usermeta), (None if sampled is df else sampled)
+
+
+def encode_dashboard(specs: List[Dict[str, Any]], datasets: Dict[str, pd.DataFrame]) -> bytes:
+    """Ответ панели в JSON: {"datasets": {имя: [строки]}, "charts": [спецификации]}."""
+    with span("chart.to_dict"):
+        values = {name: df.to_dict(orient="records") for name, df in datasets.items()}
+    with span("chart.encode"):
+        return encode_json({"datasets": values, "charts": specs})
+
+
+async def build_dashboard(dashboard: DashboardRequest, dataset: Optional[Dataset] = None) -> bytes:
+    """
+    Строит все графики панели по одному DataFrame.
+
+    Данные готовятся один раз (DataFrame, разбор дат осей X), графики строятся одновременно
+    в пуле процессов: каждому передаются только его колонки, а если прореживание не нужно -
+    только их типы (пустой срез). Общие данные попадают в ответ один раз набором SHARED_DATASET,
+    прореженные графики получают свои наборы `chart_<номер>`.
+    """
+    columns = list(dict.fromkeys(column for chart in dashboard.charts for column in chart_columns(chart)))
+    x_fields = [chart.x_field for chart in dashboard.charts]
+    if dataset is None:
+        df = await executor.run_process(prepare_shared_dataframe, dashboard.data, x_fields)
+    else:
+        known = (dataset.schema or {}).get("dtypes")
+        if known is not None and (missing := [column for column in columns if column not in known]):
+            raise ValueError(f"Отсутствуют обязательные поля в данных: {missing}")
+        with span("chart.read"):
+            df = await dataset.read(columns)
+        df = prepare_shared_dataframe(df, x_fields, {x_field: dataset.dtype(x_field) for x_field in x_fields})
+    shared = df[[column for column in columns if column in df.columns]]
+
+    def chart_input(chart: ChartFields) -> pd.DataFrame:
+        frame = shared[[column for column in chart_columns(chart) if column in shared.columns]]
+        return frame if chart.max_points else frame.iloc[:0]
+
+    results = await asyncio.gather(*(
+        executor.run_process(
+            build_dashboard_chart,
+            chart_input(chart),
+            chart.chart_type,
+            chart.x_field,
+            chart.y_field,
+            chart.color_field,
+            chart.max_points,
+            chart.scatter_sampling
+        )
+        for chart in dashboard.charts
+    ))
+
+    specs, sampled_datasets = [], {}
+    for index, (spec, sampled) in enumerate(results):
+        name = SHARED_DATASET if sampled is None else f"chart_{index}"
+        if sampled is not None:
+            sampled_datasets[name] = sampled
+        spec["data"] = {"name": name}
+        specs.append(spec)
+    datasets = ({SHARED_DATASET: shared} if len(sampled_datasets) < len(specs) else {}) | sampled_datasets
+    return await executor.run_process(encode_dashboard, specs, datasets)
+
+
+@router.post("/dashboard", status_code=status.HTTP_200_OK)
+async def generate_dashboard(request: Request, dashboard: DashboardRequest = Body(...)) -> Response:
+    """
+    Генерирует несколько графиков по одним данным одним ответом
+
+
+    Args:
+        dashboard: данные (data из запроса или data_id загруженного набора) и список графиков
+
+
+    Returns:
+        JSON {"datasets": {...}, "charts": [...]}: спецификации Vega-Lite в порядке запроса,
+        data каждой ссылается на именованный набор из datasets (формат свойства `datasets`
+        Vega-Lite, для отрисовки - `{...spec, datasets}`). ETag - хэш запроса.
+
+
+    Raises:
+        HTTPException: 404, если набор данных не найден, 400 при ошибках валидации
+    """
+    with chart_errors():
+        logger.info("Генерация панели из %s графиков по %s", len(dashboard.charts), dashboard.data_id or "данным запроса")
+        dataset = await get_dataset(dashboard.data_id) if dashboard.data_id else None
+        key = await executor.run_thread(cache_key, dashboard.model_dump() | {"format": "dashboard", "version": dataset.version if dataset else None})
+        response = await cached_chart_response(request, key, JSON, lambda: build_dashboard(dashboard, dataset))
+        logger.info("Панель из %s графиков сгенерирована (%s)", len(dashboard.charts), response.headers.get("X-Cache", "304"))
+        return response
+
+
+@router.get("/cache_stats")
+async def cache_stats() -> Dict[str, Any]:
+    """Счётчики попаданий/промахов и заполненность кэша графиков."""
+    return chart_cache.stats()
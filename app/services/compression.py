@@ -0,0 +1,197 @@
+"""
+Сжатые загрузки: CSV в gzip, zstd или zip-архиве.
+
+Формат определяется по первым байтам файла, а не по имени. Файл распаковывается потоково:
+парсер CSV читает распакованные байты по мере надобности, распакованный файл целиком нигде
+не хранится. Чтобы архив небольшого размера не развернулся в гигабайты (zip-бомба), объём
+распакованных данных ограничен относительно прочитанных сжатых (`RatioGuard`).
+"""
+
+import io
+import gzip
+import zipfile
+import zlib
+from typing import BinaryIO, Callable, Optional, Tuple, Type
+from app.config.settings import UploadSettings, config
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+ZIP_MAGIC = b"PK\x03\x04"
+# что принимает /upload/csv помимо text/csv и *.csv
+COMPRESSED_SUFFIXES = (".gz", ".zst", ".zip")
+COMPRESSED_CONTENT_TYPES = ("application/gzip", "application/x-gzip", "application/zstd", "application/zip",
+                            "application/x-zip-compressed")
+READ_BUFFER_SIZE = 1024 * 1024
+# ошибки повреждённого архива при чтении; к ним добавляется ZstdError для zstd
+STREAM_ERRORS: Tuple[Type[BaseException], ...] = (OSError, EOFError, zlib.error, zipfile.BadZipFile)
+
+
+class DecompressionLimitExceeded(ValueError):
+    """Распакованные данные больше сжатых сильнее, чем допускает `upload.max_decompression_ratio`."""
+
+
+class RatioGuard:
+    """
+    Проверка степени сжатия по ходу распаковки.
+
+    Первые `decompression_check_bytes` распакованных байт не проверяются: у маленьких файлов
+    (заголовок CSV, повторяющиеся строки) степень сжатия бывает большой и без злого умысла.
+    """
+
+    def __init__(self, settings: UploadSettings):
+        self.max_ratio = settings.max_decompression_ratio
+        self.free_bytes = settings.decompression_check_bytes
+
+    def allowed(self, compressed: int) -> int:
+        """Сколько всего распакованных байт допустимо после compressed сжатых."""
+        return max(self.free_bytes, int(compressed * self.max_ratio))
+
+    def check(self, compressed: int, decompressed: int) -> None:
+        """
+        Raises:
+            DecompressionLimitExceeded: Если распаковано больше допустимого.
+        """
+        if decompressed > self.allowed(compressed):
+            raise DecompressionLimitExceeded(
+                f"Распакованные данные больше сжатых более чем в {self.max_ratio:g} раз"
+            )
+
+
+def detect_compression(source: BinaryIO) -> Optional[str]:
+    """gzip, zstd, zip или None для несжатого файла; позиция файла не меняется."""
+    position = source.tell()
+    head = source.read(4)
+    source.seek(position)
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    if head.startswith(ZIP_MAGIC):
+        return "zip"
+    return None
+
+
+def is_supported_upload(filename: str, content_type: Optional[str]) -> bool:
+    """Можно ли принять файл в /upload/csv: CSV или CSV в поддерживаемом архиве."""
+    content_type = content_type or ""
+    return (content_type.startswith("text/csv") or content_type.startswith(COMPRESSED_CONTENT_TYPES)
+            or filename.lower().endswith((".csv", *COMPRESSED_SUFFIXES)))
+
+
+class _GuardedReader(io.RawIOBase):
+    """Распакованный поток с проверкой `RatioGuard`; ошибки распаковки - ValueError."""
+
+    def __init__(self, stream: BinaryIO, compressed: Callable[[], int], guard: RatioGuard,
+                 errors: Tuple[Type[BaseException], ...] = STREAM_ERRORS):
+        self.stream = stream
+        self.compressed = compressed
+        self.guard = guard
+        self.errors = errors
+        self.decompressed = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        try:
+            data = self.stream.read(len(buffer))
+        except self.errors as e:
+            raise ValueError(f"Повреждённый сжатый файл: {e}") from e
+        self.decompressed += len(data)
+        self.guard.check(self.compressed(), self.decompressed)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _open_zip_member(source: BinaryIO) -> Tuple[BinaryIO, int]:
+    archive = zipfile.ZipFile(source)
+    members = [info for info in archive.infolist() if not info.is_dir()]
+    csv_members = [info for info in members if info.filename.lower().endswith(".csv")]
+    if len(csv_members) == 1:
+        member = csv_members[0]
+    elif not csv_members and len(members) == 1:
+        member = members[0]
+    else:
+        raise ValueError("В zip-архиве должен быть ровно один CSV-файл")
+    return archive.open(member), member.compress_size
+
+
+def open_csv_source(source: BinaryIO, settings: Optional[UploadSettings] = None) -> BinaryIO:
+    """
+    CSV из загруженного файла: сам файл или его распакованный поток.
+
+    Сжатые байты читаются из source по мере чтения результата, поэтому `source.tell()`
+    показывает, какая часть загруженного файла обработана.
+
+    Raises:
+        ValueError: Если архив повреждён, в zip не один CSV или zstd не поддерживается
+            (не установлен пакет zstandard).
+    """
+    settings = settings or config.upload
+    compression = detect_compression(source)
+    if compression is None:
+        return source
+    guard, errors = RatioGuard(settings), STREAM_ERRORS
+    if compression == "gzip":
+        stream, compressed = gzip.GzipFile(fileobj=source, mode="rb"), source.tell
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("Сжатие zstd не поддерживается: не установлен пакет zstandard") from None
+        stream, compressed = zstandard.ZstdDecompressor().stream_reader(source, read_across_frames=True), source.tell
+        errors += (zstandard.ZstdError,)
+    else:
+        try:
+            stream, size = _open_zip_member(source)
+        except zipfile.BadZipFile as e:
+            raise ValueError(f"Повреждённый zip-архив: {e}") from e
+        # zipfile сам перемещается по архиву, поэтому степень сжатия считается от размера записи
+        compressed = lambda: size  # noqa: E731
+    return io.BufferedReader(_GuardedReader(stream, compressed, guard, errors), buffer_size=READ_BUFFER_SIZE)
+
+
+class GzipBodyInflater:
+    """
+    Распаковка тела запроса с `Content-Encoding: gzip` порциями, как оно приходит от сервера.
+
+    Распакованные данные одной порции ограничены `RatioGuard`, поэтому небольшое тело
+    не развернётся в памяти в гигабайты. Поддерживается несколько gzip-членов подряд.
+    """
+
+    def __init__(self, settings: Optional[UploadSettings] = None):
+        self.guard = RatioGuard(settings or config.upload)
+        self.inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.in_member = False  # текущий gzip-член начат, но ещё не дочитан
+        self.compressed = 0
+        self.decompressed = 0
+
+    def feed(self, data: bytes, final: bool) -> bytes:
+        """
+        Распаковывает очередную порцию тела; final - последняя порция.
+
+        Raises:
+            DecompressionLimitExceeded: Если распаковано больше допустимого.
+            ValueError: Если тело - не gzip или обрывается.
+        """
+        self.compressed += len(data)
+        parts = []
+        try:
+            while data:
+                self.in_member = True
+                part = self.inflater.decompress(data, self.guard.allowed(self.compressed) - self.decompressed + 1)
+                self.decompressed += len(part)
+                self.guard.check(self.compressed, self.decompressed)
+                parts.append(part)
+                if self.inflater.eof:
+                    data = self.inflater.unused_data
+                    self.inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    self.in_member = False
+                else:
+                    data = self.inflater.unconsumed_tail
+        except zlib.error as e:
+            raise ValueError(f"Тело запроса - не gzip: {e}") from e
+        if final and self.in_member:
+            raise ValueError("Тело запроса в gzip обрывается")
+        return b"".join(parts)
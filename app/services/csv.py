@@ -1,102 +1,739 @@
 # TODO: добавить авторизацию и получение user_id из токена
-from fastapi import APIRouter, UploadFile, File, HTTPException
-import pandas as pd
-from io import BytesIO
+from __future__ import annotations
+from fastapi import APIRouter, UploadFile, File, HTTPException, Response, status
+import asyncio
+import io
+import re
+from sqlalchemy import delete, exists, select, update
+from weakref import WeakValueDictionary
+from app.config.settings import config
 from app.middleware.logging import logger
-from app.database.connection import Base, engine
+from app.middleware.metrics import span
+from app.services.compression import DecompressionLimitExceeded, is_supported_upload, open_csv_source
+from app.services.dedupe import HASH_BLOCK_SIZE, Deduplicator, HashingReader, content_digest, dedupe_chunks, upload_size
+from app.services.executor import executor
+from app.services.jobs import JobQueue, Progress
+from app.services.rollups import RollupBuilder, RollupSpec, rollup_chunks, rollup_id
+from app.services.schema_inference import SchemaTracker, apply_schema
+from app.storage.base import DatasetStore, StoredDataset
+from app.storage.registry import dataset_of, get_data_item, get_store
+from time import perf_counter
 from uuid import uuid4, UUID
-from typing import Tuple
-from app.models.models import UserDataItem
+from typing import TYPE_CHECKING, Any, AsyncIterable, AsyncIterator, BinaryIO, Dict, List, Optional, Tuple
+from app.models.models import DataItem, UploadJob, UserDataItem
+from app.models.schemas import UploadJobStatus
 from app.database.connection import async_session
+from app.lazy import lazy_import
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
 
 
 router = APIRouter()
 
+# имя набора входит в data_id, а тот - в имя таблицы БД и путь каталога parquet
+DATASET_NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+# блокировки дозаписи по data_id; запись удаляется, когда блокировку никто не держит и не ждёт
+_append_locks: "WeakValueDictionary[str, asyncio.Lock]" = WeakValueDictionary()
+
 
 @router.post("/csv")
-async def upload_csv(name: str = "blank", user_id: int = -1, file: UploadFile = File(...)) -> dict:
+async def upload_csv(response: Response, name: str = "blank", user_id: int = -1, file: UploadFile = File(...),
+                     rollup_time: Optional[str] = None, rollup_dimensions: str = "",
+                     append_to: Optional[str] = None, dedupe_key: str = "", background: bool = False) -> dict:
     """
     Обрабатывает загрузку CSV файла через POST-запрос.
 
+    Файл читается и парсится порциями по `config.upload.chunk_rows` строк, каждая порция
+    сразу пишется в БД, поэтому пиковое потребление памяти не зависит от размера файла.
+
     Args:
         name (str): Имя графика, вписывают юзер на клиенте.
-        file (UploadFile): Загружаемый CSV-файл, передается через multipart/form-data.
+        file (UploadFile): Загружаемый CSV-файл, передается через multipart/form-data. Может быть
+            сжат gzip или zstd или лежать в zip-архиве; всё тело запроса можно сжать gzip
+            (Content-Encoding: gzip, см. `GzipRequestMiddleware`).
+        rollup_time (Optional[str]): Колонка времени; если задана, при загрузке считаются rollup
+            (см. `app.services.rollups`), и графики по ним строятся без чтения исходных строк.
+        rollup_dimensions (str): Колонки-измерения rollup через запятую (store,category).
+        append_to (Optional[str]): data_id существующего набора: строки файла дописываются
+            в него (см. `append_csv`), а не создают новый набор. Общий с другими пользователями
+            набор сначала копируется, и строки дописываются в копию (data_id в ответе - новый).
+        dedupe_key (str): Колонки ключа строки через запятую (date,store,dish). Строки с ключом,
+            который уже есть в наборе или выше в файле, пропускаются; ключ запоминается для
+            следующих дозаписей.
+        background (bool): Загрузить в фоне: файл сохраняется на диск, ответ 202 с задачей
+            (`UploadJobStatus`), ход и итог - в /upload/jobs/{job_id}.
 
     Returns:
         dict: Словарь с именем файла и preview первых строк в виде списка словарей.
+            deduplicated - файл уже загружен с теми же параметрами, и пользователь получил
+            ссылку на готовый набор (см. `reuse_dataset`).
 
     Raises:
         HTTPException: Возникает при неверном типе файла или ошибке парсинга CSV.
 
     Логируется успешная загрузка и ошибки парсинга.
     """
-    if not file.content_type.startswith("text/csv") and not file.filename.endswith(".csv"):
-        logger.error(f"Попытка загрузить файл с неподдерживаемым типом: {file.content_type}")
+    if not is_supported_upload(file.filename, file.content_type):
+        logger.error("Попытка загрузить файл с неподдерживаемым типом: %s", file.content_type)
         raise HTTPException(status_code=400, detail="Неверный тип файла")
-    contents = await file.read()
+    params = {
+        "name": name, "user_id": user_id, "rollup_time": rollup_time, "rollup_dimensions": rollup_dimensions,
+        "append_to": append_to, "dedupe_key": dedupe_key,
+    }
+    if background:
+        job = await upload_jobs.submit(file.file, file.filename, params)
+        response.status_code = status.HTTP_202_ACCEPTED
+        response.headers["Location"] = f"/upload/jobs/{job.id}"
+        return UploadJobStatus.model_validate(job).model_dump()
+    return await ingest_csv(file.file, file.filename, **params)
+
+
+async def ingest_csv(source: BinaryIO, filename: str, name: str = "blank", user_id: int = -1,
+                     rollup_time: Optional[str] = None, rollup_dimensions: str = "",
+                     append_to: Optional[str] = None, dedupe_key: str = "",
+                     progress: Optional[Progress] = None) -> dict:
+    """
+    Загружает CSV из файлового объекта: параметры и ответ - как у /upload/csv.
+
+    Args:
+        progress (Optional[Progress]): Вызывается после записи каждой порции (строк, байт файла).
+    """
+    key = [column for column in dedupe_key.split(",") if column]
+    if append_to is not None:
+        return await append_csv(append_to, source, filename, key, progress, user_id)
+    builder = rollup_builder(rollup_time, [column for column in rollup_dimensions.split(",") if column])
+    digest = size = hasher = None
+    parsed_source = source
+    if config.upload.dedupe_content:
+        # отдельный проход по файлу нужен, только если уже есть набор из файла того же размера;
+        # иначе хэш считается по ходу разбора
+        size = upload_size(source)
+        if await has_upload_of_size(size):
+            with span("csv.hash"):
+                digest = await executor.run_thread(content_digest, source)
+            reused = await reuse_dataset(digest, source, filename, user_id, builder, key)
+            if reused is not None:
+                return reused
+        else:
+            hasher = HashingReader(source)
+            parsed_source = io.BufferedReader(hasher, buffer_size=HASH_BLOCK_SIZE)
+    tracker = SchemaTracker()
+    chunks = compact_chunks(iter_csv_chunks(parsed_source, config.upload.chunk_rows, filename), tracker)
+    deduplicator = Deduplicator(key) if key else None
+    if deduplicator is not None:
+        chunks = dedupe_chunks(chunks, deduplicator)
+    if builder is not None:
+        chunks = rollup_chunks(chunks, builder)
+    if progress is not None:
+        chunks = report_progress(chunks, source, progress)
+    data_id, stored, preview = await store_chunks(name, uuid4(), chunks)
+    rollups = await store_rollups(data_id, builder) if builder is not None else None
+    if hasher is not None:
+        digest = hasher.hexdigest()
+        if digest is None:
+            # zip-архив читается не подряд
+            with span("csv.hash"):
+                digest = await executor.run_thread(content_digest, source)
+    df_len = stored.rows
+    memory = tracker.memory_report()
+    logger.info(
+        "Файл %s успешно загружен и распарсен, память порций: %s -> %s байт (-%s%%).",
+        filename, memory["before"], memory["after"], memory["saved_pct"]
+    )
+    await add_DataItem(data_id, filename, stored, schema=tracker.schema, rollups=rollups, dedupe_key=key or None,
+                       content_hash=digest, content_size=size)
+    await add_to_UserDataItem(user_id, data_id)
+    return {
+        "data_id": data_id,
+        "rows": df_len,
+        "preview": preview,
+        "memory": memory,
+        "rollups": list(rollups["tables"]) if rollups else [],
+        "version": 1,
+        "skipped_duplicates": deduplicator.skipped if deduplicator else 0,
+        "deduplicated": False,
+    }
+
+
+async def has_upload_of_size(size: int) -> bool:
+    """Есть ли набор, загруженный из файла такого размера, - кандидат для `reuse_dataset`."""
+    async with async_session() as session:
+        return bool(await session.scalar(select(exists().where(
+            DataItem.content_size == size, DataItem.content_hash.is_not(None),
+            DataItem.storage == get_store().name, DataItem.ref_count > 0,
+        ))))
+
+
+async def reuse_dataset(digest: str, source: BinaryIO, filename: str, user_id: int,
+                        builder: Optional[RollupBuilder], key: List[str]) -> Optional[dict]:
+    """
+    Ищет набор, загруженный из файла с тем же SHA-256 и с теми же rollup и ключом дубликатов,
+    и связывает его с пользователем вместо повторного разбора и записи.
+
+    Набор, в который дописывали строки, не подходит: при дозаписи его хэш сбрасывается.
+
+    Returns:
+        Optional[dict]: Ответ /upload/csv для найденного набора или None, если его нет
+            (или последнюю ссылку на него как раз удалили).
+    """
+    async with async_session() as session:
+        candidates = (await session.scalars(
+            select(DataItem).where(DataItem.content_hash == digest, DataItem.storage == get_store().name,
+                                   DataItem.ref_count > 0)
+        )).all()
+    for data_item in candidates:
+        if not _same_upload_options(data_item, builder, key):
+            continue
+        if not await add_to_UserDataItem(user_id, data_item.id, shared=True):
+            continue
+        logger.info("Файл %s уже загружен в набор %s, добавлена ссылка для пользователя %s",
+                    filename, data_item.id, user_id)
+        preview = await executor.run_thread(preview_csv, source, data_item.inferred_schema)
+        return {
+            "data_id": data_item.id,
+            "rows": data_item.row_count,
+            "preview": preview,
+            "memory": None,
+            "rollups": list(data_item.rollups["tables"]) if data_item.rollups else [],
+            "version": data_item.version,
+            "skipped_duplicates": 0,
+            "deduplicated": True,
+        }
+    return None
+
+
+def _same_upload_options(data_item: DataItem, builder: Optional[RollupBuilder], key: List[str]) -> bool:
+    if (data_item.dedupe_key or []) != key:
+        return False
+    if builder is None or data_item.rollups is None:
+        return builder is None and data_item.rollups is None
+    return (data_item.rollups["time_column"] == builder.spec.time_column
+            and list(data_item.rollups["dimensions"]) == list(builder.spec.dimensions))
+
+
+def preview_csv(source: BinaryIO, schema: Optional[Dict[str, Any]], rows: int = 5) -> List[Dict[str, Any]]:
+    """Первые строки CSV с типами схемы набора - preview без чтения самого набора."""
+    source.seek(0)
+    df = pd.read_csv(open_csv_source(source), nrows=rows)
+    if schema:
+        df, _ = apply_schema(df, schema)
+    return df.to_dict(orient="records")
+
+
+async def append_csv(data_id: str, source: BinaryIO, filename: str, key: List[str],
+                     progress: Optional[Progress] = None, user_id: int = -1) -> dict:
+    """
+    Дописывает строки CSV в существующий набор data_id.
+
+    Порции приводятся к схеме набора (колонки должны совпадать, числовые типы при необходимости
+    расширяются), строки с уже известным ключом пропускаются, rollup набора дополняются
+    агрегатами только новых строк: суммы и счётчики складываются, пересчёт не нужен.
+    Версия набора увеличивается, поэтому закэшированные графики по нему больше не выдаются.
+    Дозаписи одного набора выполняются по очереди. В общий набор (см. `reuse_dataset`)
+    строки не дописываются: он копируется для пользователя (`private_copy`).
+
+    Args:
+        data_id (str): Идентификатор набора.
+        source (BinaryIO): CSV-файл.
+        filename (str): Имя файла для логов.
+        key (List[str]): Колонки ключа; если пусто - ключ, сохранённый у набора.
+        progress (Optional[Progress]): Вызывается после записи каждой порции.
+        user_id (int): ID пользователя, который дописывает строки.
+
+    Returns:
+        dict: data_id, число дописанных строк и пропущенных дубликатов, новая версия набора;
+            copied_from - data_id общего набора, если строки дописаны в его копию.
+
+    Raises:
+        HTTPException: 404, если набора нет; 400, если файл не совпадает со схемой набора;
+            409, если набор одновременно изменили в другом процессе.
+    """
+    async with _append_locks.setdefault(data_id, asyncio.Lock()):
+        data_item = await get_data_item(data_id)
+        if data_item is None:
+            raise HTTPException(status_code=404, detail="Набор данных не найден")
+        copied_from = None
+        if (data_item.ref_count or 0) > 1:
+            copied_from, data_item = data_id, await private_copy(data_item, user_id)
+            data_id = data_item.id
+        dataset = dataset_of(data_item)
+        key = key or data_item.dedupe_key or []
+        tracker = SchemaTracker(data_item.inferred_schema)
+        chunks = compact_chunks(iter_csv_chunks(source, config.upload.chunk_rows, filename), tracker)
+        deduplicator = None
+        if key:
+            try:
+                existing = await dataset.read(key, fresh=True)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Ошибка проверки дубликатов: {str(e)}")
+            deduplicator = await executor.run_thread(Deduplicator, key, existing)
+            chunks = dedupe_chunks(chunks, deduplicator)
+        builder = None
+        if data_item.rollups:
+            spec = data_item.rollups
+            builder = RollupBuilder(RollupSpec(spec["time_column"], spec["dimensions"], spec["measures"], list(spec["tables"])))
+            chunks = rollup_chunks(chunks, builder)
+        if progress is not None:
+            chunks = report_progress(chunks, source, progress)
+        try:
+            with span("upload.store"):
+                stored = await dataset.store.append(data_id, chunks)
+        except ValueError as ve:
+            logger.error("Ошибка при дозаписи в набор %s: %s", data_id, ve)
+            raise HTTPException(status_code=400, detail=f"Ошибка при загрузке данных: {str(ve)}")
+        version = data_item.version
+        if stored.rows:
+            rollups = await append_rollups(dataset.store, data_id, builder) if builder is not None else None
+            version = await update_DataItem(data_item, stored, tracker.schema, key or None, rollups)
+    skipped = deduplicator.skipped if deduplicator else 0
+    logger.info("В набор %s дописано %s строк (пропущено дубликатов: %s), версия %s", data_id, stored.rows, skipped, version)
+    return {"data_id": data_id, "rows": stored.rows, "skipped_duplicates": skipped, "version": version,
+            "copied_from": copied_from}
+
+
+async def private_copy(data_item: DataItem, user_id: int) -> DataItem:
+    """
+    Копия общего набора для пользователя, который в него дописывает.
+
+    Набор, загруженный несколькими пользователями из одного файла, хранится один раз, и дозапись
+    изменила бы данные всех. Поэтому данные и rollup копируются в новый набор, ссылка
+    пользователя переносится на копию, остальные пользователи по-прежнему видят исходный набор.
+
+    Returns:
+        DataItem: Запись о копии.
+    Raises:
+        HTTPException: 500, если набор не удалось скопировать.
+    """
+    store = get_store(data_item.storage)
+    copy_id = f"{data_item.id.rsplit('_', 1)[0]}_{uuid4().hex}"
+    tables = (data_item.rollups or {}).get("tables") or {}
+    copied_tables = {granularity: rollup_id(copy_id, granularity) for granularity in tables}
+    copied: List[str] = []
+    try:
+        with span("upload.copy"):
+            for source, target in [(data_item.id, copy_id), *((tables[unit], copied_tables[unit]) for unit in tables)]:
+                copied.append(target)
+                await store.copy(source, target)
+        rollups = dict(data_item.rollups, tables=copied_tables) if data_item.rollups else None
+        stored = StoredDataset(rows=data_item.row_count or 0, file_size=data_item.file_size,
+                               content_type=data_item.content_type)
+        await add_DataItem(copy_id, data_item.filename, stored, storage=data_item.storage,
+                           schema=data_item.inferred_schema, rollups=rollups, dedupe_key=data_item.dedupe_key)
+    except (ValueError, HTTPException) as e:
+        logger.error("Не удалось скопировать общий набор %s: %s", data_item.id, e)
+        for table in copied:
+            await store.drop(table)
+        raise HTTPException(status_code=500, detail="Ошибка при копировании общего набора данных")
+    await add_to_UserDataItem(user_id, copy_id)
+    await unlink_user(user_id, data_item.id)
+    logger.info("Общий набор %s скопирован в %s для дозаписи пользователем %s", data_item.id, copy_id, user_id)
+    return await get_data_item(copy_id)
+
+
+async def report_progress(chunks: AsyncIterable[pd.DataFrame], source: BinaryIO,
+                          progress: Progress) -> AsyncIterator[pd.DataFrame]:
+    """Пропускает порции дальше и сообщает progress, сколько строк записано и байт файла прочитано."""
+    rows = 0
+    async for chunk in chunks:
+        yield chunk
+        # следующая порция запрошена - значит, предыдущая записана
+        rows += len(chunk)
+        await progress(rows, source.tell())
+
+
+async def run_upload_job(job: UploadJob, progress: Progress) -> dict:
+    """Выполняет фоновую загрузку: файл из spool и параметры /upload/csv из задачи."""
+    with open(job.spool_path, "rb") as source:
+        return await ingest_csv(source, job.filename, **job.params, progress=progress)
+
+
+upload_jobs = JobQueue(config.jobs, run_upload_job)
+
+
+@router.delete("/datasets/{data_id}")
+async def unlink_dataset(data_id: str, user_id: int = -1) -> dict:
+    """
+    Удаляет набор из загрузок пользователя.
+
+    Набор может быть общим для нескольких пользователей (см. `reuse_dataset`), поэтому сами
+    данные и rollup удаляются только вместе с последней ссылкой на него.
+
+    Args:
+        data_id (str): Идентификатор набора.
+        user_id (int): ID пользователя.
+
+    Returns:
+        dict: data_id и dropped - удалён ли сам набор.
+    Raises:
+        HTTPException: 404, если у пользователя нет такого набора.
+    """
+    dropped = await unlink_user(user_id, data_id)
+    if dropped is None:
+        raise HTTPException(status_code=404, detail="Набор данных не найден")
+    return {"data_id": data_id, "dropped": dropped}
+
+
+async def unlink_user(user_id: int, data_id: str) -> Optional[bool]:
+    """
+    Удаляет ссылку пользователя на набор, а с последней ссылкой - данные и rollup набора.
+
+    Returns:
+        Optional[bool]: Удалён ли сам набор; None, если у пользователя нет ссылки на набор.
+    """
+    async with async_session() as session:
+        link = await session.get(UserDataItem, (user_id, data_id))
+        if link is None:
+            return None
+        data_item = await session.get(DataItem, data_id)
+        await session.delete(link)
+        await session.flush()
+        await session.execute(
+            update(DataItem).where(DataItem.id == data_id).values(ref_count=DataItem.ref_count - 1)
+        )
+        # ссылки проверяются и напрямую: у наборов, загруженных до подсчёта ссылок, ref_count = 0
+        result = await session.execute(
+            delete(DataItem).where(
+                DataItem.id == data_id, DataItem.ref_count <= 0,
+                ~exists().where(UserDataItem.data_id == data_id),
+            ).execution_options(synchronize_session=False)
+        )
+        await session.commit()
+    dropped = result.rowcount == 1
+    if dropped:
+        store = get_store(data_item.storage)
+        for table in [data_id, *((data_item.rollups or {}).get("tables") or {}).values()]:
+            await store.drop(table)
+        logger.info("Набор %s удалён вместе с последней ссылкой", data_id)
+    else:
+        logger.info("Ссылка пользователя %s на набор %s удалена", user_id, data_id)
+    return dropped
+
+
+@router.get("/jobs/{job_id}", response_model=UploadJobStatus)
+async def upload_job_status(job_id: str) -> UploadJob:
+    """Состояние фоновой загрузки: статус, загружено строк и байт файла, итог или ошибка."""
+    return await upload_jobs.get(job_id)
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=UploadJobStatus)
+async def cancel_upload_job(job_id: str) -> UploadJob:
+    """Отменяет фоновую загрузку; файл сохраняется, задачу можно повторить."""
+    return await upload_jobs.cancel(job_id)
+
+
+@router.post("/jobs/{job_id}/retry", response_model=UploadJobStatus)
+async def retry_upload_job(job_id: str) -> UploadJob:
+    """Ставит упавшую или отменённую фоновую загрузку в очередь заново."""
+    return await upload_jobs.retry(job_id)
+
+
+async def append_rollups(store: DatasetStore, data_id: str, builder: RollupBuilder) -> Optional[Dict[str, Any]]:
+    """
+    Дописывает агрегаты новых строк в rollup набора data_id.
+
+    Returns:
+        Optional[Dict[str, Any]]: Описание rollup или None, если дописать не удалось: тогда rollup
+            удаляются, и графики строятся по исходным строкам, а не по неполным агрегатам.
+    """
+    tables = {granularity: rollup_id(data_id, granularity) for granularity in builder.spec.granularities}
+    try:
+        with span("upload.rollup"):
+            for granularity, frame in (await executor.run_thread(builder.result)).items():
+                await store.append(tables[granularity], _single_chunk(frame))
+    except ValueError as e:
+        logger.error("Rollup набора %s не дописан и удалён: %s", data_id, e)
+        for table in tables.values():
+            await store.drop(table)
+        return None
+    return builder.registry(tables)
+
+
+def rollup_builder(time_column: Optional[str], dimensions: List[str]) -> Optional[RollupBuilder]:
+    """RollupBuilder для загрузки или None, если колонка времени не задана."""
+    if not time_column:
+        return None
+    try:
+        return RollupBuilder(RollupSpec(time_column, dimensions))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Ошибка настройки rollup: {str(e)}")
+
+
+async def store_rollups(data_id: str, builder: RollupBuilder) -> Dict[str, Any]:
+    """
+    Сохраняет rollup набора data_id в то же хранилище, что и сам набор.
+
+    Returns:
+        Dict[str, Any]: Описание rollup для `DataItem.rollups`.
+    Raises:
+        HTTPException: Если rollup не удалось сохранить; набор при этом удаляется.
+    """
+    store = get_store()
+    tables: Dict[str, str] = {}
     try:
-        df = pd.read_csv(BytesIO(contents))
-        logger.info(f"Файл {file.filename} успешно загружен и распарсен.")
-    except Exception as e:
-        logger.error(f"Ошибка парсинга CSV файла {file.filename}: {str(e)}")
+        with span("upload.rollup"):
+            for granularity, frame in (await executor.run_thread(builder.result)).items():
+                tables[granularity] = rollup_id(data_id, granularity)
+                await store.write(tables[granularity], _single_chunk(frame))
+    except ValueError as e:
+        logger.error("Ошибка при сохранении rollup набора %s: %s", data_id, e)
+        for table in [*tables.values(), data_id]:
+            await store.drop(table)
+        raise HTTPException(status_code=400, detail=f"Ошибка при расчёте rollup: {str(e)}")
+    return builder.registry(tables)
+
+
+async def iter_csv_chunks(source: BinaryIO, chunk_rows: int, filename: str = "") -> AsyncIterator[pd.DataFrame]:
+    """
+    Читает CSV из файлового объекта порциями, не блокируя цикл событий.
+
+    Парсинг каждой порции выполняется в пуле потоков `executor` (читатель pandas привязан
+    к файловому объекту и не переносится в другой процесс), в памяти одновременно находится
+    не больше `chunk_rows` строк. Сжатый файл (gzip, zstd, zip) распаковывается по ходу
+    чтения, см. `app.services.compression`.
+
+    Args:
+        source (BinaryIO): Файловый объект с CSV (например, `UploadFile.file`), возможно сжатым.
+        chunk_rows (int): Число строк в одной порции.
+        filename (str): Имя файла для логов.
+    Yields:
+        pd.DataFrame: Очередная порция данных.
+    Raises:
+        HTTPException: 400 при ошибке парсинга или распаковки CSV, 413 при подозрительно
+            большой степени сжатия (`upload.max_decompression_ratio`).
+    """
+    try:
+        reader = await executor.run_thread(lambda: pd.read_csv(open_csv_source(source), chunksize=chunk_rows))
+        with reader:
+            while True:
+                with span("csv.parse"):
+                    chunk = await executor.run_thread(next, reader, None)
+                if chunk is None:
+                    break
+                yield chunk
+    except DecompressionLimitExceeded as e:
+        logger.error("Файл %s отклонён: %s", filename, e)
+        raise HTTPException(status_code=413, detail=str(e))
+    except (ValueError, pd.errors.ParserError, UnicodeDecodeError) as e:
+        logger.error("Ошибка парсинга CSV файла %s: %s", filename, e)
         raise HTTPException(status_code=400, detail=f"Ошибка парсинга CSV: {str(e)}")
-    data_id, df_len = await load_df_to_db(name, uuid4(), df)
-    await add_to_UserDataItem(user_id, data_id)
-    return {"data_id": data_id, "rows": df_len, "preview": df.head().to_dict(orient="records")}
 
 
-async def load_df_to_db(name: str, uuid: UUID, df: pd.DataFrame) -> Tuple[str, int]:
+async def compact_chunks(chunks: AsyncIterable[pd.DataFrame], tracker: SchemaTracker) -> AsyncIterator[pd.DataFrame]:
     """
-    Загружает DataFrame в БД в новую таблицу и возвращает (имя_таблицы, число_строк).
+    Приводит порции к компактным типам (узкие int, float32, category, datetime64).
+
+    Схема определяется по первой порции и расширяется, если следующие в неё не помещаются,
+    итоговая схема и экономия памяти остаются в `tracker`.
+    """
+    async for chunk in chunks:
+        try:
+            with span("csv.compact"):
+                chunk = await executor.run_thread(tracker.apply, chunk)
+        except (ValueError, TypeError) as e:
+            logger.error("Ошибка приведения типов порции: %s", e)
+            raise HTTPException(status_code=400, detail=f"Ошибка приведения типов: {str(e)}")
+        yield chunk
+
+
+async def _single_chunk(df: pd.DataFrame) -> AsyncIterator[pd.DataFrame]:
+    yield df
+
+
+async def load_df_to_db(name: str, uuid: UUID, df: pd.DataFrame,
+                        rollup: Optional[RollupSpec] = None) -> Tuple[str, int]:
+    """
+    Загружает DataFrame в хранилище наборов данных, регистрирует его в DataItem
+    и возвращает (data_id, число_строк).
 
     Args: df (pd.DataFrame): DataFrame для загрузки.
-        name (str): Базовое имя для таблицы.
-        uuid (UUID): Уникальный идентификатор для таблицы.
+        name (str): Базовое имя для набора.
+        uuid (UUID): Уникальный идентификатор для набора.
+        rollup (Optional[RollupSpec]): Если задан, при загрузке считаются rollup набора.
     Returns:
-        Tuple[str, int]: Кортеж с именем созданной таблицы и числом строк.
+        Tuple[str, int]: Кортеж с именем созданного набора и числом строк.
     Raises:
-        ValueError: При ошибке загрузки данных в таблицу.
+        HTTPException: При ошибке загрузки данных.
     """
+    tracker = SchemaTracker()
+    builder = RollupBuilder(rollup) if rollup is not None else None
+    chunks = compact_chunks(_single_chunk(df), tracker)
+    if builder is not None:
+        chunks = rollup_chunks(chunks, builder)
+    data_id, stored, _ = await store_chunks(name, uuid, chunks)
+    rollups = await store_rollups(data_id, builder) if builder is not None else None
+    await add_DataItem(data_id, name, stored, schema=tracker.schema, rollups=rollups)
+    return data_id, stored.rows
+
+
+async def store_chunks(
+    name: str,
+    uuid: UUID,
+    chunks: AsyncIterable[pd.DataFrame]
+) -> Tuple[str, StoredDataset, List[Dict[str, Any]]]:
+    """
+    Потоково сохраняет порции DataFrame как новый набор данных `{name}_{uuid}`.
+
+    Набор пишется в хранилище `config.storage.backend` (таблица БД через COPY или parquet-файлы),
+    порции сохраняются по мере поступления. При ошибке на любой порции набор не создаётся.
+
+    Args:
+        name (str): Базовое имя для набора.
+        uuid (UUID): Уникальный идентификатор для набора.
+        chunks (AsyncIterable[pd.DataFrame]): Порции данных.
+    Returns:
+        Tuple[str, StoredDataset, List[Dict[str, Any]]]: data_id, итог записи и preview первых строк.
+    Raises:
+        HTTPException: Если данных нет или при ошибке загрузки данных.
+    """
+    if not DATASET_NAME_PATTERN.fullmatch(name):
+        raise HTTPException(
+            status_code=400,
+            detail="Имя набора может содержать только латинские буквы, цифры, '_' и '-' (до 64 символов)"
+        )
     data_id = f"{name}_{uuid.hex}"
-    async with engine.begin() as conn:
-        # при необходимости создаст отсутствующие таблицы из метаданных
-        await conn.run_sync(Base.metadata.create_all)
-        # вызов синхронного pandas.to_sql на синхронном соединении внутри run_sync
+    store = get_store()
+    preview: List[Dict[str, Any]] = []
+
+    async def with_preview() -> AsyncIterator[pd.DataFrame]:
+        async for chunk in chunks:
+            if not preview:
+                preview.extend(chunk.head().to_dict(orient="records"))
+            yield chunk
+
+    started = perf_counter()
+    try:
+        with span("upload.store"):
+            stored = await store.write(data_id, with_preview())
+    except ValueError as ve:
+        logger.error("Ошибка при загрузке DataFrame в набор %s: %s", data_id, ve)
+        raise HTTPException(status_code=400, detail=f"Ошибка при загрузке данных: {str(ve)}")
+    elapsed = perf_counter() - started
+    logger.info(
+        "DataFrame успешно загружен в набор %s (%s) с %s строками за %.2f с (%.0f строк/с).",
+        data_id, store.name, stored.rows, elapsed, stored.rows / elapsed if elapsed else 0
+    )
+    return data_id, stored, preview
+
+
+async def add_DataItem(data_id: str, filename: str, stored: StoredDataset, storage: str | None = None,
+                       schema: Dict[str, Any] | None = None, rollups: Dict[str, Any] | None = None,
+                       dedupe_key: List[str] | None = None, content_hash: str | None = None,
+                       content_size: int | None = None):
+    """
+    Добавляет метаданные набора данных в таблицу DataItem.
+
+    Args:
+        data_id (str): Идентификатор набора.
+        filename (str): Имя загруженного файла.
+        stored (StoredDataset): Итог записи набора в хранилище.
+        storage (str | None): Имя хранилища, по умолчанию `config.storage.backend`.
+        schema (Dict[str, Any] | None): Типы колонок, определённые при загрузке (`SchemaTracker.schema`).
+        rollups (Dict[str, Any] | None): Rollup набора (`store_rollups`).
+        dedupe_key (List[str] | None): Колонки ключа для пропуска дубликатов при дозаписи.
+        content_hash (str | None): SHA-256 загруженного файла (`content_digest`, `HashingReader`).
+        content_size (int | None): Размер загруженного файла, байт.
+
+    Raises:
+        HTTPException: При ошибке добавления записи в базу данных.
+    """
+    async with async_session() as session:
+        try:
+            session.add(DataItem(
+                id=data_id,
+                filename=filename,
+                file_size=stored.file_size,
+                content_type=stored.content_type,
+                storage=storage or get_store().name,
+                row_count=stored.rows,
+                inferred_schema=schema,
+                rollups=rollups,
+                dedupe_key=dedupe_key,
+                content_hash=content_hash,
+                content_size=content_size,
+            ))
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            logger.error("Ошибка при добавлении метаданных набора %s: %s", data_id, e)
+            raise HTTPException(status_code=500, detail="Ошибка при сохранении метаданных набора")
+
+
+async def update_DataItem(data_item: DataItem, stored: StoredDataset, schema: Dict[str, Any] | None,
+                          dedupe_key: List[str] | None, rollups: Dict[str, Any] | None) -> int:
+    """
+    Обновляет метаданные набора после дозаписи и увеличивает его версию.
+
+    Обновление условное (по прежней версии), поэтому дозапись из другого процесса не затрётся.
+
+    Returns:
+        int: Новая версия набора.
+    Raises:
+        HTTPException: 409, если версия набора уже изменилась; 500 при ошибке записи в БД.
+    """
+    async with async_session() as session:
         try:
-            await conn.run_sync(
-                lambda sync_conn: df.to_sql(
-                    name=data_id,
-                    con=sync_conn,
-                    if_exists="fail",
-                    index=False,
-                    method="multi",
+            result = await session.execute(
+                update(DataItem)
+                .where(DataItem.id == data_item.id, DataItem.version == data_item.version)
+                .values(
+                    version=data_item.version + 1,
+                    row_count=(data_item.row_count or 0) + stored.rows,
+                    file_size=stored.file_size if stored.file_size is not None else data_item.file_size,
+                    inferred_schema=schema,
+                    dedupe_key=dedupe_key,
+                    rollups=rollups,
+                    # набор уже не совпадает с загруженным файлом
+                    content_hash=None,
+                    content_size=None,
                 )
             )
-        except ValueError as ve:
-            logger.error(f"Ошибка при загрузке DataFrame в таблицу {data_id}: {str(ve)}")
-            raise HTTPException(status_code=400, detail=f"Ошибка при загрузке данных: {str(ve)}")
-        logger.info(f"DataFrame успешно загружен в таблицу {data_id} с {len(df)} строками.")
-    return data_id, len(df)
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            logger.error("Ошибка при обновлении метаданных набора %s: %s", data_item.id, e)
+            raise HTTPException(status_code=500, detail="Ошибка при сохранении метаданных набора")
+    if result.rowcount == 0:
+        logger.error("Набор %s изменён параллельной дозаписью", data_item.id)
+        raise HTTPException(status_code=409, detail="Набор данных изменён параллельной загрузкой")
+    return data_item.version + 1
 
 
-async def add_to_UserDataItem(user_id: int, data_id: str):
+async def add_to_UserDataItem(user_id: int, data_id: str, shared: bool = False) -> bool:
     """
-    Добавляет запись о загруженных данных пользователя в таблицу UserDataItem.
+    Добавляет запись о загруженных данных пользователя в таблицу UserDataItem
+    и увеличивает число ссылок на набор.
 
     Args:
         user_id (int): ID пользователя.
         data_id (str): Имя таблицы с загруженными данными.
+        shared (bool): Ссылка на уже существующий набор: она добавляется, только если на набор
+            ещё есть ссылки (иначе его как раз удаляют, см. `unlink_dataset`).
+
+    Returns:
+        bool: Ссылка есть (добавлена сейчас или раньше); False - набор удаляется.
 
     Raises:
         HTTPException: При ошибке добавления записи в базу данных.
     """
     async with async_session() as session:
         try:
+            if await session.get(UserDataItem, (user_id, data_id)) is not None:
+                return True
+            linked = DataItem.id == data_id
+            if shared:
+                linked &= DataItem.ref_count > 0
+            result = await session.execute(update(DataItem).where(linked).values(ref_count=DataItem.ref_count + 1))
+            if result.rowcount == 0:
+                await session.rollback()
+                return False
             user_data_item = UserDataItem(user_id=user_id, data_id=data_id)
             session.add(user_data_item)
             await session.commit()
-            logger.info(f"Запись о данных пользователя {user_id} для таблицы {data_id} успешно добавлена.")
+            logger.info("Запись о данных пользователя %s для таблицы %s успешно добавлена.", user_id, data_id)
+            return True
         except Exception as e:
             await session.rollback()
-            logger.error(f"Ошибка при добавлении записи о данных пользователя {user_id}: {str(e)}")
+            logger.error("Ошибка при добавлении записи о данных пользователя %s: %s", user_id, e)
             raise HTTPException(status_code=500, detail="Ошибка при сохранении данных пользователя")
@@ -0,0 +1,149 @@
+"""Пропуск повторных данных: строк, ключ которых уже есть в наборе, и файлов, которые уже загружены."""
+
+from __future__ import annotations
+
+import hashlib
+import io
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, BinaryIO, List, Optional
+from fastapi import HTTPException
+from app.middleware.logging import logger
+from app.middleware.metrics import span
+from app.services.executor import executor
+from app.lazy import lazy_import
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def content_digest(source: BinaryIO) -> str:
+    """
+    SHA-256 содержимого файла в hex.
+
+    Файл читается блоками по `HASH_BLOCK_SIZE`, в памяти не держится целиком; после чтения
+    позиция возвращается в начало, чтобы файл можно было разобрать.
+    """
+    source.seek(0)
+    digest = hashlib.sha256()
+    while block := source.read(HASH_BLOCK_SIZE):
+        digest.update(block)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+def upload_size(source: BinaryIO) -> int:
+    """Размер загруженного файла в байтах; позиция файла не меняется."""
+    position = source.tell()
+    size = source.seek(0, io.SEEK_END)
+    source.seek(position)
+    return size
+
+
+class HashingReader(io.RawIOBase):
+    """
+    Файл загрузки, по которому SHA-256 считается по ходу чтения парсером, без отдельного прохода.
+
+    Хэш готов, только если файл прочитан подряд от начала до конца (`hexdigest`). Возвраты
+    назад (определение сжатия по первым байтам) не мешают, а zip-архив читается с конца
+    и вразнобой - тогда нужен отдельный проход `content_digest`.
+    """
+
+    def __init__(self, source: BinaryIO):
+        self.source = source
+        self._digest = hashlib.sha256()
+        self._hashed = 0
+        self._skipped = False
+        self._finished = False
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.source.tell()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self.source.seek(offset, whence)
+
+    def readinto(self, buffer) -> int:
+        position = self.source.tell()
+        data = self.source.read(len(buffer))
+        buffer[:len(data)] = data
+        if position > self._hashed:
+            self._skipped = True
+        elif position + len(data) > self._hashed:
+            self._digest.update(data[self._hashed - position:])
+            self._hashed = position + len(data)
+        if not data and position == self._hashed:
+            self._finished = True
+        return len(data)
+
+    def hexdigest(self) -> Optional[str]:
+        """SHA-256 в hex или None, если файл прочитан не целиком или не подряд."""
+        return self._digest.hexdigest() if self._finished and not self._skipped else None
+
+
+def key_index(df: pd.DataFrame, key: List[str]) -> pd.MultiIndex:
+    """
+    Ключи строк df в виде MultiIndex.
+
+    Raises:
+        ValueError: Если в данных нет колонок ключа.
+    """
+    missing = [column for column in key if column not in df.columns]
+    if missing:
+        raise ValueError(f"Отсутствуют колонки ключа: {missing}")
+    return pd.MultiIndex.from_frame(df[key])
+
+
+class Deduplicator:
+    """
+    Отбрасывает строки порций, ключ которых уже встречался: в наборе до загрузки или в
+    предыдущих строках загрузки.
+
+    В памяти держатся только ключи. По ключам набора строится хэш-таблица один раз,
+    ключи загрузки копятся отдельно, потому что их обычно намного меньше.
+    """
+
+    def __init__(self, key: List[str], existing: Optional[pd.DataFrame] = None):
+        self.key = key
+        self.existing = key_index(existing, key).unique() if existing is not None else None
+        self.added: Optional[pd.MultiIndex] = None
+        self.skipped = 0
+
+    def _seen(self, index: pd.MultiIndex, keys: Optional[pd.MultiIndex]):
+        if keys is None or keys.empty:
+            return False
+        return keys.get_indexer_for(index) != -1
+
+    def filter(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Строки порции с новыми ключами.
+
+        Raises:
+            ValueError: Если в порции нет колонок ключа.
+        """
+        index = key_index(chunk, self.key)
+        duplicate = index.duplicated() | self._seen(index, self.existing) | self._seen(index, self.added)
+        self.skipped += int(duplicate.sum())
+        kept = index[~duplicate]
+        self.added = kept if self.added is None else self.added.append(kept)
+        return chunk[~duplicate] if duplicate.any() else chunk
+
+
+async def dedupe_chunks(chunks: AsyncIterable[pd.DataFrame], deduplicator: Deduplicator) -> AsyncIterator[pd.DataFrame]:
+    """Пропускает дальше только новые строки порций; порции, где все строки - дубликаты, не передаются."""
+    async for chunk in chunks:
+        try:
+            with span("csv.dedupe"):
+                chunk = await executor.run_thread(deduplicator.filter, chunk)
+        except ValueError as e:
+            logger.error("Ошибка проверки дубликатов: %s", e)
+            raise HTTPException(status_code=400, detail=f"Ошибка проверки дубликатов: {str(e)}")
+        if not chunk.empty:
+            yield chunk
@@ -0,0 +1,162 @@
+"""Прореживание рядов для line/scatter графиков (векторизовано на NumPy)."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional
+from app.lazy import lazy_import
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: индексы n_out точек, сохраняющих форму линии.
+
+    Первая и последняя точки сохраняются всегда, остальные делятся на n_out - 2 корзины,
+    в каждой выбирается точка с наибольшей площадью треугольника с предыдущей выбранной
+    точкой и средним следующей корзины. Внутри корзины всё считается векторно.
+
+    Args:
+        x (np.ndarray): Значения X, отсортированные по возрастанию (float).
+        y (np.ndarray): Значения Y (float).
+        n_out (int): Сколько точек оставить (>= 3).
+    Returns:
+        np.ndarray: Отсортированные индексы выбранных точек.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    # границы корзин для точек 1..n-2
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # средние по корзинам считаются разом через кумулятивные суммы
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    # "следующая корзина" для последней корзины - последняя точка
+    next_lo = edges[1:]
+    next_hi = np.append(edges[2:], n)
+    counts = np.maximum(next_hi - next_lo, 1)
+    avg_x = (cx[next_hi] - cx[next_lo]) / counts
+    avg_y = (cy[next_hi] - cy[next_lo]) / counts
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - avg_x[i]) * (by - y[a]) - (x[a] - bx) * (avg_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Индексы минимума и максимума в каждой из n_out // 2 корзин (в порядке исходных данных)."""
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+    n_buckets = n_out // 2
+    bucket = np.arange(n) * n_buckets // n
+    # сортировка по (корзина, y): первый элемент корзины - минимум, последний - максимум
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate((order[starts], order[ends])))
+
+
+def random_indices(n: int, n_out: int, seed: int = 0) -> np.ndarray:
+    """Случайная равномерная выборка n_out индексов без повторов (детерминированная при том же seed)."""
+    if n_out >= n:
+        return np.arange(n)
+    return np.sort(np.random.default_rng(seed).choice(n, size=n_out, replace=False))
+
+
+def _budgets(sizes: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Делит max_points между рядами пропорционально их длине (метод наибольших остатков).
+
+    Сумма бюджетов ровно max_points; если рядов больше, чем точек, самым коротким рядам
+    может не достаться ни одной точки.
+    """
+    quotas = max_points * sizes / sizes.sum()
+    budgets = np.floor(quotas).astype(np.int64)
+    extra = max_points - int(budgets.sum())
+    if extra > 0:
+        budgets[np.argsort(budgets - quotas, kind="stable")[:extra]] += 1
+    return budgets
+
+
+def _evenly_spaced(n: int, n_out: int) -> np.ndarray:
+    """Равномерно расставленные индексы - для бюджета меньше, чем нужно LTTB или min/max."""
+    if n_out <= 0:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.linspace(0, n - 1, n_out).round().astype(np.int64))
+
+
+def _is_axis_numeric(series: pd.Series) -> bool:
+    return (pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)) \
+        or pd.api.types.is_datetime64_any_dtype(series)
+
+
+def _as_float(series: pd.Series) -> np.ndarray:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(np.float64)
+        values[series.isna().to_numpy()] = np.nan
+        return values
+    return pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64)
+
+
+def downsample(df: pd.DataFrame, chart_type: str, x_field: str, y_field: str, max_points: Optional[int],
+               color_field: Optional[str] = None, scatter_sampling: str = "minmax") -> pd.DataFrame:
+    """
+    Уменьшает число точек графика до max_points.
+
+    Для line - LTTB по каждому ряду (color) отдельно; если X не число и не дата, рядом
+    считается порядок строк. Для scatter - min/max по корзинам либо случайная выборка.
+    Бюджет точек делится между рядами пропорционально их длине, в сумме не больше
+    max_points. Остальные типы графиков и данные, которые и так помещаются в лимит,
+    возвращаются без изменений.
+
+    Args:
+        df (pd.DataFrame): Подготовленные данные графика.
+        chart_type (str): Тип графика.
+        x_field (str): Поле оси X.
+        y_field (str): Поле оси Y.
+        max_points (Optional[int]): Максимум точек, None - без прореживания.
+        color_field (Optional[str]): Поле, разбивающее данные на ряды.
+        scatter_sampling (str): "minmax" или "random" для scatter.
+    Returns:
+        pd.DataFrame: Прореженные данные.
+    """
+    if not max_points or len(df) <= max_points or chart_type not in ("line", "scatter"):
+        return df
+    groups = df.groupby(color_field, sort=False, dropna=False).indices if color_field else {None: np.arange(len(df))}
+    series = list(groups.values())
+    budgets = _budgets(np.array([len(positions) for positions in series]), max_points)
+    numeric_x = _is_axis_numeric(df[x_field])
+    keep = []
+    for positions, budget in zip(series, budgets):
+        if len(positions) <= budget:
+            keep.append(positions)
+        elif budget < 3:
+            keep.append(positions[_evenly_spaced(len(positions), budget)])
+        elif chart_type == "line":
+            if numeric_x:
+                x = _as_float(df[x_field].iloc[positions])
+                order = np.argsort(x, kind="stable")
+                positions, x = positions[order], x[order]
+            else:
+                x = np.arange(len(positions), dtype=np.float64)
+            y = _as_float(df[y_field].iloc[positions])
+            valid = ~(np.isnan(x) | np.isnan(y))
+            keep.append(positions[valid][lttb_indices(x[valid], y[valid], budget)])
+        elif scatter_sampling == "random":
+            keep.append(positions[random_indices(len(positions), budget)])
+        else:
+            y = _as_float(df[y_field].iloc[positions])
+            keep.append(positions[minmax_indices(np.where(np.isnan(y), -np.inf, y), budget)])
+    return df.iloc[np.concatenate(keep)]
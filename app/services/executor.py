@@ -0,0 +1,112 @@
+"""Пулы для тяжёлой синхронной работы (pandas, Altair), чтобы она не блокировала цикл событий."""
+
+import asyncio
+import contextvars
+import multiprocessing
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, TypeVar
+from fastapi import HTTPException, status
+from app.config.settings import ExecutorSettings, config
+from app.middleware.logging import init_worker_logging, logger, pipeline
+from app.middleware.metrics import call_with_spans, record_spans
+
+
+T = TypeVar("T")
+
+
+class TaskExecutor:
+    """
+    Пул процессов для CPU-тяжёлых задач (построение графиков) и пул потоков для лёгких.
+
+    Одновременно принимается не больше `max_pending` задач, при переполнении сразу отдаётся 503,
+    задача дольше `task_timeout` секунд завершается для клиента ответом 504.
+    Пулы создаются лениво при первом использовании или в `start()`.
+    """
+
+    def __init__(self, settings: ExecutorSettings):
+        self.settings = settings
+        self._slots = threading.BoundedSemaphore(settings.max_pending)
+        self._lock = threading.Lock()
+        self._process_pool: ProcessPoolExecutor | None = None
+        self._thread_pool: ThreadPoolExecutor | None = None
+
+    @property
+    def process_pool(self) -> Executor:
+        if self.settings.process_workers <= 0:
+            return self.thread_pool
+        with self._lock:
+            if self._process_pool is None:
+                context = multiprocessing.get_context(self.settings.start_method)
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.settings.process_workers,
+                    mp_context=context,
+                    initializer=init_worker_logging,
+                    initargs=(pipeline.worker_queue(context),),
+                )
+            return self._process_pool
+
+    @property
+    def thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=self.settings.thread_workers,
+                    thread_name_prefix="foodnet-worker",
+                )
+            return self._thread_pool
+
+    def start(self) -> None:
+        """Создаёт пулы заранее, чтобы первый запрос не платил за запуск процессов."""
+        _ = self.process_pool, self.thread_pool
+
+    def shutdown(self) -> None:
+        """Останавливает пулы, незапущенные задачи отменяются."""
+        with self._lock:
+            pools = [self._process_pool, self._thread_pool]
+            self._process_pool = self._thread_pool = None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    async def run_process(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Выполняет func(*args) в пуле процессов. func и аргументы должны сериализоваться pickle.
+
+        Этапы, отмеченные внутри func через `span`, переносятся в метрики основного процесса.
+        """
+        try:
+            result, spans = await self._submit(self.process_pool, call_with_spans, func, *args, name=getattr(func, "__name__", repr(func)))
+            record_spans(spans)
+            return result
+        except BrokenProcessPool:
+            logger.error("Пул процессов сломан, будет пересоздан при следующей задаче")
+            with self._lock:
+                self._process_pool = None
+            raise
+
+    async def run_thread(self, func: Callable[..., T], *args: Any) -> T:
+        """Выполняет func(*args) в пуле потоков, в контексте (contextvars) вызывающей задачи."""
+        return await self._submit(self.thread_pool, contextvars.copy_context().run, func, *args, name=getattr(func, "__name__", repr(func)))
+
+    async def _submit(self, pool: Executor, func: Callable[..., T], *args: Any, name: str) -> T:
+        if not self._slots.acquire(blocking=False):
+            logger.warning("Очередь задач заполнена (%s), задача %s отклонена", self.settings.max_pending, name)
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Сервер перегружен, повторите позже")
+        try:
+            future: Future = pool.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # слот освобождается, когда задача действительно завершилась, а не когда клиент перестал ждать
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.settings.task_timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            logger.error("Задача %s не уложилась в %s с", name, self.settings.task_timeout)
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Превышено время обработки")
+
+
+executor = TaskExecutor(config.executor)
@@ -0,0 +1,321 @@
+"""
+Фоновые загрузки: файл сохраняется на локальный диск, обработка идёт в воркерах процесса.
+
+Очередь - таблица upload_jobs основной БД, внешний брокер не нужен: задачи переживают
+перезапуск, их состояние видно из любого процесса. Воркер забирает самую старую задачу
+в статусе queued условным UPDATE, поэтому одну задачу не выполнят два воркера или процесса.
+"""
+
+import asyncio
+import shutil
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, List, Optional
+from uuid import uuid4
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from app.config.settings import JobSettings, config
+from app.database.connection import async_session
+from app.middleware.logging import logger
+from app.models.models import UploadJob
+from app.services.executor import executor
+
+
+# progress(строк загружено, байт файла обработано); бросает JobCancelled, если задачу отменили
+Progress = Callable[[int, int], Awaitable[None]]
+Runner = Callable[[UploadJob, Progress], Awaitable[Dict[str, Any]]]
+FINISHED = ("done", "failed", "cancelled")
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class JobCancelled(Exception):
+    """Задачу отменили через /upload/jobs/{job_id}/cancel (возможно, в другом процессе)."""
+
+
+class JobQueue:
+    """
+    Очередь фоновых загрузок и `workers` воркеров, которые её разбирают.
+
+    Число воркеров не больше пула `database.analytics`: фоновые загрузки не забирают все
+    соединения у графиков. Пока задача выполняется, процесс раз в `heartbeat_interval` секунд
+    обновляет её `heartbeat_at` (независимо от прогресса: разбор большого файла может долго
+    не сообщать о нём). Воркеры любого процесса с тем же интервалом возвращают в очередь
+    задачи в работе без отметки дольше `stale_after` секунд: их процесс упал или не смог
+    записать итог (после `max_attempts` запусков задача помечается failed).
+    """
+
+    def __init__(self, settings: JobSettings, run: Runner):
+        self.settings = settings
+        self.run = run
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+        self._recovered_at = float("-inf")
+
+    @property
+    def workers(self) -> int:
+        return max(1, min(self.settings.workers, config.database.analytics.pool_size))
+
+    async def start(self) -> None:
+        """Возвращает в очередь брошенные задачи и запускает воркеров (в lifespan)."""
+        await self._recover()
+        self._recovered_at = time.monotonic()
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._worker(), name=f"upload-job-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Останавливает воркеров; выполняемые задачи возвращаются в очередь."""
+        self._stopping = True
+        tasks = [*self._running.values(), *self._workers]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, source: BinaryIO, filename: str, params: Dict[str, Any]) -> UploadJob:
+        """
+        Сохраняет файл в `spool_dir` и ставит задачу в очередь.
+
+        Raises:
+            HTTPException: 503, если в очереди уже `max_queued` задач.
+        """
+        async with async_session() as session:
+            queued = await session.scalar(select(func.count()).select_from(UploadJob).where(UploadJob.status == "queued"))
+        if queued >= self.settings.max_queued:
+            logger.warning("Очередь фоновых загрузок заполнена (%s)", queued)
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Очередь загрузок заполнена, повторите позже", headers={"Retry-After": "30"})
+        job_id = uuid4().hex
+        path = Path(self.settings.spool_dir) / f"{job_id}.upload"
+        size = await executor.run_thread(_spool, source, path)
+        now = utcnow()
+        job = UploadJob(id=job_id, status="queued", filename=filename, spool_path=str(path), params=params,
+                        bytes_total=size, created_at=now, updated_at=now)
+        try:
+            async with async_session() as session:
+                session.add(job)
+                await session.commit()
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        logger.info("Фоновая загрузка %s (%s, %s байт) поставлена в очередь", job_id, filename, size)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> UploadJob:
+        """
+        Raises:
+            HTTPException: 404, если задачи нет.
+        """
+        async with async_session() as session:
+            job = await session.get(UploadJob, job_id)
+        if job is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Задача загрузки не найдена")
+        return job
+
+    async def cancel(self, job_id: str) -> UploadJob:
+        """
+        Отменяет задачу: ожидающая снимается сразу, выполняемая останавливается на ближайшей
+        порции (её набор не создаётся, см. `DatasetStore.write`).
+
+        Raises:
+            HTTPException: 404, если задачи нет; 409, если она уже завершена.
+        """
+        job = await self.get(job_id)
+        if job.status in FINISHED:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Задача уже завершена ({job.status})")
+        async with async_session() as session:
+            await session.execute(
+                update(UploadJob).where(UploadJob.id == job_id, UploadJob.status == "queued")
+                .values(status="cancelled", cancel_requested=True, finished_at=utcnow(), updated_at=utcnow())
+            )
+            await session.execute(
+                update(UploadJob).where(UploadJob.id == job_id, UploadJob.status == "running").values(cancel_requested=True)
+            )
+            await session.commit()
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        return await self.get(job_id)
+
+    async def retry(self, job_id: str) -> UploadJob:
+        """
+        Ставит упавшую или отменённую задачу в очередь заново, с тем же файлом.
+
+        Raises:
+            HTTPException: 404, если задачи нет; 409, если она не failed/cancelled;
+                410, если её файл уже удалён.
+        """
+        job = await self.get(job_id)
+        if job.status not in ("failed", "cancelled"):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Повторить можно только failed или cancelled задачу ({job.status})")
+        if not Path(job.spool_path).exists():
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Файл задачи уже удалён")
+        async with async_session() as session:
+            await session.execute(
+                update(UploadJob).where(UploadJob.id == job_id, UploadJob.status == job.status).values(
+                    status="queued", cancel_requested=False, attempts=0, rows_loaded=0, bytes_processed=0,
+                    result=None, error=None, started_at=None, heartbeat_at=None, finished_at=None, updated_at=utcnow(),
+                )
+            )
+            await session.commit()
+        self._wakeup.set()
+        return await self.get(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            self._wakeup.clear()
+            await self._recover_periodically()
+            try:
+                job = await self._claim()
+            except Exception:
+                logger.exception("Не удалось взять задачу из очереди загрузок")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.settings.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(self._execute(job), name=f"upload-job-{job.id}")
+            self._running[job.id] = task
+            try:
+                await asyncio.shield(task)
+            except Exception:
+                # воркер не должен умирать вместе с задачей: её итог не записан, отметки
+                # больше не обновляются, и через stale_after задачу вернёт в очередь
+                # _recover_periodically любого процесса
+                logger.exception("Не удалось записать итог фоновой загрузки %s", job.id)
+            finally:
+                self._running.pop(job.id, None)
+
+    async def _claim(self) -> Optional[UploadJob]:
+        async with async_session() as session:
+            candidates = (await session.scalars(
+                select(UploadJob.id).where(UploadJob.status == "queued").order_by(UploadJob.created_at).limit(self.workers + 1)
+            )).all()
+            for job_id in candidates:
+                now = utcnow()
+                result = await session.execute(
+                    update(UploadJob).where(UploadJob.id == job_id, UploadJob.status == "queued")
+                    .values(status="running", attempts=UploadJob.attempts + 1, started_at=now, heartbeat_at=now,
+                            updated_at=now)
+                )
+                await session.commit()
+                if result.rowcount == 1:
+                    return await session.get(UploadJob, job_id)
+        return None
+
+    async def _execute(self, job: UploadJob) -> None:
+        logger.info("Фоновая загрузка %s (%s) начата, попытка %s", job.id, job.filename, job.attempts)
+
+        async def progress(rows: int, processed: int) -> None:
+            # прогресс - не главное: если его не удалось записать (SQLite заблокирован записью
+            # набора), загрузка продолжается, итог всё равно запишется в _finish
+            try:
+                async with async_session() as session:
+                    await session.execute(
+                        update(UploadJob).where(UploadJob.id == job.id)
+                        .values(rows_loaded=rows, bytes_processed=processed, updated_at=utcnow())
+                    )
+                    cancelled = await session.scalar(select(UploadJob.cancel_requested).where(UploadJob.id == job.id))
+                    await session.commit()
+            except SQLAlchemyError as e:
+                logger.warning("Не удалось записать прогресс загрузки %s: %s", job.id, e)
+                return
+            if cancelled:
+                raise JobCancelled()
+
+        heartbeat = asyncio.create_task(self._heartbeat(job.id), name=f"upload-job-heartbeat-{job.id}")
+        try:
+            result = await self.run(job, progress)
+        except asyncio.CancelledError:
+            if self._stopping:
+                await self._finish(job.id, "queued", finished=False)
+                raise
+            await self._finish(job.id, "cancelled", error="Загрузка отменена")
+        except JobCancelled:
+            await self._finish(job.id, "cancelled", error="Загрузка отменена")
+        except HTTPException as e:
+            logger.error("Фоновая загрузка %s не выполнена: %s", job.id, e.detail)
+            await self._finish(job.id, "failed", error=str(e.detail))
+        except Exception as e:
+            logger.exception("Фоновая загрузка %s упала", job.id)
+            await self._finish(job.id, "failed", error=f"{type(e).__name__}: {e}")
+        else:
+            # в итоге есть превью строк: даты pandas и т. п. приводятся к JSON
+            await self._finish(job.id, "done", result=jsonable_encoder(result), rows_loaded=result.get("rows", 0),
+                               bytes_processed=job.bytes_total or 0)
+            Path(job.spool_path).unlink(missing_ok=True)
+            logger.info("Фоновая загрузка %s завершена: %s строк", job.id, result.get("rows"))
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.settings.heartbeat_interval)
+            # как и прогресс, пропущенная отметка не останавливает загрузку: задачу сочтут
+            # брошенной, только если отметок не было stale_after секунд
+            try:
+                async with async_session() as session:
+                    await session.execute(
+                        update(UploadJob).where(UploadJob.id == job_id, UploadJob.status == "running")
+                        .values(heartbeat_at=utcnow())
+                    )
+                    await session.commit()
+            except SQLAlchemyError as e:
+                logger.warning("Не удалось отметить выполнение загрузки %s: %s", job_id, e)
+
+    async def _finish(self, job_id: str, new_status: str, finished: bool = True, **values: Any) -> None:
+        now = utcnow()
+        async with async_session() as session:
+            await session.execute(
+                update(UploadJob).where(UploadJob.id == job_id)
+                .values(status=new_status, updated_at=now, finished_at=now if finished else None, **values)
+            )
+            await session.commit()
+
+    async def _recover_periodically(self) -> None:
+        # воркеров несколько, проверку делает тот, кто первым дождался интервала
+        if time.monotonic() - self._recovered_at < self.settings.heartbeat_interval:
+            return
+        self._recovered_at = time.monotonic()
+        try:
+            await self._recover()
+        except Exception:
+            logger.exception("Не удалось вернуть в очередь брошенные фоновые загрузки")
+
+    async def _recover(self) -> None:
+        stale = utcnow() - timedelta(seconds=self.settings.stale_after)
+        # у задач, взятых до появления heartbeat_at, отметкой служит updated_at
+        abandoned = (UploadJob.status == "running") & (func.coalesce(UploadJob.heartbeat_at, UploadJob.updated_at) < stale)
+        async with async_session() as session:
+            await session.execute(
+                update(UploadJob).where(abandoned, UploadJob.attempts >= self.settings.max_attempts)
+                .values(status="failed", error="Процесс загрузки завершился аварийно", finished_at=utcnow())
+            )
+            result = await session.execute(update(UploadJob).where(abandoned).values(status="queued"))
+            await session.commit()
+        if result.rowcount:
+            logger.warning("В очередь возвращено %s брошенных фоновых загрузок", result.rowcount)
+
+
+def _spool(source: BinaryIO, path: Path) -> int:
+    """Копирует файл в path (через временный файл) и возвращает его размер."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    source.seek(0)
+    with open(tmp, "wb") as target:
+        shutil.copyfileobj(source, target, length=1024 * 1024)
+    tmp.rename(path)
+    return path.stat().st_size
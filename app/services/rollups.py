@@ -0,0 +1,188 @@
+"""
+Предагрегаты (rollup) наборов данных, которые считаются при загрузке.
+
+Rollup набора - таблица сумм и числа значений каждой меры по (интервал времени, измерения)
+для нескольких интервалов (`config.rollups.granularities`). Суммы и счётчики складываются,
+поэтому rollup собирается из порций загрузки, а sum, count и mean по более крупному интервалу
+или без времени считаются по нему без чтения исходных строк.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterable, AsyncIterator, Dict, List, Optional
+from app.config.settings import config
+from app.services.executor import executor
+from app.storage.parquet_store import time_bucket, wide_numbers
+from app.lazy import lazy_import
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+
+SUM_SUFFIX = "__sum"
+COUNT_SUFFIX = "__count"
+AGGREGATES = ("sum", "mean", "count")
+
+# какие интервалы запроса (time_unit) можно получить из rollup данного интервала:
+# неделя не складывается из месяцев, а месяц из недель
+ANSWERS = {
+    "hour": ("hour", "day", "week", "month", "quarter", "year"),
+    "day": ("day", "week", "month", "quarter", "year"),
+    "week": ("week",),
+    "month": ("month", "quarter", "year"),
+    "quarter": ("quarter", "year"),
+    "year": ("year",),
+}
+# от крупного интервала к мелкому: в крупном меньше строк
+COARSEST_FIRST = ("year", "quarter", "month", "week", "day", "hour")
+# сколько частичных агрегатов копится до слияния
+MERGE_EVERY = 16
+
+
+@dataclass
+class RollupSpec:
+    """
+    Что предагрегировать: колонка времени, измерения (store, category, ...) и меры.
+
+    Если меры не заданы, ими становятся все числовые колонки, кроме измерений.
+    """
+    time_column: str
+    dimensions: List[str] = field(default_factory=list)
+    measures: Optional[List[str]] = None
+    granularities: List[str] = field(default_factory=lambda: list(config.rollups.granularities))
+
+    def __post_init__(self):
+        unknown = [unit for unit in self.granularities if unit not in ANSWERS]
+        if unknown:
+            raise ValueError(f"Неизвестные интервалы rollup: {unknown}")
+
+
+def rollup_frame(df: pd.DataFrame, time_column: str, dimensions: List[str], measures: List[str],
+                 granularity: str) -> pd.DataFrame:
+    """
+    Суммы и число значений мер по (начало интервала granularity, измерения).
+
+    Меры суммируются в int64 и float64, как в БД, а не в узких типах загрузки (`wide_numbers`).
+    """
+    keys = [time_bucket(df[time_column], granularity).rename(time_column)] + [df[column] for column in dimensions]
+    grouped = wide_numbers(df[measures]).groupby(keys, dropna=False, observed=True, sort=False)
+    sums = grouped.sum().add_suffix(SUM_SUFFIX)
+    counts = grouped.count().add_suffix(COUNT_SUFFIX)
+    return pd.concat([sums, counts], axis=1).reset_index()
+
+
+def merge_rollups(frames: List[pd.DataFrame], keys: List[str]) -> pd.DataFrame:
+    """Складывает частичные rollup с одинаковыми ключами."""
+    merged = pd.concat(frames, ignore_index=True)
+    values = wide_numbers(merged.drop(columns=keys))
+    return values.groupby([merged[key] for key in keys], dropna=False, observed=True, sort=True).sum().reset_index()
+
+
+class RollupBuilder:
+    """
+    Собирает rollup по порциям загрузки (как `SchemaTracker` собирает схему).
+
+    Меры определяются по первой порции. Частичные агрегаты порций периодически сливаются,
+    в памяти держатся агрегаты, а не строки набора.
+    """
+
+    def __init__(self, spec: RollupSpec):
+        self.spec = spec
+        self.measures: Optional[List[str]] = spec.measures
+        self._partials: Dict[str, List[pd.DataFrame]] = {unit: [] for unit in spec.granularities}
+
+    @property
+    def keys(self) -> List[str]:
+        return [self.spec.time_column, *self.spec.dimensions]
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        """
+        Raises:
+            ValueError: Если в порции нет колонок rollup, меры не числовые или время не разбирается.
+        """
+        missing = [column for column in self.keys + (self.measures or []) if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"Отсутствуют колонки для rollup: {missing}")
+        if self.measures is None:
+            self.measures = [
+                column for column in chunk.columns
+                if column not in self.keys
+                and pd.api.types.is_numeric_dtype(chunk[column]) and not pd.api.types.is_bool_dtype(chunk[column])
+            ]
+        if not self.measures:
+            raise ValueError("Для rollup нет числовых колонок")
+        not_numeric = [column for column in self.measures if not pd.api.types.is_numeric_dtype(chunk[column])]
+        if not_numeric:
+            raise ValueError(f"Меры rollup должны быть числовыми: {not_numeric}")
+        if not pd.api.types.is_datetime64_any_dtype(chunk[self.spec.time_column]):
+            chunk = chunk.assign(**{self.spec.time_column: pd.to_datetime(chunk[self.spec.time_column])})
+        for unit, partials in self._partials.items():
+            partials.append(rollup_frame(chunk, self.spec.time_column, self.spec.dimensions, self.measures, unit))
+            if len(partials) >= MERGE_EVERY:
+                partials[:] = [merge_rollups(partials, self.keys)]
+
+    def result(self) -> Dict[str, pd.DataFrame]:
+        """Итоговые rollup по интервалам (пустой словарь, если порций не было)."""
+        return {unit: merge_rollups(partials, self.keys) for unit, partials in self._partials.items() if partials}
+
+    def registry(self, tables: Dict[str, str]) -> Dict[str, Any]:
+        """Описание rollup для `DataItem.rollups`; tables - интервал -> идентификатор набора с rollup."""
+        return {
+            "time_column": self.spec.time_column,
+            "dimensions": self.spec.dimensions,
+            "measures": self.measures,
+            "tables": tables,
+        }
+
+
+async def rollup_chunks(chunks: AsyncIterable[pd.DataFrame], builder: RollupBuilder) -> AsyncIterator[pd.DataFrame]:
+    """Пропускает порции дальше, по пути добавляя их в rollup."""
+    async for chunk in chunks:
+        await executor.run_thread(builder.add, chunk)
+        yield chunk
+
+
+def rollup_id(data_id: str, granularity: str) -> str:
+    return f"{data_id}__rollup_{granularity}"
+
+
+def choose_rollup(rollups: Optional[Dict[str, Any]], x_field: str, y_field: str, aggregate: str,
+                  color_field: Optional[str] = None, time_unit: Optional[str] = None) -> Optional[str]:
+    """
+    Самый крупный интервал rollup, по которому можно ответить на запрос графика, или None.
+
+    Подходит, если y - мера, color - измерение, а x - либо колонка времени с time_unit,
+    который получается из интервала rollup, либо измерение без time_unit.
+    """
+    if not rollups or aggregate not in AGGREGATES or y_field not in (rollups.get("measures") or ()):
+        return None
+    dimensions = rollups.get("dimensions") or []
+    if color_field and color_field not in dimensions:
+        return None
+    tables = rollups.get("tables") or {}
+    if x_field == rollups.get("time_column") and time_unit:
+        usable = [unit for unit in COARSEST_FIRST if unit in tables and time_unit in ANSWERS[unit]]
+    elif x_field in dimensions and not time_unit:
+        usable = [unit for unit in COARSEST_FIRST if unit in tables]
+    else:
+        return None
+    return usable[0] if usable else None
+
+
+def aggregate_rollup(rollup: pd.DataFrame, x_field: str, y_field: str, aggregate: str,
+                     color_field: Optional[str] = None, time_unit: Optional[str] = None) -> pd.DataFrame:
+    """То же, что `DatasetStore.aggregate`, по rollup: суммы и счётчики складываются, mean = сумма / число."""
+    keys = [time_bucket(rollup[x_field], time_unit).rename(x_field) if time_unit else rollup[x_field]]
+    if color_field:
+        keys.append(rollup[color_field])
+    grouped = rollup[[y_field + SUM_SUFFIX, y_field + COUNT_SUFFIX]].groupby(keys, dropna=False, sort=True, observed=True).sum()
+    sums, counts = grouped[y_field + SUM_SUFFIX], grouped[y_field + COUNT_SUFFIX]
+    if aggregate == "sum":
+        values = sums
+    elif aggregate == "count":
+        values = counts
+    else:
+        values = sums / counts.where(counts > 0)
+    return values.rename(y_field).reset_index()
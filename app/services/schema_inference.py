@@ -0,0 +1,251 @@
+"""Определение компактных типов колонок при загрузке CSV."""
+
+from __future__ import annotations
+
+import re
+import warnings
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+from app.lazy import lazy_import
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+else:
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+
+
+# строковая колонка становится category, если уникальных значений не больше этой доли строк
+CATEGORY_MAX_RATIO = 0.5
+DATETIME_SAMPLE = 1000
+
+INT_TYPES = ("int8", "int16", "int32", "int64")
+FLOAT_TYPES = ("float32", "float64")
+
+
+def _smallest_int(series: pd.Series) -> str:
+    if series.empty:
+        return "int8"
+    low, high = series.min(), series.max()
+    for dtype in INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return "int64"
+
+
+def _float_type(series: pd.Series) -> str:
+    """float32, если значения переживают округление до float32 без потерь, иначе float64."""
+    values = series.to_numpy(dtype=np.float64)
+    with np.errstate(over="ignore"):
+        exact = np.array_equal(values.astype(np.float32).astype(np.float64), values, equal_nan=True)
+    return "float32" if exact else "float64"
+
+
+def _year_first(values: pd.Series) -> pd.Series:
+    # ISO-даты начинаются с года, остальное (выгрузки iiko: 31.01.2025) - день первым
+    return values.str.match(r"^\d{4}")
+
+
+def parse_dates(series: pd.Series, fmt: Optional[str]) -> pd.Series:
+    """
+    Разбирает строки с датами: сначала по формату колонки, значения другого вида - поштучно.
+
+    Значения, которые не разобрались ни так, ни так, становятся NaT; проверять потери
+    должен вызывающий (см. `_lost_dates`).
+    """
+    parsed = pd.to_datetime(series, format=fmt, errors="coerce")
+    missed = np.flatnonzero((parsed.isna() & series.notna()).to_numpy())
+    if len(missed):
+        rest = series.iloc[missed].astype(str)
+        year_first = _year_first(rest).to_numpy()
+        parsed = parsed.copy()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            for mask, dayfirst in ((year_first, False), (~year_first, True)):
+                if mask.any():
+                    parsed.iloc[missed[mask]] = pd.to_datetime(
+                        rest[mask], format="mixed", dayfirst=dayfirst, errors="coerce"
+                    ).to_numpy(dtype="datetime64[ns]")
+    return parsed
+
+
+def _lost_dates(series: pd.Series, parsed: pd.Series) -> pd.Series:
+    """Непустые значения, которые не удалось разобрать как дату."""
+    return series[(parsed.isna() & series.notna()).to_numpy()]
+
+
+def _datetime_format(values: pd.Series) -> Optional[str]:
+    """
+    Формат дат строковой колонки или None, если это не даты.
+
+    Формат угадывается по первому значению, а колонка считается датой, только если
+    разбираются все её значения: иначе данные, не похожие на дату, были бы потеряны.
+    """
+    first = str(values.iloc[0])
+    if not re.search(r"\d", first) or not re.search(r"[-/.:]", first):
+        return None
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        fmt = pd.tseries.api.guess_datetime_format(first, dayfirst=not re.match(r"^\d{4}", first))
+    if fmt is None:
+        return None
+    # дешёвая проверка по выборке, прежде чем разбирать всю колонку
+    sample = values.head(DATETIME_SAMPLE)
+    if not _lost_dates(sample, parse_dates(sample, fmt)).empty:
+        return None
+    return fmt if _lost_dates(values, parse_dates(values, fmt)).empty else None
+
+
+def infer_schema(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Подбирает компактные типы колонок по порции данных.
+
+    Целые - самый узкий int, дробные - float32 без потери точности, строки с датами -
+    datetime64 (формат запоминается), повторяющиеся строки - category.
+
+    Returns:
+        Dict[str, Any]: {"dtypes": {колонка: dtype}, "datetime_formats": {колонка: формат}}.
+    """
+    dtypes: Dict[str, str] = {}
+    formats: Dict[str, str] = {}
+    for column, series in df.items():
+        column = str(column)
+        if pd.api.types.is_bool_dtype(series):
+            dtypes[column] = "bool"
+        elif pd.api.types.is_integer_dtype(series):
+            dtypes[column] = _smallest_int(series)
+        elif pd.api.types.is_float_dtype(series):
+            dtypes[column] = _float_type(series)
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            dtypes[column] = str(series.dtype)
+        else:
+            values = series.dropna()
+            if values.empty:
+                dtypes[column] = "object"
+            elif fmt := _datetime_format(values):
+                dtypes[column] = "datetime64[ns]"
+                formats[column] = fmt
+            elif values.nunique() <= max(1, CATEGORY_MAX_RATIO * len(values)):
+                dtypes[column] = "category"
+            else:
+                dtypes[column] = "object"
+    return {"dtypes": dtypes, "datetime_formats": formats}
+
+
+def _wider(current: str, needed: str) -> str:
+    order = INT_TYPES + FLOAT_TYPES
+    return needed if order.index(needed) > order.index(current) else current
+
+
+def apply_schema(df: pd.DataFrame, schema: Dict[str, Any], widen: bool = False,
+                 allow_text: bool = False) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Приводит колонки DataFrame к типам схемы.
+
+    Args:
+        df (pd.DataFrame): Данные.
+        schema (Dict[str, Any]): Схема из `infer_schema`.
+        widen (bool): Если числа порции не помещаются в тип схемы (большие значения, пропуски
+            в целых, дробные вместо float32), тип в схеме расширяется, а не обрезается.
+            Используется при загрузке, когда схема определена по первой порции.
+        allow_text (bool): Вместе с widen: если в числовой колонке или колонке дат встретились
+            другие значения ("A-17", "unknown"), колонка становится строковой (object).
+    Returns:
+        Tuple[pd.DataFrame, Dict[str, Any]]: Данные и схема (расширенная, если widen).
+    Raises:
+        ValueError: Если значения нельзя привести к числовому типу схемы или к дате, а колонке
+            нельзя стать строковой (значения никогда не превращаются в пропуски молча).
+    """
+    dtypes = dict(schema["dtypes"])
+    formats = dict(schema.get("datetime_formats", {}))
+    converted = {}
+    for column, dtype in dtypes.items():
+        if column not in df.columns:
+            continue
+        series = df[column]
+        if dtype == "bool" and not pd.api.types.is_bool_dtype(series):
+            # пропуски в логической колонке: оставляем как есть, иначе NaN станет True
+            continue
+        if dtype in INT_TYPES + FLOAT_TYPES:
+            if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+                try:
+                    series = pd.to_numeric(series)
+                except (ValueError, TypeError):
+                    if not (widen and allow_text):
+                        raise
+                    dtypes[column] = "object"
+                    converted[column] = series.astype("object")
+                    continue
+            if widen:
+                if pd.api.types.is_integer_dtype(series) and dtype in INT_TYPES:
+                    dtype = _wider(dtype, _smallest_int(series))
+                elif dtype != "float64":
+                    dtype = _wider(dtype, _float_type(series))
+                dtypes[column] = dtype
+        elif dtype.startswith("datetime64"):
+            if not pd.api.types.is_datetime64_any_dtype(series):
+                parsed = parse_dates(series, formats.get(column))
+                lost = _lost_dates(series, parsed)
+                if not lost.empty and widen and allow_text:
+                    dtypes[column] = "object"
+                    formats.pop(column, None)
+                    converted[column] = series.astype("object")
+                    continue
+                if not lost.empty:
+                    raise ValueError(
+                        f"Колонка {column}: значение {lost.iloc[0]!r} не разбирается как дата, "
+                        f"хотя колонка определена как дата по первым строкам"
+                    )
+                series = parsed
+            converted[column] = series
+            continue
+        if str(series.dtype) != dtype:
+            series = series.astype(dtype)
+        converted[column] = series
+    if converted:
+        df = df.assign(**converted)
+    return df, {"dtypes": dtypes, "datetime_formats": formats}
+
+
+class SchemaTracker:
+    """
+    Схема загружаемого файла: определяется по первой порции и расширяется по следующим,
+    вплоть до строковых колонок (см. `apply_schema`). При дозаписи в набор типы колонок
+    набора не становятся строковыми: значения другого вида - ошибка.
+
+    Заодно считает, сколько памяти порции занимали до и после приведения типов.
+    """
+
+    def __init__(self, schema: Optional[Dict[str, Any]] = None):
+        """schema - схема существующего набора при дозаписи: порции должны иметь те же колонки."""
+        self.schema: Optional[Dict[str, Any]] = schema
+        self.fixed_columns = schema is not None
+        self.memory_before = 0
+        self.memory_after = 0
+
+    def apply(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Raises:
+            ValueError: Если значения не приводятся к схеме или колонки не совпадают со схемой набора.
+        """
+        self.memory_before += int(chunk.memory_usage(deep=True, index=False).sum())
+        if self.fixed_columns:
+            expected, actual = set(self.schema["dtypes"]), {str(column) for column in chunk.columns}
+            if expected != actual:
+                raise ValueError(
+                    f"Колонки не совпадают со схемой набора: нет {sorted(expected - actual)}, "
+                    f"лишние {sorted(actual - expected)}"
+                )
+        if self.schema is None:
+            self.schema = infer_schema(chunk)
+        chunk, self.schema = apply_schema(chunk, self.schema, widen=True, allow_text=not self.fixed_columns)
+        self.memory_after += int(chunk.memory_usage(deep=True, index=False).sum())
+        return chunk
+
+    def memory_report(self) -> Dict[str, Any]:
+        saved = self.memory_before - self.memory_after
+        return {
+            "before": self.memory_before,
+            "after": self.memory_after,
+            "saved_pct": round(100 * saved / self.memory_before, 1) if self.memory_before else 0.0,
+        }
@@ -0,0 +1,87 @@
+"""Общий интерфейс хранилищ наборов данных."""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, AsyncIterable, List, Optional, Sequence, Tuple, Any
+from app.lazy import lazy_import
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+
+# фильтры в форме DNF pyarrow: [(колонка, оператор, значение), ...], условия объединяются через AND
+Filters = Sequence[Tuple[str, str, Any]]
+
+
+@dataclass
+class StoredDataset:
+    """Итог записи набора данных в хранилище."""
+    rows: int
+    file_size: Optional[int] = None
+    content_type: Optional[str] = None
+
+
+class DatasetStore(ABC):
+    """
+    Хранилище наборов данных, загруженных пользователями.
+
+    Метаданные набора (DataItem) хранятся в БД приложения, в `DataItem.storage` записано имя
+    хранилища, в котором лежат сами данные.
+    """
+
+    name: str
+
+    @abstractmethod
+    async def write(self, data_id: str, chunks: AsyncIterable[pd.DataFrame]) -> StoredDataset:
+        """
+        Сохраняет новый набор данных из потока порций.
+
+        Raises:
+            ValueError: Если данных нет или их нельзя сохранить.
+        """
+
+    @abstractmethod
+    async def append(self, data_id: str, chunks: AsyncIterable[pd.DataFrame]) -> StoredDataset:
+        """
+        Дописывает порции в существующий набор; rows в результате - число дописанных строк,
+        file_size - новый размер набора.
+
+        Raises:
+            ValueError: Если набора нет или порции не совпадают с ним по типам.
+        """
+
+    @abstractmethod
+    async def read(self, data_id: str, columns: Optional[List[str]] = None,
+                   filters: Optional[Filters] = None, fresh: bool = False) -> pd.DataFrame:
+        """
+        Читает набор данных, только нужные колонки и строки, подходящие под все фильтры.
+
+        fresh - читать основную копию, а не реплику, которая может отставать (например,
+        ключи набора перед дозаписью).
+        """
+
+    @abstractmethod
+    async def aggregate(self, data_id: str, x_field: str, y_field: str, aggregate: str,
+                        color_field: Optional[str] = None, time_unit: Optional[str] = None) -> pd.DataFrame:
+        """
+        Группирует набор по x (и color) и агрегирует y, см. `app.database.aggregation.aggregate_dataset`.
+
+        Raises:
+            ValueError: Если нет нужных колонок или агрегацию нельзя выполнить.
+        """
+
+    @abstractmethod
+    async def copy(self, data_id: str, target_id: str) -> None:
+        """
+        Копирует набор data_id в новый набор target_id.
+
+        Raises:
+            ValueError: Если набора data_id нет.
+        """
+
+    @abstractmethod
+    async def drop(self, data_id: str) -> None:
+        """Удаляет данные набора."""
@@ -0,0 +1,245 @@
+"""Колоночное хранилище наборов данных: parquet-файлы в локальном каталоге."""
+
+from __future__ import annotations
+
+import os
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterable, Dict, List, Optional
+from app.services.executor import executor
+from .base import DatasetStore, Filters, StoredDataset
+from app.lazy import lazy_import
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    from pyarrow import fs
+else:
+    pd = lazy_import("pandas")
+    pa = lazy_import("pyarrow")
+    ds = lazy_import("pyarrow.dataset")
+    pq = lazy_import("pyarrow.parquet")
+    fs = lazy_import("pyarrow.fs")
+
+
+PARQUET_CONTENT_TYPE = "application/vnd.apache.parquet"
+COMMON_METADATA = "_common_metadata"
+
+AGGREGATES = {"sum": "sum", "mean": "mean", "count": "count"}
+
+# начало интервала времени, как date_trunc в PostgreSQL (неделя начинается с понедельника)
+PERIODS = {"week": "W-SUN", "month": "M", "quarter": "Q", "year": "Y"}
+
+
+def time_bucket(series: pd.Series, time_unit: str) -> pd.Series:
+    """Округляет значения времени вниз до начала интервала."""
+    series = pd.to_datetime(series)
+    if time_unit == "hour":
+        return series.dt.floor("h")
+    if time_unit == "day":
+        return series.dt.floor("D")
+    if time_unit in PERIODS:
+        return series.dt.to_period(PERIODS[time_unit]).dt.start_time
+    raise ValueError(f"Неизвестный интервал времени: {time_unit}")
+
+
+def wide_numbers(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Числовые колонки в int64 и float64 - типы, в которых суммирует БД (bigint, double precision).
+
+    Узких типов `infer_schema` (int8, float32) хватает для значений, но не для их сумм:
+    сумма миллиона значений во float32 теряет дробную часть.
+    """
+    dtypes = {column: "int64" if pd.api.types.is_integer_dtype(dtype) else "float64"
+              for column, dtype in df.dtypes.items()
+              if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)}
+    return df.astype(dtypes) if dtypes else df
+
+
+def aggregate_frame(df: pd.DataFrame, x_field: str, y_field: str, aggregate: str,
+                    color_field: Optional[str] = None, time_unit: Optional[str] = None) -> pd.DataFrame:
+    """GROUP BY x (и color) с агрегацией y в pandas - то же, что делает БД в `aggregate_dataset`."""
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"Неизвестная агрегация: {aggregate}")
+    keys = pd.DataFrame({x_field: time_bucket(df[x_field], time_unit) if time_unit else df[x_field]})
+    if color_field:
+        keys[color_field] = df[color_field]
+    values = wide_numbers(df[[y_field]])[y_field]
+    grouped = values.groupby([keys[column] for column in keys.columns], dropna=False, sort=True, observed=True)
+    return grouped.agg(AGGREGATES[aggregate]).reset_index()
+
+
+class ParquetStore(DatasetStore):
+    """
+    Набор данных - каталог `{root}/{data_id}` с parquet-файлами, по одному на порцию загрузки.
+
+    Чтение идёт через pyarrow.dataset с отбором колонок и фильтрами, которые проталкиваются
+    до статистик row group, файлы открываются через mmap.
+    """
+
+    name = "parquet"
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._fs = fs.LocalFileSystem(use_mmap=True)
+
+    def path(self, data_id: str) -> Path:
+        """
+        Каталог набора.
+
+        Raises:
+            ValueError: Если data_id указывает за пределы корня хранилища.
+        """
+        path = (self.root / data_id).resolve()
+        if path.parent != self.root.resolve():
+            raise ValueError(f"Недопустимый идентификатор набора данных: {data_id}")
+        return path
+
+    async def write(self, data_id: str, chunks: AsyncIterable[pd.DataFrame]) -> StoredDataset:
+        # части пишутся во временный каталог и публикуются переименованием, когда записаны все
+        target = self.path(data_id)
+        tmp = target.with_name(f".{target.name}.tmp")
+        tmp.mkdir(parents=True, exist_ok=False)
+        rows, schemas = 0, []
+        try:
+            async for chunk in chunks:
+                table = await executor.run_thread(_to_arrow, chunk)
+                await executor.run_thread(pq.write_table, table, str(tmp / f"part-{len(schemas):05d}.parquet"))
+                schemas.append(table.schema)
+                rows += table.num_rows
+            if not schemas:
+                raise ValueError("Файл не содержит данных")
+            # типы частей могут расширяться от порции к порции (int8 -> int32), общая схема
+            # набора сохраняется в _common_metadata и используется при чтении
+            await executor.run_thread(pq.write_metadata, _unify(schemas, allow_text=True), str(tmp / COMMON_METADATA))
+            tmp.rename(target)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        file_size = sum(file.stat().st_size for file in target.glob("*.parquet"))
+        return StoredDataset(rows=rows, file_size=file_size, content_type=PARQUET_CONTENT_TYPE)
+
+    async def append(self, data_id: str, chunks: AsyncIterable[pd.DataFrame]) -> StoredDataset:
+        # новые части пишутся скрытыми файлами (pyarrow.dataset пропускает имена с "."),
+        # сначала обновляется общая схема, затем части публикуются переименованием
+        target = self.path(data_id)
+        if not target.is_dir():
+            raise ValueError(f"Набор данных {data_id} не найден")
+        next_part = 1 + max((int(part.stem.split("-")[1]) for part in target.glob("part-*.parquet")), default=-1)
+        schemas = [pq.read_schema(str(target / COMMON_METADATA))] if (target / COMMON_METADATA).exists() else []
+        written: List[Path] = []
+        rows = 0
+        try:
+            async for chunk in chunks:
+                table = await executor.run_thread(_to_arrow, chunk)
+                part = target / f".part-{next_part + len(written):05d}.parquet"
+                written.append(part)
+                await executor.run_thread(pq.write_table, table, str(part))
+                schemas.append(table.schema)
+                rows += table.num_rows
+            if written:
+                schema_tmp = target / f".{COMMON_METADATA}.tmp"
+                await executor.run_thread(pq.write_metadata, _unify(schemas), str(schema_tmp))
+                schema_tmp.replace(target / COMMON_METADATA)
+                for part in written:
+                    part.rename(part.with_name(part.name[1:]))
+        except BaseException:
+            for part in written:
+                part.unlink(missing_ok=True)
+            raise
+        file_size = sum(file.stat().st_size for file in target.glob("*.parquet"))
+        return StoredDataset(rows=rows, file_size=file_size, content_type=PARQUET_CONTENT_TYPE)
+
+    def _dataset(self, data_id: str) -> ds.Dataset:
+        path = self.path(data_id)
+        if not path.is_dir():
+            raise FileNotFoundError(f"Набор данных {data_id} не найден в {self.root}")
+        schema_path = path / COMMON_METADATA
+        schema = pq.read_schema(str(schema_path)) if schema_path.exists() else None
+        return ds.dataset(str(path), schema=schema, format="parquet", filesystem=self._fs)
+
+    def read_sync(self, data_id: str, columns: Optional[List[str]] = None,
+                  filters: Optional[Filters] = None) -> pd.DataFrame:
+        dataset = self._dataset(data_id)
+        missing = [column for column in columns or () if column not in dataset.schema.names]
+        if missing:
+            raise ValueError(f"Отсутствуют обязательные поля в данных: {missing}")
+        expression = pq.filters_to_expression(list(filters)) if filters else None
+        return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+    async def read(self, data_id: str, columns: Optional[List[str]] = None,
+                   filters: Optional[Filters] = None, fresh: bool = False) -> pd.DataFrame:
+        return await executor.run_thread(self.read_sync, data_id, columns, filters)
+
+    def aggregate_sync(self, data_id: str, x_field: str, y_field: str, aggregate: str,
+                       color_field: Optional[str] = None, time_unit: Optional[str] = None) -> pd.DataFrame:
+        columns = list(dict.fromkeys([x_field, y_field] + ([color_field] if color_field else [])))
+        df = self.read_sync(data_id, columns)
+        return aggregate_frame(df, x_field, y_field, aggregate, color_field, time_unit)
+
+    async def aggregate(self, data_id: str, x_field: str, y_field: str, aggregate: str,
+                        color_field: Optional[str] = None, time_unit: Optional[str] = None) -> pd.DataFrame:
+        return await executor.run_thread(self.aggregate_sync, data_id, x_field, y_field, aggregate, color_field, time_unit)
+
+    async def copy(self, data_id: str, target_id: str) -> None:
+        # части не меняются после записи: дозапись добавляет новые файлы, а _common_metadata
+        # заменяется переименованием, поэтому копия - жёсткие ссылки на те же файлы
+        source, target = self.path(data_id), self.path(target_id)
+        if not source.is_dir():
+            raise ValueError(f"Набор данных {data_id} не найден")
+        tmp = target.with_name(f".{target.name}.tmp")
+
+        def link() -> None:
+            try:
+                shutil.copytree(source, tmp, ignore=shutil.ignore_patterns(".*"), copy_function=_link_or_copy)
+                tmp.rename(target)
+            except BaseException:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+
+        await executor.run_thread(link)
+
+    async def drop(self, data_id: str) -> None:
+        await executor.run_thread(lambda: shutil.rmtree(self.path(data_id), ignore_errors=True))
+
+
+def _link_or_copy(source: str, target: str) -> None:
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def _to_arrow(chunk: pd.DataFrame) -> pa.Table:
+    try:
+        return pa.Table.from_pandas(chunk, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        raise ValueError(f"Не удалось преобразовать данные в Arrow: {e}") from e
+
+
+def _unify(schemas: List[pa.Schema], allow_text: bool = False) -> pa.Schema:
+    """
+    Общая схема частей набора: числовые типы расширяются, null-колонки получают тип из других частей.
+
+    С allow_text колонка, которая в одних частях числовая или дата, а в других строковая
+    (см. `apply_schema`), в общей схеме строковая: при чтении значения прежних частей
+    приводятся к строкам.
+    """
+    try:
+        return pa.unify_schemas(schemas, promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        if not allow_text:
+            raise ValueError(f"Порции данных не совпадают по типам: {e}") from e
+    fields: Dict[str, List[pa.Field]] = {}
+    for schema in schemas:
+        for schema_field in schema:
+            fields.setdefault(schema_field.name, []).append(schema_field)
+    unified = []
+    for name, variants in fields.items():
+        try:
+            unified.append(pa.unify_schemas([pa.schema([variant]) for variant in variants],
+                                            promote_options="permissive").field(0))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            unified.append(pa.field(name, pa.string()))
+    return pa.schema(unified)
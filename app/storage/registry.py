@@ -0,0 +1,106 @@
+"""Выбор хранилища наборов данных по настройкам и по метаданным набора."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from sqlalchemy import select
+from app.config.settings import config
+from app.database.connection import async_session
+from app.models.models import DataItem
+from app.services.executor import executor
+from app.services.rollups import aggregate_rollup, choose_rollup
+from app.services.schema_inference import apply_schema
+from .base import DatasetStore, Filters
+from .parquet_store import ParquetStore
+from .table_store import TableStore
+from app.lazy import lazy_import
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+
+@lru_cache
+def _store(name: str, parquet_dir: str) -> DatasetStore:
+    if name == ParquetStore.name:
+        return ParquetStore(parquet_dir)
+    if name == TableStore.name:
+        return TableStore()
+    raise ValueError(f"Неизвестное хранилище наборов данных: {name}")
+
+
+def get_store(name: Optional[str] = None) -> DatasetStore:
+    """Хранилище по имени, по умолчанию - то, куда пишутся новые загрузки (`config.storage.backend`)."""
+    return _store(name or config.storage.backend, config.storage.parquet_dir)
+
+
+async def get_data_item(data_id: str) -> DataItem | None:
+    async with async_session() as session:
+        result = await session.execute(select(DataItem).where(DataItem.id == data_id))
+        return result.scalars().first()
+
+
+@dataclass
+class Dataset:
+    """Загруженный набор данных: где он лежит, какие типы колонок и rollup определены при загрузке, версия дозаписи."""
+    data_id: str
+    store: DatasetStore
+    schema: Optional[Dict[str, Any]] = None
+    rollups: Optional[Dict[str, Any]] = None
+    version: int = 1
+
+    def dtype(self, column: str) -> Optional[str]:
+        """dtype колонки по схеме загрузки или None, если схемы нет."""
+        return (self.schema or {}).get("dtypes", {}).get(column)
+
+    async def read(self, columns: Optional[List[str]] = None, filters: Optional[Filters] = None,
+                   fresh: bool = False) -> pd.DataFrame:
+        """Читает набор и приводит колонки к типам схемы загрузки (category, узкие числа, даты)."""
+        df = await self.store.read(self.data_id, columns, filters, fresh)
+        if self.schema:
+            df, _ = apply_schema(df, self.schema)
+        return df
+
+    async def aggregate(self, x_field: str, y_field: str, aggregate: str,
+                        color_field: Optional[str] = None, time_unit: Optional[str] = None) -> pd.DataFrame:
+        """
+        `DatasetStore.aggregate` для набора: по самому крупному подходящему rollup
+        (`app.services.rollups.choose_rollup`), а если такого нет - по исходным строкам.
+        """
+        granularity = choose_rollup(self.rollups, x_field, y_field, aggregate, color_field, time_unit)
+        if granularity is None:
+            return await self.store.aggregate(self.data_id, x_field, y_field, aggregate, color_field, time_unit)
+        rollup = await self.store.read(self.rollups["tables"][granularity])
+        return await executor.run_thread(aggregate_rollup, rollup, x_field, y_field, aggregate, color_field, time_unit)
+
+
+async def open_dataset(data_id: str) -> Dataset | None:
+    """Набор data_id с его хранилищем и схемой или None, если такого набора нет."""
+    data_item = await get_data_item(data_id)
+    return dataset_of(data_item) if data_item is not None else None
+
+
+def dataset_of(data_item: DataItem) -> Dataset:
+    """Набор, описанный записью DataItem."""
+    return Dataset(data_item.id, get_store(data_item.storage), data_item.inferred_schema, data_item.rollups,
+                   data_item.version or 1)
+
+
+async def store_for(data_id: str) -> DatasetStore | None:
+    """Хранилище, в котором лежит набор data_id, или None, если такого набора нет."""
+    dataset = await open_dataset(data_id)
+    return dataset.store if dataset else None
+
+
+async def load_dataset(data_id: str, columns: Optional[List[str]] = None,
+                       filters: Optional[Filters] = None) -> pd.DataFrame | None:
+    """
+    Читает набор data_id из его хранилища и приводит колонки к типам, определённым при загрузке.
+
+    Returns:
+        pd.DataFrame | None: Данные или None, если такого набора нет.
+    """
+    dataset = await open_dataset(data_id)
+    return await dataset.read(columns, filters) if dataset else None
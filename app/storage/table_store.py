@@ -0,0 +1,120 @@
+"""Хранилище наборов данных в виде отдельной таблицы БД на каждую загрузку."""
+
+from __future__ import annotations
+
+import operator
+from typing import TYPE_CHECKING, AsyncIterable, List, Optional
+from sqlalchemy import Column, MetaData, Table, insert, select, text
+from sqlalchemy.exc import DBAPIError, NoSuchTableError
+from sqlalchemy.ext.asyncio import AsyncConnection
+from app.database.aggregation import aggregate_dataset, reflect_dataset
+from app.database.bulk import copy_records, create_table, dataframe_records, widen_table
+from app.database.connection import analytics_engine, analytics_read_engine
+from app.services.executor import executor
+from .base import DatasetStore, Filters, StoredDataset
+from app.lazy import lazy_import
+if TYPE_CHECKING:
+    import pandas as pd
+else:
+    pd = lazy_import("pandas")
+
+
+OPERATORS = {
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda column, value: column.in_(value),
+    "not in": lambda column, value: column.not_in(value),
+}
+
+
+class TableStore(DatasetStore):
+    """
+    Набор данных - таблица `{name}_{uuid}` в основной БД, запись через COPY (см. `app.database.bulk`).
+
+    Работает через отдельные от запросов приложения пулы: запись - `analytics_engine`,
+    чтение и агрегация - `analytics_read_engine` (реплика, если задана).
+    """
+
+    name = "postgres"
+
+    async def write(self, data_id: str, chunks: AsyncIterable[pd.DataFrame]) -> StoredDataset:
+        rows = 0
+        table: Table | None = None
+        async with analytics_engine.begin() as conn:
+            async for chunk in chunks:
+                try:
+                    if table is None:
+                        table = await create_table(conn, data_id, chunk)
+                    else:
+                        await widen_table(conn, table, chunk)
+                    records = await executor.run_thread(dataframe_records, chunk, table)
+                    rows += await copy_records(conn, table, records)
+                except DBAPIError as e:
+                    raise ValueError(str(e.orig)) from e
+            if table is None:
+                raise ValueError("Файл не содержит данных")
+            file_size = await _table_size(conn, data_id)
+        return StoredDataset(rows=rows, file_size=file_size)
+
+    async def append(self, data_id: str, chunks: AsyncIterable[pd.DataFrame]) -> StoredDataset:
+        rows = 0
+        async with analytics_engine.begin() as conn:
+            try:
+                table = await reflect_dataset(conn, data_id)
+            except NoSuchTableError as e:
+                raise ValueError(f"Набор данных {data_id} не найден") from e
+            async for chunk in chunks:
+                try:
+                    await widen_table(conn, table, chunk)
+                    records = await executor.run_thread(dataframe_records, chunk, table)
+                    rows += await copy_records(conn, table, records)
+                except DBAPIError as e:
+                    raise ValueError(str(e.orig)) from e
+            file_size = await _table_size(conn, data_id)
+        return StoredDataset(rows=rows, file_size=file_size)
+
+    async def read(self, data_id: str, columns: Optional[List[str]] = None,
+                   filters: Optional[Filters] = None, fresh: bool = False) -> pd.DataFrame:
+        async with (analytics_engine if fresh else analytics_read_engine).connect() as conn:
+            table = await reflect_dataset(conn, data_id)
+            selected = [table.c[column] for column in columns] if columns else [table]
+            query = select(*selected)
+            for column, op, value in filters or ():
+                query = query.where(OPERATORS[op](table.c[column], value))
+            result = await conn.execute(query)
+            return pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+
+    async def aggregate(self, data_id: str, x_field: str, y_field: str, aggregate: str,
+                        color_field: Optional[str] = None, time_unit: Optional[str] = None) -> pd.DataFrame:
+        async with analytics_read_engine.connect() as conn:
+            try:
+                return await aggregate_dataset(conn, data_id, x_field, y_field, aggregate, color_field, time_unit)
+            except DBAPIError as e:
+                raise ValueError(f"Не удалось агрегировать данные: {e.orig}") from e
+
+    async def copy(self, data_id: str, target_id: str) -> None:
+        async with analytics_engine.begin() as conn:
+            try:
+                source = await reflect_dataset(conn, data_id)
+            except NoSuchTableError as e:
+                raise ValueError(f"Набор данных {data_id} не найден") from e
+            target = Table(target_id, MetaData(), *(Column(column.name, column.type) for column in source.columns))
+            await conn.run_sync(lambda sync_conn: target.create(sync_conn, checkfirst=False))
+            await conn.execute(insert(target).from_select([column.name for column in source.columns], select(source)))
+
+    async def drop(self, data_id: str) -> None:
+        table = Table(data_id, MetaData())
+        async with analytics_engine.begin() as conn:
+            await conn.run_sync(lambda sync_conn: table.drop(sync_conn, checkfirst=True))
+
+
+async def _table_size(conn: AsyncConnection, data_id: str) -> Optional[int]:
+    if conn.dialect.name != "postgresql":
+        return None
+    result = await conn.execute(text("SELECT pg_total_relation_size(:name)"), {"name": data_id})
+    return result.scalar()
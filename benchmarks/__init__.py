@@ -0,0 +1,11 @@
+"""
+Бенчмарки горячих путей: загрузка CSV, построение графика, авторизация, одновременные входы.
+
+Запуск (по умолчанию SQLite во временном каталоге, для PostgreSQL задайте DATABASE_URL):
+
+    python -m benchmarks.run --sizes 10k,1m --out benchmarks/baseline.json
+    python -m benchmarks.run --sizes 10k,1m --out current.json
+    python -m benchmarks.compare benchmarks/baseline.json current.json --threshold 0.15
+
+Каждый сценарий выполняется в отдельном процессе, чтобы пиковый RSS относился к нему одному.
+"""
@@ -0,0 +1,386 @@
+"""
+Сценарии бенчмарков.
+
+Каждый сценарий - функция верхнего уровня, которая выполняется в отдельном процессе
+(см. `benchmarks.run`) и возвращает время этапов в секундах (`Stages`). Приложение импортируется
+внутри сценария, когда переменные окружения (DATABASE_URL, JWT__*) уже выставлены.
+"""
+
+import asyncio
+import itertools
+import statistics
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, Iterator, List
+from uuid import uuid4
+from .datasets import sales_frame, write_sales_csv
+
+
+class Stages(dict):
+    """
+    Время этапов в секундах; этапы, упавшие с ошибкой, попадают в `errors`, а не в результат.
+    В `throughput` сценарий может положить пропускную способность этапов, МБ/с.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.errors: Dict[str, str] = {}
+        self.throughput: Dict[str, float] = {}
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        started = perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.errors[name] = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+        else:
+            self[name] = perf_counter() - started
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def _create_schema() -> None:
+    from app.database.schema import init_schema
+
+    await init_schema()
+
+
+async def _dispose() -> None:
+    # соединения пула привязаны к циклу asyncio.run, без закрытия процесс сценария не завершится
+    from app.database.connection import dispose_engines
+
+    await dispose_engines()
+
+
+def upload(rows: int, workdir: str) -> Stages:
+    """
+    Загрузка CSV: разбор порциями, приведение типов, запись в хранилище.
+
+    Этапы: parse - только чтение CSV порциями; upload - весь путь /upload/csv без HTTP
+    (разбор, приведение типов, запись); load_df_to_db - запись уже готового DataFrame.
+    """
+    from app.config.settings import config
+    from app.services.csv import compact_chunks, iter_csv_chunks, load_df_to_db, store_chunks
+    from app.services.schema_inference import SchemaTracker
+
+    path = write_sales_csv(Path(workdir) / f"sales_{rows}.csv", rows)
+    stages = Stages()
+
+    async def scenario() -> None:
+        await _create_schema()
+        with open(path, "rb") as source, stages.measure("parse"):
+            async for _ in iter_csv_chunks(source, config.upload.chunk_rows, path.name):
+                pass
+        with open(path, "rb") as source, stages.measure("upload"):
+            chunks = compact_chunks(iter_csv_chunks(source, config.upload.chunk_rows, path.name), SchemaTracker())
+            await store_chunks("bench", uuid4(), chunks)
+        df = sales_frame(rows)
+        with stages.measure("load_df_to_db"):
+            await load_df_to_db("bench", uuid4(), df)
+        await _dispose()
+
+    asyncio.run(scenario())
+    path.unlink()
+    return stages
+
+
+def compressed(rows: int, workdir: str) -> Stages:
+    """
+    Разбор сжатого CSV с потоковой распаковкой (`app.services.compression`).
+
+    Этапы: plain, gzip, zip, zstd - чтение порциями через `iter_csv_chunks` одного и того же
+    CSV, несжатого и сжатого; в throughput - МБ несжатого CSV в секунду. Без пакета zstandard
+    этап zstd попадает в errors.
+    """
+    import gzip
+    import shutil
+    import zipfile
+    from app.config.settings import config
+    from app.services.csv import iter_csv_chunks
+
+    path = write_sales_csv(Path(workdir) / f"sales_{rows}.csv", rows)
+    size_mb = path.stat().st_size / (1024 * 1024)
+    files = {"plain": path, "gzip": path.with_suffix(".csv.gz"), "zip": path.with_suffix(".zip"),
+             "zstd": path.with_suffix(".csv.zst")}
+    with open(path, "rb") as source, gzip.open(files["gzip"], "wb", compresslevel=6) as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+    with zipfile.ZipFile(files["zip"], "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.write(path, path.name)
+    stages = Stages()
+    try:
+        import zstandard
+
+        with open(path, "rb") as source, open(files["zstd"], "wb") as target:
+            zstandard.ZstdCompressor(level=3).copy_stream(source, target)
+    except ImportError:
+        files.pop("zstd")
+        stages.errors["zstd"] = "ModuleNotFoundError: zstandard не установлен"
+
+    async def scenario() -> None:
+        for name, file in files.items():
+            with open(file, "rb") as source, stages.measure(name):
+                async for _ in iter_csv_chunks(source, config.upload.chunk_rows, file.name):
+                    pass
+            if name in stages:
+                stages.throughput[name] = round(size_mb / stages[name], 1)
+
+    asyncio.run(scenario())
+    for file in files.values():
+        file.unlink()
+    return stages
+
+
+def chart(rows: int, workdir: str) -> Stages:
+    """
+    Построение графика по данным запроса /chart/generate_chart.
+
+    Этапы: prepare (DataFrame и разбор дат), build (спецификация по шаблону), to_dict
+    (спецификация с данными), serialize_json (байты ответа), arrow (ответ в Arrow IPC),
+    downsampled (весь путь с max_points=2000). Этап, упавший с ошибкой, попадает в errors отчёта.
+    """
+    from app.services.chart_formats import ARROW_STREAM, JSON, encode_json
+    from app.services.chart_service import (build_chart_from_df, prepare_chart_response, prepare_dataframe,
+                                            render_chart_from_df, warm_up_chart)
+
+    records = sales_frame(rows).to_dict(orient="records")
+    stages = Stages()
+    args = ("line", "date", "revenue", "restaurant")
+    # шаблоны спецификаций и схема Vega-Lite загружаются один раз на процесс - не в этапах графика
+    warm_up_chart()
+
+    with stages.measure("prepare"):
+        df = prepare_dataframe(records, "date")
+    with stages.measure("build"):
+        chart_dict, df, _ = build_chart_from_df(df, *args)
+    with stages.measure("to_dict"):
+        spec = prepare_chart_response(chart_dict, df)
+    if "to_dict" in stages:
+        with stages.measure("serialize_json"):
+            encode_json(spec)
+    with stages.measure("arrow"):
+        render_chart_from_df(ARROW_STREAM, df, *args)
+    with stages.measure("downsampled"):
+        render_chart_from_df(JSON, df, *args, max_points=2000)
+    return stages
+
+
+def spec(charts: int, workdir: str) -> Stages:
+    """
+    Постоянные затраты на спецификацию одного графика, без данных.
+
+    Этапы: compile - построение и проверка по схеме шаблонов всех типов графиков (один раз
+    на процесс); altair - среднее время на график через объекты Altair и to_dict() с проверкой
+    по схеме Vega-Lite; template - среднее время на график по шаблону (`build_spec`).
+    Графики перебирают типы, поля и наличие color.
+    """
+    import pandas as pd
+    from app.services.chart_service import ChartGenerator, build_encoding, build_spec, chart_template
+
+    requests = [(chart_type, f"x_{i}", f"y_{i}", f"c_{i}" if i % 2 else None)
+                for i, chart_type in zip(range(charts), itertools.cycle(ChartGenerator.chart_types()))]
+    stages = Stages()
+    # первый to_dict загружает схему Vega-Lite, это не затраты на график
+    ChartGenerator.generate("line", pd.DataFrame(columns=["x", "y"]), build_encoding("x", "y"), "x", "y").to_dict()
+    with stages.measure("compile"):
+        for chart_type in ChartGenerator.chart_types():
+            for with_color in (False, True):
+                chart_template(chart_type, with_color)
+
+    started = perf_counter()
+    for chart_type, x_field, y_field, color_field in requests:
+        df = pd.DataFrame(columns=[x_field, y_field] + ([color_field] if color_field else []))
+        chart = ChartGenerator.generate(chart_type, df, build_encoding(x_field, y_field, color_field), x_field, y_field)
+        chart.to_dict()
+    stages["altair"] = (perf_counter() - started) / charts
+
+    started = perf_counter()
+    for chart_type, x_field, y_field, color_field in requests:
+        build_spec(chart_type, x_field, y_field, color_field)
+    stages["template"] = (perf_counter() - started) / charts
+    return stages
+
+
+def auth(requests: int, workdir: str) -> Stages:
+    """
+    Авторизация через ASGI без сети: регистрация, вход (проверка пароля) и защищённый
+    маршрут с JWT. Для входа и маршрута - p50/p99 на запрос. Лимиты запросов отключены.
+    """
+    from httpx import ASGITransport, AsyncClient
+    from app.main import app
+    from app.services.auth.utils import limiter
+
+    limiter.enabled = False
+    stages = Stages()
+
+    async def scenario() -> None:
+        await _create_schema()
+        username, password = f"bench_{uuid4().hex[:8]}", "benchmark-password"
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            started = perf_counter()
+            response = await client.post("/auth/signup", json={"username": username, "password": password})
+            stages["signup"] = perf_counter() - started
+            response.raise_for_status()
+
+            logins = []
+            for _ in range(max(1, requests // 10)):
+                started = perf_counter()
+                response = await client.post("/auth/login", data={"username": username, "password": password})
+                logins.append(perf_counter() - started)
+                response.raise_for_status()
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+            protected = []
+            for _ in range(requests):
+                started = perf_counter()
+                response = await client.get("/auth/user", headers=headers)
+                protected.append(perf_counter() - started)
+                response.raise_for_status()
+
+        stages["login_p50"] = statistics.median(logins)
+        stages["login_p99"] = _percentile(logins, 0.99)
+        stages["user_p50"] = statistics.median(protected)
+        stages["user_p99"] = _percentile(protected, 0.99)
+        await _dispose()
+
+    asyncio.run(scenario())
+    return stages
+
+
+def login(requests: int, workdir: str) -> Stages:
+    """
+    Одновременные входы: `requests` запросов /auth/login сразу (asyncio.gather). Параллельно
+    таймер каждые 10 мс замеряет задержку цикла событий: если пароли хэшируются в нём,
+    остальные запросы стоят всё это время.
+
+    Этапы: login_p50/login_p99 - задержка входа под нагрузкой, burst - время всей пачки,
+    loop_lag_p99/loop_lag_max - задержка цикла событий во время пачки, rejected_ratio - доля ответов 503.
+    """
+    from httpx import ASGITransport, AsyncClient
+    from app.main import app
+    from app.services.auth.utils import limiter
+
+    limiter.enabled = False
+    stages = Stages()
+
+    async def timed(client, method: str, url: str, **kwargs) -> tuple[float, int]:
+        started = perf_counter()
+        response = await client.request(method, url, **kwargs)
+        return perf_counter() - started, response.status_code
+
+    async def scenario() -> None:
+        await _create_schema()
+        username, password = f"bench_{uuid4().hex[:8]}", "benchmark-password"
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            (await client.post("/auth/signup", json={"username": username, "password": password})).raise_for_status()
+            form = {"username": username, "password": password}
+
+            async def loop_lag(stop: asyncio.Event) -> List[float]:
+                samples = []
+                while not stop.is_set():
+                    started = perf_counter()
+                    await asyncio.sleep(0.01)
+                    samples.append(perf_counter() - started - 0.01)
+                return samples
+
+            stop = asyncio.Event()
+            probe = asyncio.ensure_future(loop_lag(stop))
+            started = perf_counter()
+            logins = await asyncio.gather(*(timed(client, "POST", "/auth/login", data=form) for _ in range(requests)))
+            stages["burst"] = perf_counter() - started
+            stop.set()
+            lags = await probe
+
+        accepted = [seconds for seconds, code in logins if code == 200]
+        stages["rejected_ratio"] = sum(code == 503 for _, code in logins) / len(logins)
+        if accepted:
+            stages["login_p50"] = statistics.median(accepted)
+            stages["login_p99"] = _percentile(accepted, 0.99)
+        if lags:
+            stages["loop_lag_p99"] = _percentile(lags, 0.99)
+            stages["loop_lag_max"] = max(lags)
+        await _dispose()
+
+    asyncio.run(scenario())
+    return stages
+
+
+def rate_limit(requests: int, workdir: str) -> Stages:
+    """
+    Стоимость проверки лимита запросов на ключ: `requests` разных ключей, по 10 обращений.
+
+    Этапы memory_* - счётчики в памяти процесса (memory://), shm_* - общий для воркеров файл
+    (shm://); *_hit - учёт запроса (incr), *_test - проверка без учёта (get), среднее на вызов.
+    """
+    from limits import parse
+    from limits.storage import MemoryStorage
+    from limits.strategies import FixedWindowRateLimiter
+    from app.services.auth.rate_limit_storage import SharedMemoryStorage
+
+    limit = parse("1000000/minute")
+    calls = [f"user_{i % requests}" for i in range(requests * 10)]
+    stages = Stages()
+    for name, storage in (("memory", MemoryStorage()), ("shm", SharedMemoryStorage(f"shm://{workdir}/rate_limit"))):
+        strategy = FixedWindowRateLimiter(storage)
+        started = perf_counter()
+        for key in calls:
+            strategy.hit(limit, key)
+        stages[f"{name}_hit"] = (perf_counter() - started) / len(calls)
+        started = perf_counter()
+        for key in calls:
+            strategy.test(limit, key)
+        stages[f"{name}_test"] = (perf_counter() - started) / len(calls)
+    return stages
+
+
+def startup(runs: int, workdir: str) -> Stages:
+    """
+    Холодный старт: `python -X importtime -c "import app.main"` в новом интерпретаторе, runs раз.
+
+    Этапы: import_app - импорт app.main по данным -X importtime, process - весь запуск
+    интерпретатора с импортом (минимум по запускам). Если импорт дольше STARTUP_BUDGET секунд
+    или загружает библиотеки из LAZY_MODULES (их импорт отложен до первого использования,
+    см. `app.lazy`), в errors отчёта попадает этап budget.
+    """
+    import subprocess
+    import sys
+
+    stages = Stages()
+    imports, processes, eager = [], [], set()
+    for _ in range(runs):
+        started = perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                                capture_output=True, text=True, check=True)
+        processes.append(perf_counter() - started)
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.removeprefix("import time:").split("|")
+            if len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            module = fields[2].strip()
+            if module == "app.main":
+                imports.append(int(fields[1]) / 1e6)
+            if module.split(".")[0] in LAZY_MODULES:
+                eager.add(module.split(".")[0])
+    stages["import_app"] = min(imports)
+    stages["process"] = min(processes)
+    with stages.measure("budget"):
+        if eager:
+            raise AssertionError(f"при импорте app.main загружены {sorted(eager)}")
+        if stages["import_app"] > STARTUP_BUDGET:
+            raise AssertionError(f"импорт app.main {stages['import_app']:.3f} с, бюджет {STARTUP_BUDGET} с")
+    stages.pop("budget", None)
+    return stages
+
+
+CASES = {"upload": upload, "compressed": compressed, "chart": chart, "spec": spec, "auth": auth, "login": login,
+         "rate_limit": rate_limit, "startup": startup}
+# сценарии, размер которых - число запросов, а не строк набора
+REQUEST_CASES = {"auth", "login", "rate_limit"}
+# бюджет импорта app.main, секунды, и библиотеки, которые при этом не должны загружаться
+STARTUP_BUDGET = 1.2
+LAZY_MODULES = ("pandas", "numpy", "altair", "pyarrow")
@@ -0,0 +1,73 @@
+"""
+Сравнение результатов бенчмарков с базовыми.
+
+    python -m benchmarks.compare benchmarks/baseline.json current.json --threshold 0.15
+
+Код возврата 1, если хотя бы одна метрика хуже базовой больше чем на threshold.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple
+
+
+class Change(NamedTuple):
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline else float("inf")
+
+
+def flatten(report: Dict[str, Any]) -> Dict[str, float]:
+    """{"upload/10k:parse": секунды, ..., "upload/10k:peak_rss_mb": МБ}."""
+    metrics = {}
+    for key, result in report["results"].items():
+        for stage, seconds in result["stages"].items():
+            metrics[f"{key}:{stage}"] = seconds
+        metrics[f"{key}:peak_rss_mb"] = result["peak_rss_mb"]
+    return metrics
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float,
+            min_seconds: float = 0.001) -> List[Change]:
+    """
+    Метрики, которые ухудшились больше чем на threshold (0.15 - на 15%).
+
+    Времена меньше min_seconds в обоих прогонах не сравниваются - это шум таймера.
+    """
+    before, after = flatten(baseline), flatten(current)
+    regressions = []
+    for metric in sorted(before.keys() & after.keys()):
+        change = Change(metric, before[metric], after[metric])
+        if not metric.endswith(":peak_rss_mb") and max(change.baseline, change.current) < min_seconds:
+            continue
+        if change.ratio > 1 + threshold:
+            regressions.append(change)
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Сравнение результатов бенчмарков")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.15, help="допустимое ухудшение, доля")
+    args = parser.parse_args(argv)
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    current = json.loads(Path(args.current).read_text(encoding="utf-8"))
+    before, after = flatten(baseline), flatten(current)
+    for metric in sorted(before.keys() & after.keys()):
+        print(f"{metric:45s} {before[metric]:12.4f} {after[metric]:12.4f} {after[metric] / before[metric] if before[metric] else float('inf'):8.2f}x")
+    regressions = compare(baseline, current, args.threshold)
+    for change in regressions:
+        print(f"РЕГРЕССИЯ {change.metric}: {change.baseline:.4f} -> {change.current:.4f} ({change.ratio:.2f}x)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Синтетические продажи ресторанов для бенчмарков."""
+
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+RESTAURANTS = [f"Ресторан {i}" for i in range(20)]
+DISHES = [f"Блюдо {i}" for i in range(200)]
+# CSV большого размера пишется порциями, чтобы генератор сам не занимал память
+WRITE_CHUNK_ROWS = 500_000
+
+
+def parse_size(size: str) -> int:
+    """'10k' -> 10_000, '1m' -> 1_000_000, '250' -> 250."""
+    size = size.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(size[-1:], 1)
+    return int(float(size.rstrip("km")) * multiplier)
+
+
+def sales_frame(rows: int, seed: int = 0, start_row: int = 0) -> pd.DataFrame:
+    """
+    Продажи по чекам: время, ресторан, блюдо, количество, выручка, число гостей.
+
+    Время идёт по возрастанию с шагом в минуту от 2024-01-01, start_row сдвигает начало,
+    чтобы порции большого файла продолжали друг друга.
+    """
+    rng = np.random.default_rng(seed + start_row)
+    qty = rng.integers(1, 6, size=rows)
+    price = rng.choice(np.arange(150, 1500, 10), size=rows)
+    return pd.DataFrame({
+        "date": (pd.Timestamp("2024-01-01") + pd.to_timedelta(np.arange(start_row, start_row + rows), unit="min"))
+        .strftime("%Y-%m-%d %H:%M"),
+        "restaurant": rng.choice(RESTAURANTS, size=rows),
+        "dish": rng.choice(DISHES, size=rows),
+        "qty": qty,
+        "revenue": np.round(qty * price * rng.uniform(0.9, 1.0, size=rows), 2),
+        "guests": rng.integers(1, 9, size=rows),
+    })
+
+
+def write_sales_csv(path: Path, rows: int, seed: int = 0) -> Path:
+    """Пишет CSV с `rows` строками продаж и возвращает путь."""
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        for start in range(0, rows, WRITE_CHUNK_ROWS):
+            chunk = sales_frame(min(WRITE_CHUNK_ROWS, rows - start), seed, start)
+            chunk.to_csv(file, index=False, header=start == 0)
+    return path
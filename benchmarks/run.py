@@ -0,0 +1,129 @@
+"""
+Запуск бенчмарков и запись результатов в JSON.
+
+    python -m benchmarks.run --sizes 10k,1m,10m --repeat 3 --out benchmarks/baseline.json
+    python -m benchmarks.run --cases startup --out startup.json   # холодный старт и бюджет импорта
+    python -m benchmarks.run --cases spec --spec-charts 1000       # затраты на спецификацию графика
+    python -m benchmarks.run --cases rate_limit                    # проверка лимита: память процесса и shm://
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+from .datasets import parse_size
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss - килобайты на Linux и байты на macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_case(name: str, size: int,
+              workdir: str) -> Tuple[Dict[str, float], Dict[str, str], float, Dict[str, float]]:
+    from .cases import CASES
+
+    stages = CASES[name](size, workdir)
+    return dict(stages), stages.errors, _peak_rss_mb(), stages.throughput
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(cases: List[Tuple[str, int, str]], repeat: int, workdir: str) -> Dict[str, Any]:
+    """
+    Выполняет сценарии, каждый повтор - в новом процессе (spawn).
+
+    Для времени этапов берётся минимум по повторам (наименее зашумлённая оценка),
+    для пикового RSS и пропускной способности - максимум.
+    """
+    results: Dict[str, Any] = {}
+    context = multiprocessing.get_context("spawn")
+    for name, size, label in cases:
+        key = f"{name}/{label}"
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                runs.append(pool.submit(_run_case, name, size, workdir).result())
+        stages = {stage: min(run[0][stage] for run in runs if stage in run[0]) for stage in runs[0][0]}
+        errors = {stage: error for run in runs for stage, error in run[1].items()}
+        results[key] = {"size": size, "stages": stages, "peak_rss_mb": round(max(run[2] for run in runs), 1)}
+        if errors:
+            results[key]["errors"] = errors
+        throughput = {stage: max(run[3][stage] for run in runs if stage in run[3]) for stage in runs[0][3]}
+        if throughput:
+            results[key]["throughput_mb_s"] = throughput
+        print(f"{key}: " + ", ".join(f"{stage}={seconds:.6f}s" for stage, seconds in stages.items())
+              + f", peak_rss={results[key]['peak_rss_mb']} MB"
+              + "".join(f", {stage}={mb_s} MB/s" for stage, mb_s in throughput.items())
+              + "".join(f"\n  {stage}: {error}" for stage, error in errors.items()), flush=True)
+    return results
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарки загрузки, распаковки, графиков, авторизации и старта")
+    parser.add_argument("--sizes", default="10k,1m", help="размеры наборов через запятую: 10k,1m,10m")
+    parser.add_argument("--cases", default="upload,compressed,chart,spec,auth,login,rate_limit,startup", help="сценарии через запятую")
+    parser.add_argument("--auth-requests", type=int, default=200,
+                        help="запросов к защищённому маршруту (auth), одновременных входов (login), ключей лимитов (rate_limit)")
+    parser.add_argument("--startup-runs", type=int, default=5, help="запусков интерпретатора в сценарии startup")
+    parser.add_argument("--spec-charts", type=int, default=1000, help="спецификаций графиков в сценарии spec")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--out", default="benchmarks/results.json")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="foodnet-bench-")
+    # окружение наследуют процессы сценариев; заданные снаружи значения не трогаем
+    os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{workdir}/bench.db")
+    os.environ.setdefault("JWT__SECRET_KEY", "benchmark-secret-key-benchmark-secret")
+    os.environ.setdefault("JWT__ALGORITHM", "HS256")
+    os.environ.setdefault("JWT__ACCESS_TOKEN_TTL", "30")
+    os.environ.setdefault("STORAGE__PARQUET_DIR", f"{workdir}/datasets")
+
+    from .cases import REQUEST_CASES
+
+    cases = []
+    for name in args.cases.split(","):
+        if name == "startup":
+            cases.append((name, args.startup_runs, "cold"))
+        elif name == "spec":
+            cases.append((name, args.spec_charts, str(args.spec_charts)))
+        elif name in REQUEST_CASES:
+            cases.append((name, args.auth_requests, str(args.auth_requests)))
+        else:
+            cases.extend((name, parse_size(size), size.strip()) for size in args.sizes.split(","))
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(tz=timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": os.environ["DATABASE_URL"].split("://", 1)[0],
+            "repeat": args.repeat,
+        },
+        "results": run(cases, args.repeat, workdir),
+    }
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Результаты записаны в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import asyncio
+import pytest
+from app.database.connection import dispose_engines
+from app.database.schema import init_schema
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    # схему создаёт lifespan приложения, а модульные TestClient(app) без with его не запускают
+    async def create():
+        await init_schema()
+        await dispose_engines()
+
+    asyncio.run(create())
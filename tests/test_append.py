@@ -0,0 +1,60 @@
+import pandas as pd
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.dedupe import Deduplicator
+
+client = TestClient(app)
+
+
+def _csv(rows) -> str:
+    return "date,store,revenue\n" + "".join(f"{date},{store},{revenue}\n" for date, store, revenue in rows)
+
+
+def _upload(content: str, **params):
+    return client.post("/upload/csv", params=params, files={"file": ("sales.csv", content, "text/csv")})
+
+
+def test_deduplicator_skips_known_and_repeated_keys():
+    existing = pd.DataFrame({"day": [1, 2], "store": ["a", "a"]})
+    deduplicator = Deduplicator(["day", "store"], existing)
+    first = deduplicator.filter(pd.DataFrame({"day": [2, 3, 3], "store": ["a", "a", "a"], "v": [1, 2, 3]}))
+    second = deduplicator.filter(pd.DataFrame({"day": [3, 4], "store": ["a", "b"], "v": [4, 5]}))
+    assert first["v"].tolist() == [2] and second["v"].tolist() == [5]
+    assert deduplicator.skipped == 3
+
+
+def test_append_with_dedupe_bumps_version_and_updates_rollups():
+    first = [(f"2025-01-{day:02d} 10:00", store, day) for day in range(1, 11) for store in ("a", "b")]
+    upload = _upload(_csv(first), rollup_time="date", rollup_dimensions="store", dedupe_key="date,store")
+    assert upload.status_code == 200 and upload.json()["version"] == 1
+    data_id = upload.json()["data_id"]
+
+    chart_request = {"data_id": data_id, "chart_type": "bar", "x_field": "date", "y_field": "revenue",
+                     "color_field": "store", "aggregate": "sum", "time_unit": "month"}
+    before = client.post("/chart/generate_chart_by_id", json=chart_request)
+    assert before.status_code == 200
+
+    # 5 строк повторяют уже загруженные, 10 новых - в феврале
+    second = first[-5:] + [(f"2025-02-{day:02d} 10:00", store, 100) for day in range(1, 6) for store in ("a", "b")]
+    append = _upload(_csv(second), append_to=data_id)
+    assert append.status_code == 200
+    assert append.json() == {"data_id": data_id, "rows": 10, "skipped_duplicates": 5, "version": 2,
+                             "copied_from": None}
+
+    again = _upload(_csv(second), append_to=data_id)
+    assert again.json()["rows"] == 0 and again.json()["version"] == 2
+
+    after = client.post("/chart/generate_chart_by_id", json=chart_request, headers={"If-None-Match": before.headers["etag"]})
+    assert after.status_code == 200 and after.headers["etag"] != before.headers["etag"]
+    totals = {(row["date"][:7], row["store"]): row["revenue"] for row in after.json()["data"]["values"]}
+    assert totals == {("2025-01", "a"): 55, ("2025-01", "b"): 55, ("2025-02", "a"): 500, ("2025-02", "b"): 500}
+
+
+def test_append_rejects_incompatible_file():
+    data_id = _upload(_csv([("2025-01-01 10:00", "a", 1)])).json()["data_id"]
+    wrong_columns = client.post("/upload/csv", params={"append_to": data_id},
+                                files={"file": ("x.csv", "date,dish\n2025-01-02,soup\n", "text/csv")})
+    assert wrong_columns.status_code == 400
+    wrong_type = _upload(_csv([("2025-01-02 10:00", "a", "many")]), append_to=data_id)
+    assert wrong_type.status_code == 400
+    assert _upload(_csv([]), append_to="missing_0").status_code == 404
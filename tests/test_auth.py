@@ -0,0 +1,115 @@
+import asyncio
+import threading
+from uuid import uuid4
+import pytest
+from fastapi import HTTPException
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select
+from pwdlib.hashers.argon2 import Argon2Hasher
+from app.config.settings import PasswordHashSettings
+from app.database.connection import Base, async_session, engine
+from app.main import app
+from app.models.models import User
+from app.services.auth import security
+from app.services.auth.hashing import PasswordHasher, password_hasher
+from app.services.auth.user_cache import user_cache
+from app.services.auth.utils import get_rate_limit_by_role
+
+
+async def _signup(client: AsyncClient) -> tuple[str, dict]:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    username = f"user_{uuid4().hex[:8]}"
+    response = await client.post("/auth/signup", json={"username": username, "password": "password123"})
+    assert response.status_code == 200
+    return username, {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_user_lookup_is_cached(monkeypatch):
+    calls = []
+    lookup = security.get_user_by_username
+
+    async def counting_lookup(username, db):
+        calls.append(username)
+        return await lookup(username, db)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        username, headers = await _signup(client)
+        monkeypatch.setattr(security, "get_user_by_username", counting_lookup)
+        for _ in range(2):
+            response = await client.get("/auth/user", headers=headers)
+            assert response.status_code == 200
+    assert calls == [username]
+    assert get_rate_limit_by_role(username) == "4/minute"
+    assert get_rate_limit_by_role("_guest") == "2/minute"
+    # соединения aiosqlite привязаны к циклу событий теста
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_role_change_invalidates_cache():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        username, headers = await _signup(client)
+        assert (await client.get("/auth/user", headers=headers)).status_code == 200
+        assert user_cache.role(username) == "user"
+
+        async with async_session() as session:
+            user = (await session.execute(select(User).where(User.username == username))).scalar_one()
+            user.is_admin = True
+            await session.commit()
+        assert user_cache.get(username) is None
+
+        response = await client.get("/auth/admin", headers=headers)
+        assert response.status_code == 200
+        assert user_cache.role(username) == "admin"
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_password_hash():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    username = f"user_{uuid4().hex[:8]}"
+    old_hash = Argon2Hasher(time_cost=1, memory_cost=8 * 1024).hash("password123")
+    async with async_session() as session:
+        session.add(User(username=username, hashed_password=old_hash))
+        await session.commit()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        for _ in range(2):
+            response = await client.post("/auth/login", data={"username": username, "password": "password123"})
+            assert response.status_code == 200
+        assert (await client.post("/auth/login", data={"username": username, "password": "wrong"})).status_code == 401
+
+    async with async_session() as session:
+        new_hash = (await session.execute(select(User.hashed_password).where(User.username == username))).scalar_one()
+    assert new_hash != old_hash
+    assert not password_hasher.context.current_hasher.check_needs_rehash(new_hash)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_rejects_when_saturated():
+    hasher = PasswordHasher(PasswordHashSettings(workers=1, max_waiting=1, queue_timeout=0.1))
+    release, calls = threading.Event(), []
+    try:
+        running = asyncio.ensure_future(hasher._run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        # свободного потока нет: задача ждёт queue_timeout и снимается с очереди, не выполнившись
+        with pytest.raises(HTTPException) as timed_out:
+            await hasher._run(calls.append, "queued")
+        assert timed_out.value.status_code == 503
+
+        waiting = asyncio.ensure_future(hasher._run(calls.append, "waiting"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as full:
+            await hasher._run(calls.append, "rejected")
+        assert full.value.status_code == 503
+        release.set()
+        assert await running is True
+        await waiting
+        assert calls == ["waiting"]
+    finally:
+        release.set()
+        hasher.shutdown()
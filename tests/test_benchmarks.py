@@ -0,0 +1,21 @@
+from benchmarks.compare import compare
+from benchmarks.datasets import parse_size, sales_frame
+
+
+def _report(parse_seconds, rss=100.0):
+    return {"results": {"upload/10k": {"stages": {"parse": parse_seconds, "tiny": 0.0001}, "peak_rss_mb": rss}}}
+
+
+def test_parse_size_and_sales_frame():
+    assert [parse_size(size) for size in ("10k", "1m", "250")] == [10_000, 1_000_000, 250]
+    df = sales_frame(1_000)
+    assert len(df) == 1_000
+    assert df["date"].is_monotonic_increasing
+
+
+def test_compare_flags_regressions_over_threshold():
+    assert compare(_report(1.0), _report(1.1), threshold=0.15) == []
+    regressions = compare(_report(1.0), _report(1.5, rss=200.0), threshold=0.15)
+    assert [change.metric for change in regressions] == ["upload/10k:parse", "upload/10k:peak_rss_mb"]
+    # время меньше миллисекунды не сравнивается
+    assert compare(_report(1.0), {"results": {"upload/10k": {"stages": {"tiny": 0.0009}, "peak_rss_mb": 100.0}}}, 0.15) == []
@@ -0,0 +1,36 @@
+import pytest
+from app.config.settings import ChartCacheSettings
+from app.services.cache import ChartCache, cache_key
+
+
+def test_cache_key_is_order_independent():
+    assert cache_key({"a": 1, "b": [1, 2]}) == cache_key({"b": [1, 2], "a": 1})
+    assert cache_key({"a": 1}) != cache_key({"a": 2})
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_and_disk_tier(tmp_path):
+    cache = ChartCache(ChartCacheSettings(max_bytes=10, disk_dir=str(tmp_path)))
+    await cache.put("aa", b"12345")
+    await cache.put("bb", b"12345")
+    assert await cache.get("aa") == b"12345"  # "aa" становится самым свежим
+    await cache.put("cc", b"12345")
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["entries"] == 2
+    # "bb" вытеснен из памяти, но поднимается с диска, в том числе новым экземпляром кэша
+    assert await ChartCache(ChartCacheSettings(disk_dir=str(tmp_path))).get("bb") == b"12345"
+    assert await cache.get("bb") == b"12345"
+    assert cache.stats()["disk_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_is_size_bounded(tmp_path):
+    cache = ChartCache(ChartCacheSettings(max_bytes=100, disk_dir=str(tmp_path), disk_max_bytes=10))
+    await cache.put("aa", b"12345")
+    await cache.put("bb", b"12345")
+    cache.clear()
+    assert await cache.get("aa") == b"12345"  # на диске "aa" становится самым свежим
+    await cache.put("cc", b"12345")
+    assert cache.stats()["disk_evictions"] == 1
+    assert cache.stats()["disk_bytes"] == 10
+    assert sorted(path.stem for path in tmp_path.glob("*/*.json")) == ["aa", "cc"]
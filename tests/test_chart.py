@@ -1,5 +1,10 @@
+import json
+import pyarrow as pa
+import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.services.chart_formats import ARROW_STREAM, COLUMNAR_JSON, JSON, encode_json
+from app.services.chart_service import ChartGenerator, build_encoding, prepare_dataframe, render_chart
 
 client = TestClient(app)
 
@@ -24,3 +29,161 @@ def test_generate_chart():
     assert response.status_code == 200
     data = response.json()
     assert "data" in data
+
+
+def test_generate_chart_by_id_aggregates_in_db():
+    csv_content = "date,revenue,store\n" + "".join(
+        f"2025-0{month}-{day:02d},{day},{store}\n" for month in (1, 2) for day in range(1, 11) for store in ("a", "b")
+    )
+    upload = client.post("/upload/csv", files={"file": ("sales.csv", csv_content, "text/csv")})
+    assert upload.status_code == 200
+    chart_request = {
+        "data_id": upload.json()["data_id"],
+        "chart_type": "bar",
+        "x_field": "date",
+        "y_field": "revenue",
+        "color_field": "store",
+        "aggregate": "sum",
+        "time_unit": "month",
+    }
+    response = client.post("/chart/generate_chart_by_id", json=chart_request)
+    assert response.status_code == 200
+    values = response.json()["data"]["values"]
+    assert len(values) == 4
+    assert {row["revenue"] for row in values} == {55}
+
+
+def test_generate_chart_by_id_unknown_dataset_ignores_if_none_match():
+    chart_request = {"data_id": "missing_0", "chart_type": "bar", "x_field": "a", "y_field": "b"}
+    response = client.post("/chart/generate_chart_by_id", json=chart_request, headers={"If-None-Match": "*"})
+    assert response.status_code == 404
+
+
+def test_generate_chart_by_id_unknown_dataset():
+    chart_request = {"data_id": "users", "chart_type": "bar", "x_field": "id", "y_field": "id"}
+    response = client.post("/chart/generate_chart_by_id", json=chart_request)
+    assert response.status_code == 404
+
+
+def test_generate_chart_downsampled():
+    chart_request = {
+        "data": [{"date": f"2025-01-01T{i // 60:02d}:{i % 60:02d}", "sales": i % 17} for i in range(1000)],
+        "chart_type": "line",
+        "x_field": "date",
+        "y_field": "sales",
+        "max_points": 100,
+    }
+    response = client.post("/chart/generate_chart", json=chart_request)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["data"]["values"]) == 100
+    assert data["usermeta"]["points"] == {"original": 1000, "returned": 100}
+
+
+def test_generate_chart_cache_and_etag():
+    chart_request = {
+        "data": [{"date": "2025-03-01", "orders": 10}, {"date": "2025-03-02", "orders": 12}],
+        "chart_type": "bar",
+        "x_field": "date",
+        "y_field": "orders",
+    }
+    first = client.post("/chart/generate_chart", json=chart_request)
+    assert first.status_code == 200
+    assert first.headers["X-Cache"] == "MISS"
+    second = client.post("/chart/generate_chart", json=dict(reversed(list(chart_request.items()))))
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.content == first.content
+    not_modified = client.post("/chart/generate_chart", json=chart_request, headers={"If-None-Match": first.headers["ETag"]})
+    assert not_modified.status_code == 304
+    assert client.get("/chart/cache_stats").json()["hits"] >= 1
+
+
+def test_generate_chart_arrow_and_columnar_formats():
+    chart_request = {
+        "data": [{"date": "2025-04-01", "guests": 31}, {"date": "2025-04-02", "guests": 27}],
+        "chart_type": "line",
+        "x_field": "date",
+        "y_field": "guests",
+    }
+    arrow = client.post("/chart/generate_chart", json=chart_request, headers={"Accept": ARROW_STREAM})
+    assert arrow.status_code == 200
+    assert arrow.headers["content-type"] == ARROW_STREAM
+    table = pa.ipc.open_stream(arrow.content).read_all()
+    assert table.column("guests").to_pylist() == [31, 27]
+    spec = json.loads(table.schema.metadata[b"vega_lite_spec"])
+    assert spec["data"] == {"name": "values"}
+    assert spec["mark"]["type"] == "line"
+
+    columnar = client.post("/chart/generate_chart", json=chart_request, headers={"Accept": COLUMNAR_JSON})
+    assert columnar.status_code == 200
+    body = columnar.json()
+    assert body["data"]["guests"] == [31, 27]
+    assert body["spec"] == spec
+
+    assert client.post("/chart/generate_chart", json=chart_request, headers={"Accept": "text/html"}).status_code == 406
+
+
+def test_dashboard_shares_one_dataset_between_charts():
+    data = [{"date": f"2025-01-{day:02d}", "calories": 2000 + day, "category": "ab"[day % 2]} for day in range(1, 31)]
+    dashboard = {
+        "data": data,
+        "charts": [
+            {"chart_type": "line", "x_field": "date", "y_field": "calories"},
+            {"chart_type": "bar", "x_field": "date", "y_field": "calories", "color_field": "category"},
+            {"chart_type": "line", "x_field": "date", "y_field": "calories", "max_points": 10},
+        ],
+    }
+    response = client.post("/chart/dashboard", json=dashboard)
+    assert response.status_code == 200
+    body = response.json()
+    assert list(body["datasets"]) == ["source", "chart_2"]
+    assert len(body["datasets"]["source"]) == 30
+    assert body["datasets"]["source"][0]["date"].startswith("2025-01-01T00:00:00")
+    assert len(body["datasets"]["chart_2"]) == 10
+    assert [chart["data"] for chart in body["charts"]] == [{"name": "source"}, {"name": "source"}, {"name": "chart_2"}]
+    assert [chart["mark"]["type"] for chart in body["charts"]] == ["line", "bar", "line"]
+    assert body["charts"][2]["usermeta"] == {"points": {"original": 30, "returned": 10}}
+    assert all("datasets" not in chart for chart in body["charts"])
+
+    again = client.post("/chart/dashboard", json=dashboard, headers={"If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_dashboard_by_data_id_and_validation():
+    csv_content = "date,revenue,store\n" + "".join(f"2025-01-{day:02d},{day},{store}\n" for day in range(1, 11) for store in "ab")
+    data_id = client.post("/upload/csv", files={"file": ("sales.csv", csv_content, "text/csv")}).json()["data_id"]
+    charts = [{"chart_type": "line", "x_field": "date", "y_field": "revenue", "color_field": "store"},
+              {"chart_type": "pie", "x_field": "store", "y_field": "revenue"}]
+    response = client.post("/chart/dashboard", json={"data_id": data_id, "charts": charts})
+    assert response.status_code == 200
+    body = response.json()
+    assert list(body["datasets"]) == ["source"]
+    assert sorted(body["datasets"]["source"][0]) == ["date", "revenue", "store"]
+    assert len(body["datasets"]["source"]) == 20
+
+    missing = client.post("/chart/dashboard", json={"data_id": data_id, "charts": [{**charts[0], "y_field": "nope"}]})
+    assert missing.status_code == 400
+    both = client.post("/chart/dashboard", json={"data_id": data_id, "data": [{"a": 1}], "charts": charts})
+    assert both.status_code == 422
+    assert client.post("/chart/dashboard", json={"data_id": "missing_0", "charts": charts}).status_code == 404
+
+
+def _altair_chart_json(data, chart_type, x_field, y_field, color_field=None):
+    """Ответ /generate_chart, построенный через объекты Altair на каждый запрос (как до шаблонов)."""
+    df = prepare_dataframe(data, x_field)
+    chart = ChartGenerator.generate(chart_type, df, build_encoding(x_field, y_field, color_field), x_field, y_field)
+    chart_dict = chart.to_dict()
+    chart_dict["data"] = {"values": df.to_dict(orient="records")}
+    chart_dict.pop("datasets", None)
+    return encode_json(chart_dict)
+
+
+@pytest.mark.parametrize("chart_type", ["line", "bar", "scatter", "pie"])
+@pytest.mark.parametrize("x_field, color_field", [
+    ("date", None), ("date", ""), ("date", "category"), ("Дата заказа", "зал"), ("order.date", "a b"), ("ßtraße", "ǆ"),
+    ("month(date)", None),  # сокращённая запись Altair - строится через Altair
+])
+def test_template_spec_is_byte_identical_to_altair(chart_type, x_field, color_field):
+    data = [{x_field: f"2025-05-0{day}", "revenue": day * 10, color_field or "other": "ab"[day % 2]} for day in range(1, 6)]
+    assert render_chart(JSON, data, chart_type, x_field, "revenue", color_field) == \
+        _altair_chart_json(data, chart_type, x_field, "revenue", color_field)
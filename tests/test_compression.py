@@ -0,0 +1,81 @@
+import gzip
+import io
+import zipfile
+import pytest
+from fastapi.testclient import TestClient
+from app.config.settings import UploadSettings, config
+from app.main import app
+from app.services.compression import DecompressionLimitExceeded, GzipBodyInflater, open_csv_source
+
+client = TestClient(app)
+
+CSV = "date,store,revenue\n" + "".join(f"2025-04-{day:02d},store_{day % 3},{day}\n" for day in range(1, 31))
+
+
+def _zip(files) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def _upload(filename: str, content: bytes, content_type: str = "application/octet-stream", **params):
+    return client.post("/upload/csv", params={"name": "packed", **params},
+                       files={"file": (filename, content, content_type)})
+
+
+@pytest.mark.parametrize("filename, content", [
+    ("sales.csv.gz", gzip.compress(CSV.encode())),
+    ("sales.zip", _zip({"readme.txt": "export", "sales.csv": CSV})),
+])
+def test_compressed_upload_matches_plain(filename, content):
+    plain = client.post("/upload/csv", params={"name": "plain"}, files={"file": ("sales.csv", CSV, "text/csv")})
+    packed = _upload(filename, content)
+    assert packed.status_code == 200, packed.json()
+    assert packed.json()["rows"] == plain.json()["rows"] == 30
+    assert packed.json()["preview"] == plain.json()["preview"]
+
+
+def test_gzip_request_body():
+    # тело multipart целиком сжато клиентом
+    body_client = TestClient(app)
+    request = body_client.build_request("POST", "/upload/csv", params={"name": "encoded"},
+                                        files={"file": ("sales.csv", CSV, "text/csv")})
+    compressed = gzip.compress(request.read())
+    headers = {"content-type": request.headers["content-type"], "content-encoding": "gzip"}
+    response = body_client.post("/upload/csv", params={"name": "encoded"}, content=compressed, headers=headers)
+    assert response.status_code == 200 and response.json()["rows"] == 30
+
+    broken = body_client.post("/upload/csv", content=compressed[:-20], headers=headers)
+    assert broken.status_code == 400
+    brotli = body_client.post("/upload/csv", content=b"x", headers={**headers, "content-encoding": "br"})
+    assert brotli.status_code == 415
+
+
+def test_decompression_ratio_guard(monkeypatch):
+    bomb = gzip.compress(b"0" * 2_000_000)
+    settings = UploadSettings(max_decompression_ratio=10, decompression_check_bytes=1024)
+    with pytest.raises(DecompressionLimitExceeded):
+        open_csv_source(io.BytesIO(bomb), settings).read()
+    inflater = GzipBodyInflater(settings)
+    with pytest.raises(DecompressionLimitExceeded):
+        inflater.feed(bomb, final=True)
+    # распаковано не больше допустимого, а не весь файл
+    assert inflater.decompressed <= settings.max_decompression_ratio * len(bomb) + 1
+
+    monkeypatch.setattr(config.upload, "max_decompression_ratio", 10)
+    monkeypatch.setattr(config.upload, "decompression_check_bytes", 1024)
+    assert _upload("bomb.csv.gz", bomb).status_code == 413
+
+
+def test_rejects_broken_archives():
+    assert _upload("sales.csv.gz", gzip.compress(CSV.encode())[:-30]).status_code == 400
+    assert _upload("two.zip", _zip({"a.csv": CSV, "b.csv": CSV})).status_code == 400
+    assert _upload("sales.exe", b"MZ", content_type="application/x-msdownload").status_code == 400
+
+
+def test_zstd_upload():
+    zstandard = pytest.importorskip("zstandard")
+    response = _upload("sales.csv.zst", zstandard.ZstdCompressor().compress(CSV.encode()))
+    assert response.status_code == 200 and response.json()["rows"] == 30
@@ -0,0 +1,117 @@
+import gzip
+import io
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.config.settings import config
+from app.main import app
+from app.services import csv
+from app.services.compression import open_csv_source
+from app.services.dedupe import HashingReader, content_digest
+
+client = TestClient(app)
+
+
+def _upload(content: str, **params):
+    return client.post("/upload/csv", params=params, files={"file": ("sales.csv", content, "text/csv")})
+
+
+def test_content_digest_reads_in_blocks_and_rewinds():
+    source = io.BytesIO(b"x" * (3 * 1024 * 1024 + 5))
+    source.seek(10)
+    assert content_digest(source) == content_digest(io.BytesIO(source.getvalue()))
+    assert source.tell() == 0
+
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_hashing_reader_digest_matches_separate_pass(packed):
+    data = "a,b\n" + "".join(f"{i},{i * 2}\n" for i in range(200_000))
+    content = gzip.compress(data.encode()) if packed else data.encode()
+    hasher = HashingReader(io.BytesIO(content))
+    assert len(pd.read_csv(open_csv_source(io.BufferedReader(hasher, buffer_size=4096)))) == 200_000
+    assert hasher.hexdigest() == content_digest(io.BytesIO(content))
+
+    partial = HashingReader(io.BytesIO(content))
+    partial.read(10)
+    partial.seek(100)
+    partial.read()
+    assert partial.hexdigest() is None
+
+
+def test_new_file_is_hashed_while_parsing(monkeypatch):
+    passes = []
+
+    def counting_digest(source):
+        passes.append(source)
+        return content_digest(source)
+
+    monkeypatch.setattr(csv, "content_digest", counting_digest)
+    content = "date,store,revenue\n" + "".join(f"2025-06-{day:02d},single_pass,{day}\n" for day in range(1, 29))
+    first = _upload(content, name="single", user_id=1)
+    assert first.status_code == 200 and first.json()["deduplicated"] is False
+    assert passes == []
+    # файл того же размера уже есть: отдельный проход по хэшу и готовый набор без разбора
+    repeat = _upload(content, name="single", user_id=2)
+    assert repeat.json()["deduplicated"] is True and repeat.json()["data_id"] == first.json()["data_id"]
+    assert len(passes) == 1
+
+
+def test_repeat_upload_links_existing_dataset_and_last_unlink_drops_it(tmp_path, monkeypatch):
+    monkeypatch.setattr(config.storage, "backend", "parquet")
+    monkeypatch.setattr(config.storage, "parquet_dir", str(tmp_path))
+    content = "date,store,revenue\n" + "".join(f"2025-03-{day:02d},a,{day}\n" for day in range(1, 21))
+
+    first = _upload(content, name="iiko", user_id=1, rollup_time="date")
+    assert first.status_code == 200 and first.json()["deduplicated"] is False
+    data_id = first.json()["data_id"]
+
+    repeat = _upload(content, name="iiko_again", user_id=2, rollup_time="date")
+    assert repeat.status_code == 200
+    assert repeat.json()["deduplicated"] is True and repeat.json()["data_id"] == data_id
+    assert repeat.json()["rows"] == 20 and repeat.json()["rollups"] == first.json()["rollups"]
+    assert repeat.json()["preview"] == first.json()["preview"]
+    # тот же файл без rollup - другой набор
+    assert _upload(content, user_id=2).json()["data_id"] != data_id
+
+    assert client.delete(f"/upload/datasets/{data_id}", params={"user_id": 1}).json() == {"data_id": data_id, "dropped": False}
+    assert client.delete(f"/upload/datasets/{data_id}", params={"user_id": 1}).status_code == 404
+    stored = {path.name for path in tmp_path.iterdir()}
+    assert data_id in stored and any(name.startswith(f"{data_id}__") for name in stored)
+
+    assert client.delete(f"/upload/datasets/{data_id}", params={"user_id": 2}).json() == {"data_id": data_id, "dropped": True}
+    chart = client.post("/chart/generate_chart_by_id", json={"data_id": data_id, "chart_type": "bar",
+                                                             "x_field": "date", "y_field": "revenue"})
+    assert chart.status_code == 404
+    assert not any(name.startswith(data_id) for name in (path.name for path in tmp_path.iterdir()))
+
+    # после удаления файл снова загружается как новый набор
+    again = _upload(content, name="iiko", user_id=1, rollup_time="date")
+    assert again.json()["deduplicated"] is False and again.json()["data_id"] != data_id
+
+
+@pytest.mark.parametrize("backend", ["postgres", "parquet"])
+def test_append_to_shared_dataset_copies_it_for_the_user(backend, tmp_path, monkeypatch):
+    monkeypatch.setattr(config.storage, "backend", backend)
+    monkeypatch.setattr(config.storage, "parquet_dir", str(tmp_path))
+    content = "date,store,revenue\n" + "".join(f"2025-05-{day:02d},a,{day}\n" for day in range(1, 11))
+    shared = _upload(content, name="shared", user_id=1, rollup_time="date").json()["data_id"]
+    assert _upload(content, name="shared", user_id=2, rollup_time="date").json()["data_id"] == shared
+
+    append = client.post("/upload/csv", params={"append_to": shared, "user_id": 2},
+                         files={"file": ("more.csv", "date,store,revenue\n2025-05-11,a,100\n", "text/csv")})
+    assert append.status_code == 200, append.json()
+    copy = append.json()["data_id"]
+    assert copy != shared and append.json()["copied_from"] == shared and append.json()["rows"] == 1
+
+    def total(data_id):
+        chart = client.post("/chart/generate_chart_by_id", json={
+            "data_id": data_id, "chart_type": "bar", "x_field": "date", "y_field": "revenue",
+            "aggregate": "sum", "time_unit": "month"})
+        assert chart.status_code == 200
+        return sum(row["revenue"] for row in chart.json()["data"]["values"])
+
+    assert total(shared) == 55 and total(copy) == 155
+    # ссылка пользователя 2 перенесена на копию: общий набор остался только у пользователя 1
+    assert client.delete(f"/upload/datasets/{shared}", params={"user_id": 2}).status_code == 404
+    assert client.delete(f"/upload/datasets/{copy}", params={"user_id": 2}).json()["dropped"] is True
+    assert client.delete(f"/upload/datasets/{shared}", params={"user_id": 1}).json()["dropped"] is True
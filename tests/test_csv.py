@@ -1,5 +1,6 @@
 from fastapi.testclient import TestClient
 from app.main import app
+from app.config.settings import config
 
 
 client = TestClient(app)
@@ -13,3 +14,20 @@ def test_upload_csv():
     data = response.json()
     assert data["rows"] == 2
     assert "table_name" in data
+
+
+def test_upload_csv_in_chunks(monkeypatch):
+    monkeypatch.setattr(config.upload, "chunk_rows", 2)
+    csv_content = "col1,col2\n" + "".join(f"{i},{i * 2}\n" for i in range(7))
+    files = {"file": ("test.csv", csv_content, "text/csv")}
+    response = client.post("/upload/csv", files=files)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rows"] == 7
+    assert data["preview"] == [{"col1": 0, "col2": 0}, {"col1": 1, "col2": 2}]
+
+
+def test_upload_csv_parse_error():
+    files = {"file": ("test.csv", "", "text/csv")}
+    response = client.post("/upload/csv", files=files)
+    assert response.status_code == 400
@@ -1,7 +1,15 @@
+import json
+from uuid import uuid4
 import pytest
-from app.database.connection import async_session, Base, engine
-from app.models.models import User
-from sqlalchemy import select
+import pandas as pd
+from httpx import ASGITransport, AsyncClient
+from app.main import app
+from app.config.settings import PoolSettings
+from app.database.connection import async_session, Base, engine, make_engine
+from app.models.models import DataItem, User
+from app.database.bulk import copy_df, create_table, widen_table
+from app.database.schema import create_schema, narrow_integer_columns
+from sqlalchemy import BigInteger, Float, create_engine, inspect, select
 
 
 @pytest.mark.asyncio
@@ -31,3 +39,95 @@ async def test_db_connection_and_user_crud():
         # Проверить, что пользователя нет
         result = await session.execute(select(User).where(User.username == "testuser"))
         assert result.scalar_one_or_none() is None
+
+
+@pytest.mark.asyncio
+async def test_bulk_copy_df_coerces_chunk_types():
+    """Вторая порция с пропусками (float) дописывается в колонку, созданную по первой порции (int)."""
+    first = pd.DataFrame({"qty": [1, 2], "dish": ["борщ", "плов"]})
+    second = pd.DataFrame({"qty": [3.0, None], "dish": ["чай", None]})
+    async with engine.begin() as conn:
+        table = await create_table(conn, "bulk_test_table", first)
+        assert await copy_df(conn, table, first) == 2
+        assert await copy_df(conn, table, second) == 2
+        rows = (await conn.execute(select(table))).all()
+        await conn.run_sync(table.drop)
+    assert rows == [(1, "борщ"), (2, "плов"), (3, "чай"), (None, None)]
+
+
+def test_create_schema_adds_new_columns_to_old_tables(tmp_path):
+    """БД, созданная до появления колонок storage/row_count/inferred_schema, дополняется при старте."""
+    old = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with old.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE data_items (id VARCHAR PRIMARY KEY, filename VARCHAR NOT NULL, file_size INTEGER, "
+            "content_type VARCHAR, created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        )
+        conn.exec_driver_sql("INSERT INTO data_items (id, filename) VALUES ('old_1', 'old.csv')")
+    with old.begin() as conn:
+        create_schema(conn)
+    with old.connect() as conn:
+        columns = {column["name"] for column in inspect(conn).get_columns("data_items")}
+        assert {"storage", "row_count", "inferred_schema"} <= columns
+        assert conn.exec_driver_sql("SELECT storage FROM data_items").scalar() == "postgres"
+        # на PostgreSQL file_size INTEGER переводится в BIGINT (таблицы больше 2 ГиБ)
+        existing = {column["name"]: column for column in inspect(conn).get_columns("data_items")}
+        assert [column.name for column in narrow_integer_columns(DataItem.__table__, existing)] == ["file_size"]
+    old.dispose()
+
+
+@pytest.mark.asyncio
+async def test_bulk_columns_are_wide_and_widen_only_for_fractions():
+    first = pd.DataFrame({"qty": pd.Series([1, 2], dtype="int8"), "price": pd.Series([1.5, 2.5], dtype="float32")})
+    async with engine.begin() as conn:
+        table = await create_table(conn, "bulk_wide_table", first)
+        assert isinstance(table.c.qty.type, BigInteger)
+        assert table.c.price.type.precision == 53
+        await widen_table(conn, table, pd.DataFrame({"qty": [3.0, None]}))
+        assert isinstance(table.c.qty.type, BigInteger)
+        await widen_table(conn, table, pd.DataFrame({"qty": [3.5]}))
+        assert isinstance(table.c.qty.type, Float)
+        await conn.run_sync(table.drop)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_users_keyset_pages_and_ndjson_stream():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    prefix = f"page_{uuid4().hex[:6]}_"
+    async with async_session() as session:
+        session.add_all(User(username=f"{prefix}{i}", hashed_password="hash") for i in range(5))
+        await session.commit()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        pages, params = [], {"limit": 2}
+        while True:
+            response = await client.get("/db/users", params=params)
+            assert response.status_code == 200
+            pages.append(response.json())
+            if "X-Next-Cursor" not in response.headers:
+                break
+            assert 'rel="next"' in response.headers["Link"]
+            params = {"limit": 2, "after_id": response.headers["X-Next-Cursor"]}
+        paged = [user for page in pages for user in page]
+        assert all(len(page) <= 2 for page in pages)
+        assert [user["id"] for user in paged] == sorted(user["id"] for user in paged)
+        assert [user["username"] for user in paged if user["username"].startswith(prefix)] == [f"{prefix}{i}" for i in range(5)]
+
+        streamed = await client.get("/db/users/stream")
+        assert streamed.headers["content-type"] == "application/x-ndjson"
+        assert [json.loads(line) for line in streamed.text.splitlines()] == paged
+        assert "hashed_password" not in streamed.text
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_make_engine_applies_pool_settings(tmp_path):
+    pool_engine = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+                              PoolSettings(pool_size=3, max_overflow=1, pool_recycle=60), "test")
+    assert pool_engine.pool.size() == 3 and pool_engine.pool._max_overflow == 1
+    assert pool_engine.pool._recycle == 60 and pool_engine.pool._pre_ping
+    async with pool_engine.connect():
+        assert pool_engine.pool.checkedout() == 1
+    await pool_engine.dispose()
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+from app.services.downsampling import downsample, lttb_indices, minmax_indices
+
+
+def test_lttb_keeps_endpoints_and_peak():
+    x = np.arange(10_000, dtype=float)
+    y = np.zeros_like(x)
+    y[4321] = 100.0
+    idx = lttb_indices(x, y, 50)
+    assert len(idx) == 50
+    assert idx[0] == 0 and idx[-1] == len(x) - 1
+    assert 4321 in idx
+    assert np.all(np.diff(idx) > 0)
+
+
+def test_minmax_keeps_extremes():
+    y = np.random.default_rng(1).normal(size=5_000)
+    idx = minmax_indices(y, 200)
+    assert len(idx) <= 200
+    assert y.argmax() in idx and y.argmin() in idx
+
+
+def test_downsample_per_series_and_untouched_types():
+    df = pd.DataFrame({
+        "x": np.tile(np.arange(500), 2),
+        "y": np.random.default_rng(2).random(1_000),
+        "store": np.repeat(["a", "b"], 500),
+    })
+    reduced = downsample(df, "line", "x", "y", 100, color_field="store")
+    assert reduced["store"].value_counts().to_dict() == {"a": 50, "b": 50}
+    assert downsample(df, "bar", "x", "y", 100) is df
+
+
+def test_downsample_line_with_categorical_x_and_many_series():
+    df = pd.DataFrame({"dish": [f"dish_{i}" for i in range(50)], "qty": np.arange(50.0)})
+    reduced = downsample(df, "line", "dish", "qty", 10)
+    assert len(reduced) == 10
+    assert reduced["dish"].iloc[0] == "dish_0" and reduced["dish"].iloc[-1] == "dish_49"
+
+    many = pd.DataFrame({
+        "x": np.tile(np.arange(10), 200),
+        "y": np.random.default_rng(3).random(2_000),
+        "store": np.repeat(np.arange(200), 10),
+    })
+    assert len(downsample(many, "line", "x", "y", 100, color_field="store")) == 100
+    assert len(downsample(many, "scatter", "x", "y", 100, color_field="store")) == 100
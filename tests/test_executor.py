@@ -0,0 +1,25 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from app.config.settings import ExecutorSettings
+from app.services.executor import TaskExecutor
+
+
+@pytest.mark.asyncio
+async def test_executor_rejects_when_saturated_and_times_out():
+    executor = TaskExecutor(ExecutorSettings(process_workers=0, thread_workers=1, max_pending=1, task_timeout=0.2))
+    release = threading.Event()
+    try:
+        slow = asyncio.ensure_future(executor.run_thread(release.wait, 5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as busy:
+            await executor.run_thread(sum, [1, 2])
+        assert busy.value.status_code == 503
+        with pytest.raises(HTTPException) as timeout:
+            await slow
+        assert timeout.value.status_code == 504
+    finally:
+        release.set()
+        executor.shutdown()
+    assert await TaskExecutor(ExecutorSettings(process_workers=0)).run_process(sum, [1, 2]) == 3
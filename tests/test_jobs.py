@@ -0,0 +1,125 @@
+import asyncio
+import io
+import time
+from datetime import timedelta
+import pytest
+from fastapi.testclient import TestClient
+from app.config.settings import JobSettings, config
+from app.database.connection import async_session, dispose_engines
+from app.main import app
+from app.services.csv import upload_jobs
+from app.models.models import UploadJob
+from app.services.jobs import JobQueue, utcnow
+
+
+def _wait_for(client, job_id, statuses=("done", "failed", "cancelled"), timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/upload/jobs/{job_id}").json()
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"задача {job_id} не завершилась: {job}")
+
+
+def test_background_upload_reports_progress_and_result(tmp_path, monkeypatch):
+    csv_content = "date,revenue\n" + "".join(f"2025-01-{day:02d},{day}\n" for day in range(1, 29))
+    # parquet: запись набора не держит транзакцию SQLite, и прогресс пишется по ходу загрузки
+    monkeypatch.setattr(config.storage, "backend", "parquet")
+    monkeypatch.setattr(config.storage, "parquet_dir", str(tmp_path / "datasets"))
+    monkeypatch.setattr(config.upload, "chunk_rows", 10)
+    monkeypatch.setattr(upload_jobs.settings, "spool_dir", str(tmp_path / "spool"))
+    with TestClient(app) as client:
+        response = client.post("/upload/csv", params={"background": True, "name": "sales"},
+                               files={"file": ("sales.csv", csv_content, "text/csv")})
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+        assert response.headers["location"] == f"/upload/jobs/{job_id}"
+        assert response.json()["bytes_total"] == len(csv_content)
+
+        job = _wait_for(client, job_id)
+        assert job["status"] == "done", job
+        assert job["rows_loaded"] == 28 and job["bytes_processed"] == len(csv_content) and job["progress"] == 1.0
+        assert job["result"]["rows"] == 28 and job["result"]["data_id"].startswith("sales_")
+        assert list((tmp_path / "spool").iterdir()) == []
+
+        assert client.post(f"/upload/jobs/{job_id}/retry").status_code == 409
+        assert client.get("/upload/jobs/missing").status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_job_queue_cancel_and_retry(tmp_path):
+    attempts = []
+
+    async def run(job, progress):
+        attempts.append(job.id)
+        if len(attempts) == 1:
+            for rows in range(1, 1000):
+                await progress(rows, rows)
+                await asyncio.sleep(0.01)
+        if len(attempts) == 2:
+            raise ValueError("boom")
+        return {"rows": 1}
+
+    queue = JobQueue(JobSettings(spool_dir=str(tmp_path), workers=1, poll_interval=0.05), run)
+    await queue.start()
+    try:
+        job = await queue.submit(io.BytesIO(b"a\n1\n"), "a.csv", {})
+        while (await queue.get(job.id)).rows_loaded < 3:
+            await asyncio.sleep(0.01)
+        cancelled = await queue.cancel(job.id)
+        assert cancelled.status == "cancelled" and cancelled.cancel_requested
+
+        await queue.retry(job.id)
+        while (failed := await queue.get(job.id)).status != "failed":
+            await asyncio.sleep(0.01)
+        assert failed.error == "ValueError: boom"
+
+        await queue.retry(job.id)
+        while (done := await queue.get(job.id)).status != "done":
+            await asyncio.sleep(0.01)
+        assert done.result == {"rows": 1} and done.attempts == 1
+        assert not (tmp_path / f"{job.id}.upload").exists()
+    finally:
+        await queue.stop()
+        await dispose_engines()
+
+
+@pytest.mark.asyncio
+async def test_worker_requeues_abandoned_job_without_restart(tmp_path):
+    runs = []
+
+    async def run(job, progress):
+        runs.append(job.id)
+        # долгий разбор без прогресса: задачу держат отметки heartbeat_at
+        await asyncio.sleep(0.6)
+        return {"rows": 1}
+
+    settings = JobSettings(spool_dir=str(tmp_path), workers=1, poll_interval=0.05, heartbeat_interval=0.05, stale_after=0.3)
+    queue = JobQueue(settings, run)
+    await queue.start()
+    try:
+        live = await queue.submit(io.BytesIO(b"a\n1\n"), "live.csv", {})
+        while (job := await queue.get(live.id)).status != "done":
+            assert job.status in ("queued", "running"), job.status
+            assert job.status == "running" or not runs
+            await asyncio.sleep(0.02)
+        assert runs == [live.id] and job.attempts == 1
+
+        # процесс упал (или не записал итог) посреди загрузки: задачу возвращает работающий воркер
+        spool = tmp_path / "lost.upload"
+        spool.write_bytes(b"a\n1\n")
+        long_ago = utcnow() - timedelta(minutes=10)
+        async with async_session() as session:
+            session.add(UploadJob(id="lost", status="running", filename="lost.csv", spool_path=str(spool), params={},
+                                  attempts=1, created_at=long_ago, started_at=long_ago, updated_at=long_ago,
+                                  heartbeat_at=long_ago))
+            await session.commit()
+        deadline = time.monotonic() + 10
+        while (lost := await queue.get("lost")).status != "done":
+            assert time.monotonic() < deadline, lost.status
+            await asyncio.sleep(0.02)
+        assert runs == [live.id, "lost"] and lost.attempts == 2
+    finally:
+        await queue.stop()
+        await dispose_engines()
@@ -0,0 +1,43 @@
+import json
+import logging
+from fastapi.testclient import TestClient
+from app.config.settings import LoggingSettings
+from app.main import app
+from app.middleware.logging import LogPipeline, request_id, request_spans
+
+client = TestClient(app)
+
+
+def test_request_id_is_returned_and_generated():
+    response = client.get("/health", headers={"X-Request-ID": "abc-123"})
+    assert response.headers["x-request-id"] == "abc-123"
+    generated = client.get("/health", headers={"X-Request-ID": "bad id\n"}).headers["x-request-id"]
+    assert generated != "bad id\n" and len(generated) == 32
+
+
+def test_pipeline_writes_json_with_request_context(tmp_path):
+    pipeline = LogPipeline(LoggingSettings(file=str(tmp_path / "app.log"), max_bytes=4096, backup_count=2))
+    test_logger = logging.getLogger("foodnet.test")
+    test_logger.propagate = False
+    pipeline.start(test_logger)
+    id_token, spans_token = request_id.set("req-1"), request_spans.set([("chart.build", 0.5), ("chart.build", 0.25)])
+    try:
+        test_logger.info("набор %s", "sales", extra={"rows": 3})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            test_logger.exception("ошибка")
+        request_id.reset(id_token)
+        request_spans.reset(spans_token)
+        for i in range(40):
+            test_logger.info("запись %d", i)
+    finally:
+        pipeline.stop()
+        test_logger.removeHandler(pipeline.queue_handler)
+        test_logger.propagate = True
+
+    first, error = (json.loads(line) for line in sorted(tmp_path.glob("app.log*"))[-1].read_text("utf-8").splitlines()[:2])
+    assert first["message"] == "набор sales" and first["request_id"] == "req-1" and first["rows"] == 3
+    assert first["spans_ms"] == {"chart.build": 750.0}
+    assert error["level"] == "ERROR" and "ValueError: boom" in error["exc"]
+    assert len(list(tmp_path.glob("app.log*"))) > 1  # ротация по размеру
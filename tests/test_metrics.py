@@ -0,0 +1,54 @@
+from fastapi.testclient import TestClient
+from app.config.settings import MetricsSettings
+from app.main import app
+from app.middleware.metrics import RequestProfiler, call_with_spans, span
+
+client = TestClient(app)
+
+
+def _with_span(value):
+    with span("test.inner"):
+        return value * 2
+
+
+def test_metrics_expose_requests_and_stages():
+    assert client.get("/health").status_code == 200
+    assert client.get("/no-such-route").status_code == 404
+    chart_request = {
+        "data": [{"x": i, "y": i * i} for i in range(10)],
+        "chart_type": "line",
+        "x_field": "x",
+        "y_field": "y",
+    }
+    assert client.post("/chart/generate_chart", json=chart_request).status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'foodnet_request_duration_seconds_count{method="GET",route="/health"}' in body
+    assert 'foodnet_requests_total{method="GET",route="unmatched",status="404"}' in body
+    assert 'foodnet_request_duration_seconds_bucket{method="POST",route="/chart/generate_chart",le="+Inf"}' in body
+    assert 'foodnet_stage_duration_seconds_count{stage="chart.build"}' in body
+    assert "foodnet_requests_in_flight 1" in body  # сам запрос /metrics
+    assert 'foodnet_db_pool_size{pool="oltp"} 10' in body and 'foodnet_db_pool_size{pool="analytics"} 5' in body
+    assert 'foodnet_db_pool_saturation{pool="analytics"}' in body
+
+
+def test_call_with_spans_collects_spans_of_task():
+    result, spans = call_with_spans(_with_span, 21)
+    assert result == 42
+    assert [name for name, _ in spans] == ["test.inner"]
+
+
+def test_profiler_dumps_slow_requests(tmp_path):
+    profiler = RequestProfiler(MetricsSettings(profile_slow_ms=0, profile_sample_rate=1, profile_dir=str(tmp_path)))
+    active = profiler.start()
+    assert active is not None
+    assert profiler.start() is None  # одновременно профилируется один запрос
+    profiler.stop(active, "/chart/{data_id}", 0.5)
+    dumps = list(tmp_path.glob("*.prof"))
+    assert len(dumps) == 1 and "chart_data_id" in dumps[0].name
+
+    disabled = RequestProfiler(MetricsSettings(profile_dir=str(tmp_path)))
+    assert disabled.start() is None
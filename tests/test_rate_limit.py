@@ -0,0 +1,69 @@
+import subprocess
+import sys
+import time
+from limits import parse
+from limits.strategies import FixedWindowRateLimiter
+from slowapi import Limiter
+from app.services.auth.rate_limit_storage import SharedMemoryStorage
+from app.services.auth.security import get_username_from_request
+from app.services.auth.utils import GUEST_RATE_LIMIT, ROLE_RATE_LIMITS, get_rate_limit_by_role
+
+WORKER = """
+import sys
+from app.services.auth.rate_limit_storage import SharedMemoryStorage
+storage = SharedMemoryStorage(sys.argv[1])
+for _ in range(int(sys.argv[2])):
+    storage.incr("LIMITER/shared", 60)
+"""
+
+
+def test_counters_are_shared_between_processes(tmp_path):
+    uri = f"shm://{tmp_path / 'limits'}?slots=256&stripes=8"
+    storage = SharedMemoryStorage(uri)
+    workers = [subprocess.Popen([sys.executable, "-c", WORKER, uri, "200"]) for _ in range(4)]
+    assert all(worker.wait(timeout=60) == 0 for worker in workers)
+    assert storage.get("LIMITER/shared") == 800
+    assert storage.incr("LIMITER/shared", 60) == 801
+    assert time.time() < storage.get_expiry("LIMITER/shared") <= time.time() + 60
+
+    storage.clear("LIMITER/shared")
+    assert storage.get("LIMITER/shared") == 0
+    # таблица уже размечена: размеры берутся из файла
+    assert SharedMemoryStorage(f"shm://{tmp_path / 'limits'}?slots=64&stripes=4").slots == 256
+
+
+def test_idle_keys_expire_and_free_their_slots(tmp_path):
+    storage = SharedMemoryStorage(f"shm://{tmp_path / 'limits'}?slots=4&stripes=1")
+    for key in range(4):
+        storage.incr(f"old_{key}", 0.05)
+    time.sleep(0.1)
+    assert storage.get("old_0") == 0 and storage.get_expiry("old_0") <= time.time()
+
+    for key in range(4):
+        assert storage.incr(f"new_{key}", 60) == 1
+    assert [storage.get(f"new_{key}") for key in range(4)] == [1, 1, 1, 1]
+    assert all(storage.get(f"old_{key}") == 0 for key in range(4))
+    # полоса заполнена: вытесняется ключ, окно которого кончается раньше
+    storage.incr("short", 1)
+    storage.incr("extra", 60)
+    assert storage.get("extra") == 1
+    assert storage.reset() == 4
+    assert storage.get("extra") == 0
+
+
+def test_role_limits_hold_across_workers(tmp_path):
+    uri = f"shm://{tmp_path / 'limits'}"
+    limiter = Limiter(key_func=get_username_from_request, storage_uri=uri)
+    assert isinstance(limiter._storage, SharedMemoryStorage)
+
+    # два воркера с одним файлом: гостевой лимит общий
+    workers = [FixedWindowRateLimiter(SharedMemoryStorage(uri)) for _ in range(2)]
+    guest = parse(get_rate_limit_by_role("guest_user"))
+    assert guest == parse(GUEST_RATE_LIMIT)
+    hits = [workers[i % 2].hit(guest, "guest_user") for i in range(guest.amount + 1)]
+    assert hits == [True] * guest.amount + [False]
+    assert not workers[0].test(guest, "guest_user")
+
+    user = parse(ROLE_RATE_LIMITS["user"])
+    assert all(workers[i % 2].hit(user, "other_user") for i in range(user.amount))
+    assert workers[0].get_window_stats(user, "other_user").remaining == 0
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.rollups import RollupBuilder, RollupSpec, aggregate_rollup, choose_rollup
+from app.storage.parquet_store import aggregate_frame
+from app.storage.table_store import TableStore
+
+client = TestClient(app)
+
+
+def _sales(rows: int = 500) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    revenue = rng.integers(100, 1000, size=rows).astype(float)
+    revenue[::7] = np.nan
+    return pd.DataFrame({
+        "date": pd.Timestamp("2024-12-20") + pd.to_timedelta(np.arange(rows) * 3, unit="h"),
+        "store": rng.choice(["a", "b", "c"], size=rows),
+        "revenue": revenue,
+        "guests": rng.integers(1, 9, size=rows),
+    })
+
+
+@pytest.mark.parametrize("aggregate", ["sum", "mean", "count"])
+@pytest.mark.parametrize("x_field,time_unit,color_field", [
+    ("date", "month", None), ("date", "week", "store"), ("date", "quarter", "store"), ("store", None, None),
+])
+def test_rollup_matches_raw_aggregation(aggregate, x_field, time_unit, color_field):
+    df = _sales()
+    builder = RollupBuilder(RollupSpec("date", ["store"], granularities=["day", "week", "month"]))
+    for start in range(0, len(df), 128):
+        builder.add(df.iloc[start:start + 128])
+    assert builder.measures == ["revenue", "guests"]
+
+    granularity = choose_rollup(builder.registry({unit: unit for unit in ("day", "week", "month")}),
+                                x_field, "revenue", aggregate, color_field, time_unit)
+    assert granularity == {"month": "month", "week": "week", "quarter": "month", None: "month"}[time_unit]
+    result = aggregate_rollup(builder.result()[granularity], x_field, "revenue", aggregate, color_field, time_unit)
+    expected = aggregate_frame(df, x_field, "revenue", aggregate, color_field, time_unit)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_categorical=False)
+
+
+def test_rollup_sums_narrow_measures_exactly():
+    # float32 после infer_schema: сумма в float32 дала бы 1.225e+07 вместо 12250000.5
+    revenue = np.full(1_000_001, 12.25, dtype=np.float32)
+    revenue[0] = 0.5
+    df = pd.DataFrame({"date": pd.Timestamp("2025-01-01"), "store": "a", "revenue": revenue,
+                       "guests": np.ones(len(revenue), dtype=np.int8)})
+    builder = RollupBuilder(RollupSpec("date", ["store"], granularities=["day"]))
+    builder.add(df.iloc[:500_000])
+    builder.add(df.iloc[500_000:])
+    rollup = builder.result()["day"]
+    assert rollup["revenue__sum"].tolist() == [12250000.5] and rollup["guests__sum"].tolist() == [1_000_001]
+    for aggregate, expected in (("sum", 12250000.5), ("mean", 12250000.5 / 1_000_001)):
+        assert aggregate_rollup(rollup, "store", "revenue", aggregate)["revenue"].tolist() == [expected]
+        assert aggregate_frame(df, "store", "revenue", aggregate)["revenue"].tolist() == [expected]
+
+
+def test_choose_rollup_falls_back_to_raw_rows():
+    rollups = {"time_column": "date", "dimensions": ["store"], "measures": ["revenue"],
+               "tables": {"day": "t_day", "week": "t_week", "month": "t_month"}}
+    assert choose_rollup(rollups, "date", "revenue", "sum", None, "year") == "month"
+    assert choose_rollup(rollups, "date", "revenue", "sum", None, "hour") is None
+    assert choose_rollup(rollups, "date", "revenue", "sum", "dish", "day") is None
+    assert choose_rollup(rollups, "date", "guests", "sum", None, "day") is None
+    assert choose_rollup(rollups, "date", "revenue", "sum", None, None) is None
+    assert choose_rollup(None, "date", "revenue", "sum", None, "day") is None
+
+
+def test_chart_by_id_uses_rollup(monkeypatch):
+    csv_content = "date,revenue,store\n" + "".join(
+        f"2025-0{month}-{day:02d} 12:00,{day},{store}\n" for month in (1, 2, 3) for day in range(1, 11) for store in ("a", "b")
+    )
+    upload = client.post(
+        "/upload/csv", params={"rollup_time": "date", "rollup_dimensions": "store"},
+        files={"file": ("sales.csv", csv_content, "text/csv")}
+    )
+    assert upload.status_code == 200
+    assert upload.json()["rollups"] == ["day", "week", "month"]
+
+    async def no_raw_scan(*args, **kwargs):
+        raise AssertionError("график должен строиться по rollup")
+
+    monkeypatch.setattr(TableStore, "aggregate", no_raw_scan)
+    chart_request = {
+        "data_id": upload.json()["data_id"], "chart_type": "bar", "x_field": "date", "y_field": "revenue",
+        "color_field": "store", "aggregate": "mean", "time_unit": "month",
+    }
+    response = client.post("/chart/generate_chart_by_id", json=chart_request)
+    assert response.status_code == 200
+    values = response.json()["data"]["values"]
+    assert len(values) == 6 and {row["revenue"] for row in values} == {5.5}
+
+    bad = client.post("/upload/csv", params={"rollup_time": "missing"}, files={"file": ("sales.csv", csv_content, "text/csv")})
+    assert bad.status_code == 400
@@ -0,0 +1,145 @@
+from uuid import uuid4
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.config.settings import config
+from app.main import app
+from app.services.csv import add_DataItem, compact_chunks, store_chunks
+from app.services.schema_inference import SchemaTracker, apply_schema, infer_schema
+from app.storage.parquet_store import ParquetStore
+from app.storage.registry import load_dataset
+
+
+client = TestClient(app)
+
+
+async def _chunks(*frames):
+    for frame in frames:
+        yield frame
+
+
+def test_infer_schema_compact_types():
+    df = pd.DataFrame({
+        "date": ["31.01.2025", "01.02.2025", "02.02.2025", "03.02.2025"],
+        "store": ["a", "b", "a", "a"],
+        "qty": [1, 2, 3, 4],
+        "price": [1.5, 2.25, 3.0, 0.5],
+        "ratio": [0.1, 0.2, 0.3, 0.4],
+    })
+    schema = infer_schema(df)
+    assert schema["dtypes"] == {
+        "date": "datetime64[ns]",
+        "store": "category",
+        "qty": "int8",
+        "price": "float32",
+        "ratio": "float64",
+    }
+    compact, _ = apply_schema(df, schema)
+    assert compact["date"].tolist() == list(pd.to_datetime(["2025-01-31", "2025-02-01", "2025-02-02", "2025-02-03"]))
+    assert compact.memory_usage(deep=True).sum() < df.memory_usage(deep=True).sum()
+
+
+def test_schema_tracker_widens_later_chunks():
+    tracker = SchemaTracker()
+    first = tracker.apply(pd.DataFrame({"qty": [1, 2], "price": [1.5, 2.5]}))
+    second = tracker.apply(pd.DataFrame({"qty": [100_000, None], "price": [0.1, 0.2]}))
+    assert str(first["qty"].dtype) == "int8"
+    assert str(second["price"].dtype) == "float64"
+    assert tracker.schema["dtypes"] == {"qty": "float32", "price": "float64"}
+    report = tracker.memory_report()
+    assert report["before"] > report["after"]
+
+
+@pytest.mark.asyncio
+async def test_parquet_store_unifies_widened_parts(tmp_path):
+    async def chunks():
+        yield pd.DataFrame({"qty": pd.Series([1, 2], dtype="int8")})
+        yield pd.DataFrame({"qty": pd.Series([100_000], dtype="int32")})
+
+    store = ParquetStore(str(tmp_path))
+    await store.write("widened", chunks())
+    df = await store.read("widened")
+    assert str(df["qty"].dtype) == "int32"
+    assert df["qty"].tolist() == [1, 2, 100_000]
+
+
+def test_upload_reports_memory_and_persists_schema(monkeypatch, tmp_path):
+    monkeypatch.setattr(config.storage, "backend", "parquet")
+    monkeypatch.setattr(config.storage, "parquet_dir", str(tmp_path))
+    csv_content = "date,store,revenue\n" + "".join(f"2025-01-{i % 28 + 1:02d},s{i % 3},{i}\n" for i in range(60))
+    response = client.post("/upload/csv", files={"file": ("sales.csv", csv_content, "text/csv")})
+    assert response.status_code == 200
+    memory = response.json()["memory"]
+    assert memory["after"] < memory["before"]
+    assert memory["saved_pct"] > 0
+
+
+@pytest.mark.asyncio
+async def test_load_dataset_restores_inferred_types(monkeypatch, tmp_path):
+    monkeypatch.setattr(config.storage, "backend", "parquet")
+    monkeypatch.setattr(config.storage, "parquet_dir", str(tmp_path))
+    df = pd.DataFrame({"store": ["a", "b", "a", "a"], "revenue": [1, 2, 3, 4]})
+    tracker = SchemaTracker()
+    data_id, stored, _ = await store_chunks("sales", uuid4(), compact_chunks(_chunks(df), tracker))
+    await add_DataItem(data_id, "sales.csv", stored, schema=tracker.schema)
+
+    loaded = await load_dataset(data_id)
+    assert str(loaded["store"].dtype) == "category"
+    assert str(loaded["revenue"].dtype) == "int8"
+    assert await load_dataset("missing") is None
+
+
+def test_datetime_values_are_never_dropped():
+    mixed = pd.DataFrame({"date": [f"2024-01-{day:02d}" for day in range(1, 26)] + ["31.12.2024"]})
+    compact, _ = apply_schema(mixed, infer_schema(mixed))
+    assert compact["date"].notna().all()
+    assert compact["date"].iloc[-1] == pd.Timestamp("2024-12-31")
+
+    assert infer_schema(pd.DataFrame({"date": ["2024-01-01", "позже"]}))["dtypes"]["date"] != "datetime64[ns]"
+
+    schema = infer_schema(pd.DataFrame({"date": ["2024-01-01", "2024-01-02"]}))
+    with pytest.raises(ValueError):
+        apply_schema(pd.DataFrame({"date": ["скоро"]}), schema)
+    with pytest.raises(ValueError):
+        SchemaTracker(schema).apply(pd.DataFrame({"date": ["скоро"]}))
+    # при загрузке нового файла колонка становится строковой, значение сохраняется
+    tracker = SchemaTracker()
+    tracker.apply(pd.DataFrame({"date": ["2024-01-01", "2024-01-02"]}))
+    assert tracker.apply(pd.DataFrame({"date": ["скоро"]}))["date"].tolist() == ["скоро"]
+    assert tracker.schema["dtypes"]["date"] == "object" and "date" not in tracker.schema["datetime_formats"]
+
+
+LATER_TEXT = {
+    "int": ("code", [str(i) for i in range(1, 8)] + ["A-17"]),
+    "empty": ("note", [""] * 7 + ["hello"]),
+    "date": ("day", [f"2025-01-{i:02d}" for i in range(1, 8)] + ["unknown"]),
+}
+
+
+@pytest.mark.parametrize("backend", ["postgres", "parquet"])
+@pytest.mark.parametrize("case", LATER_TEXT)
+def test_later_chunk_text_widens_column_to_text(case, backend, monkeypatch, tmp_path):
+    # тип колонки определяется по первой порции из 5 строк, текст встречается во второй
+    monkeypatch.setattr(config.upload, "chunk_rows", 5)
+    monkeypatch.setattr(config.storage, "backend", backend)
+    monkeypatch.setattr(config.storage, "parquet_dir", str(tmp_path))
+    column, values = LATER_TEXT[case]
+    csv_content = f"{column},revenue\n" + "".join(f"{value},{i}\n" for i, value in enumerate(values))
+    response = client.post("/upload/csv", params={"name": case}, files={"file": ("later.csv", csv_content, "text/csv")})
+    assert response.status_code == 200, response.json()
+    assert response.json()["rows"] == 8
+    if backend == "parquet":
+        stored = ParquetStore(str(tmp_path)).read_sync(response.json()["data_id"])
+        assert stored[column].iloc[-1] == values[-1]
+        assert stored["revenue"].tolist() == list(range(8))
+
+
+def test_chart_by_id_keeps_text_x_from_schema(monkeypatch, tmp_path):
+    monkeypatch.setattr(config.storage, "backend", "parquet")
+    monkeypatch.setattr(config.storage, "parquet_dir", str(tmp_path))
+    csv_content = "dish,qty\n" + "".join(f"{dish},{i}\n" for i, dish in enumerate(["плов", "борщ", "чай"] * 4))
+    upload = client.post("/upload/csv", files={"file": ("menu.csv", csv_content, "text/csv")})
+    chart_request = {"data_id": upload.json()["data_id"], "chart_type": "bar", "x_field": "dish", "y_field": "qty"}
+    response = client.post("/chart/generate_chart_by_id", json=chart_request)
+    assert response.status_code == 200
+    assert sorted(row["dish"] for row in response.json()["data"]["values"]) == ["борщ", "плов", "чай"]
@@ -0,0 +1,23 @@
+import json
+import os
+import subprocess
+import sys
+from fastapi.testclient import TestClient
+from app.config.settings import config
+from app.main import app
+from app.services.chart_service import warm_up_chart
+
+HEAVY_MODULES = ("pandas", "numpy", "altair", "pyarrow")
+
+
+def test_importing_app_does_not_load_heavy_libraries():
+    code = f"import json, sys, app.main; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=os.environ, check=True)
+    assert json.loads(result.stdout.splitlines()[-1]) == []
+
+
+def test_lifespan_with_warm_up(monkeypatch):
+    monkeypatch.setattr(config.executor, "warm_up", True)
+    with TestClient(app) as client:
+        assert client.get("/health").status_code == 200
+    assert warm_up_chart() > 0
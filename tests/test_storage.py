@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from app.config.settings import config
+from app.main import app
+from app.storage.parquet_store import ParquetStore
+
+
+client = TestClient(app)
+
+
+async def _chunks(*frames):
+    for frame in frames:
+        yield frame
+
+
+@pytest.mark.asyncio
+async def test_parquet_store_projection_filters_and_aggregation(tmp_path):
+    store = ParquetStore(str(tmp_path))
+    first = pd.DataFrame({"date": ["2025-01-01", "2025-01-02"], "revenue": [10, 20], "store": ["a", "b"]})
+    second = pd.DataFrame({"date": ["2025-02-01", "2025-02-02"], "revenue": [30, None], "store": ["a", "b"]})
+    stored = await store.write("sales_1", _chunks(first, second))
+    assert stored.rows == 4
+    assert stored.file_size > 0
+    assert stored.content_type == "application/vnd.apache.parquet"
+    assert len(list((tmp_path / "sales_1").glob("*.parquet"))) == 2
+
+    df = await store.read("sales_1", columns=["revenue"], filters=[("store", "==", "a")])
+    assert list(df.columns) == ["revenue"]
+    assert df["revenue"].tolist() == [10, 30]
+
+    monthly = await store.aggregate("sales_1", "date", "revenue", "sum", time_unit="month")
+    assert monthly["revenue"].tolist() == [30, 30]
+
+    await store.drop("sales_1")
+    assert not (tmp_path / "sales_1").exists()
+
+
+@pytest.mark.asyncio
+async def test_parquet_store_append_widens_schema(tmp_path):
+    store = ParquetStore(str(tmp_path))
+    await store.write("sales_1", _chunks(pd.DataFrame({"revenue": pd.Series([1, 2], dtype="int8")})))
+    appended = await store.append("sales_1", _chunks(pd.DataFrame({"revenue": pd.Series([1000], dtype="int16")})))
+    assert appended.rows == 1
+    assert sorted(path.name for path in (tmp_path / "sales_1").iterdir()) == [
+        "_common_metadata", "part-00000.parquet", "part-00001.parquet"
+    ]
+    assert (await store.read("sales_1"))["revenue"].tolist() == [1, 2, 1000]
+
+    with pytest.raises(ValueError):
+        await store.append("sales_1", _chunks(pd.DataFrame({"revenue": ["many"]})))
+    assert len(list((tmp_path / "sales_1").glob("*.parquet"))) == 2
+    with pytest.raises(ValueError):
+        await store.append("missing_1", _chunks(pd.DataFrame({"revenue": [1]})))
+
+
+def test_upload_and_chart_with_parquet_backend(monkeypatch, tmp_path):
+    monkeypatch.setattr(config.storage, "backend", "parquet")
+    monkeypatch.setattr(config.storage, "parquet_dir", str(tmp_path))
+    csv_content = "date,revenue\n2025-01-01,5\n2025-01-15,7\n2025-02-01,1\n"
+    upload = client.post("/upload/csv", files={"file": ("sales.csv", csv_content, "text/csv")})
+    assert upload.status_code == 200
+    chart_request = {
+        "data_id": upload.json()["data_id"],
+        "chart_type": "line",
+        "x_field": "date",
+        "y_field": "revenue",
+        "time_unit": "month",
+    }
+    response = client.post("/chart/generate_chart_by_id", json=chart_request)
+    assert response.status_code == 200
+    assert [row["revenue"] for row in response.json()["data"]["values"]] == [12, 1]
+
+
+def test_upload_rejects_unsafe_dataset_name(monkeypatch, tmp_path):
+    monkeypatch.setattr(config.storage, "backend", "parquet")
+    monkeypatch.setattr(config.storage, "parquet_dir", str(tmp_path / "datasets"))
+    files = {"file": ("sales.csv", "a,b\n1,2\n", "text/csv")}
+    response = client.post("/upload/csv", params={"name": "../../escaped"}, files=files)
+    assert response.status_code == 400
+    assert list(tmp_path.rglob("*")) == []
+    with pytest.raises(ValueError):
+        ParquetStore(str(tmp_path / "datasets")).path("../escaped")